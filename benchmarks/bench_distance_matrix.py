@@ -0,0 +1,126 @@
+"""
+End to end benchmark of ORShelper.get_distance_matrix against the local mock
+server. Reports wall time, requests per second, peak memory and the time
+spent assembling the result for every combination of matrix size, tile size,
+worker count and number of servers. With several servers every server gets
+'workers' concurrent requests through a backend pool.
+
+Every combination runs in a fresh process. Peak memory is the growth of the
+peak resident set size of that process during the run, so it includes the
+response buffers of the client, not only the result arrays.
+
+Usage: python -m benchmarks.bench_distance_matrix [--sizes 100 1000 5000]
+    [--max-routes 2500 10000] [--workers 1 4 16] [--servers 1 3] [--latency 0.02]
+"""
+
+import argparse
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.mock_ors_server import MockOrsServer
+from src.ors_helper.backend_pool import Backend
+from src.ors_helper.instrumentation import TileMetrics
+from src.ors_helper.ors_helper import ORShelper
+from src.ors_helper.tile_planner import TileLimits
+
+
+def random_locations(n_locations: int, seed: int=0) -> pd.DataFrame:
+    """
+    Returns 'n_locations' random locations in a 2 x 2 degree box.
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "id": np.arange(n_locations).astype(str),
+        "latitude": rng.uniform(50, 52, n_locations),
+        "longitude": rng.uniform(8, 10, n_locations)
+    })
+
+
+def run(urls: List[str], locations: pd.DataFrame, max_routes: int, workers: int) -> dict:
+    """
+    Requests the matrix of 'locations' once from the servers 'urls' and
+    returns the measurements.
+    """
+    tile_metrics: List[TileMetrics] = []
+    helper = ORShelper(
+        backends=[Backend(url, max_workers=workers) for url in urls],
+        tile_limits=TileLimits(max_routes=max_routes),
+        metrics_hook=tile_metrics.append
+    )
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    matrix = helper.get_distance_matrix(locations, "car", dense=True)
+    requested = time.perf_counter()
+    long_format = matrix.to_long_dataframe()
+    finished = time.perf_counter()
+    # kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+    helper.close()
+
+    assert len(long_format) == len(locations) ** 2
+    n_requests = sum(metrics.requests for metrics in tile_metrics)
+    return {
+        "n": len(locations),
+        "max_routes": max_routes,
+        "workers": workers,
+        "servers": len(urls),
+        "tiles": len(tile_metrics),
+        "wall_s": finished - started,
+        "req_per_s": n_requests / (requested - started),
+        "peak_mb": peak / 2 ** 10,
+        "assembly_s": sum(metrics.assembly_seconds for metrics in tile_metrics),
+        "parse_s": sum(metrics.parse_seconds for metrics in tile_metrics),
+        "long_format_s": finished - requested
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Runs the benchmark grid and prints one row per combination.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--max-routes", type=int, nargs="+", default=[2500, 10000])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument(
+        "--servers", type=int, nargs="+", default=[1], help="Numbers of mock servers")
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="Seconds per request of the mock server")
+    args = parser.parse_args(argv)
+
+    rows = []
+    with ExitStack() as stack:
+        urls = [
+            stack.enter_context(MockOrsServer(latency=args.latency)).url
+            for _ in range(max(args.servers))
+        ]
+        for n_locations in args.sizes:
+            locations = random_locations(n_locations)
+            for max_routes in args.max_routes:
+                for workers in args.workers:
+                    for n_servers in args.servers:
+                        with ProcessPoolExecutor(max_workers=1) as executor:
+                            row = executor.submit(
+                                run, urls[:n_servers], locations, max_routes, workers
+                            ).result()
+                        rows.append(row)
+                        print(", ".join(
+                            f"{name} {value:.3f}" if isinstance(value, float)
+                            else f"{name} {value}"
+                            for name, value in row.items()
+                        ))
+
+    results = pd.DataFrame(rows)
+    print(results.to_string(index=False, float_format="%.3f"))
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark of input_file_schema on large frames. Compares the schema with the
+element wise numeric check it used before against the current schema.
+
+Usage: python -m benchmarks.bench_schema_validation [n_rows]
+"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pandera as pa
+from pandera import Check
+
+from src.schemas.schemas import input_file_schema, is_numeric
+
+
+def elementwise_schema() -> pa.DataFrameSchema:
+    """
+    Returns input_file_schema with the element wise numeric check.
+    """
+    numeric_check = Check(
+        check_fn=lambda s: s.map(is_numeric),
+        error="column has non numeric values"
+    )
+    return input_file_schema.update_columns({
+        "latitude": {"checks": [numeric_check, Check.le(90), Check.ge(-90)]},
+        "longitude": {"checks": [numeric_check, Check.le(180), Check.ge(-180)]}
+    })
+
+
+def best_of(schema: pa.DataFrameSchema, input_df: pd.DataFrame, repeat: int=3) -> float:
+    """
+    Returns the fastest of 'repeat' validations in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        schema.validate(input_df)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(n_rows: int=500_000) -> None:
+    """
+    Runs the benchmark and prints the timings.
+    """
+    rng = np.random.default_rng(0)
+    input_df = pd.DataFrame({
+        "id": np.arange(n_rows).astype(str),
+        "latitude": rng.uniform(-90, 90, n_rows),
+        "longitude": rng.uniform(-180, 180, n_rows)
+    })
+
+    before = best_of(elementwise_schema(), input_df)
+    after = best_of(input_file_schema, input_df)
+
+    print(f"rows: {n_rows}")
+    print(f"element wise check: {before:.3f} s")
+    print(f"dtype based check:  {after:.3f} s")
+    print(f"speedup: {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,109 @@
+"""
+Local mock of the openrouteservice matrix endpoint for benchmarks. Answers
+POST /v2/matrix/<profile>/json after a configurable latency with distances
+computed from the coordinates, so results can be checked.
+
+Usage: python -m benchmarks.mock_ors_server [port] [latency in seconds]
+"""
+
+import gzip
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+def matrix_response(body: dict) -> dict:
+    """
+    Returns the matrix response of a request body. The distance is the
+    manhattan distance of the coordinates in degrees times 100 km, the
+    duration assumes 20 m/s.
+    """
+    locations = np.asarray(body["locations"], dtype=float)
+    sources = locations[body.get("sources", list(range(len(locations))))]
+    destinations = locations[body.get("destinations", list(range(len(locations))))]
+
+    distances = np.abs(sources[:, None, :] - destinations[None, :, :]).sum(axis=2) * 100_000
+    return {"distances": distances.tolist(), "durations": (distances / 20).tolist()}
+
+
+class MatrixHandler(BaseHTTPRequestHandler):
+    """
+    Request handler of the mock server. Keeps connections alive like a real
+    server, so the connection pool of the client is used.
+    """
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """
+        Answers a matrix request.
+        """
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+
+        if not self.path.startswith("/v2/matrix/"):
+            self.send_error(404)
+            return
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        payload = json.dumps(matrix_response(json.loads(body))).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """
+        Does not log every request.
+        """
+
+
+class MockOrsServer:
+    """
+    Mock server running in a background thread. Use it as a context manager,
+    'url' is the base url for an ORShelper.
+
+    Parameter
+    ---------
+    latency : float
+        Seconds every request waits before it is answered.
+    port : int
+        Port of the server. 0 picks a free port.
+    """
+    def __init__(self, latency: float=0.0, port: int=0):
+        handler = type("Handler", (MatrixHandler,), {"latency": latency})
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        """
+        Base url of the server.
+        """
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> 'MockOrsServer':
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    port_arg = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    latency_arg = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    with MockOrsServer(latency=latency_arg, port=port_arg) as mock_server:
+        print(f"Mock server listening on {mock_server.url}")
+        mock_server.thread.join()
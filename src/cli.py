@@ -0,0 +1,278 @@
+"""
+Command line entry point for headless matrix jobs. Reads an input file,
+requests the distance matrix for one or more profiles and writes the results
+to disk. Does not import tkinter, so it runs without a display.
+
+Usage: python -m src.cli input.xlsx --profile car --profile hgv -o results
+"""
+
+import argparse
+import logging
+import os
+import sys
+from dataclasses import replace
+from typing import List, Optional
+
+import pandas as pd
+from src.file_io import input_reader
+from src.file_io.output_writer import (
+    CsvTileSink, MATRIX_FORMATS, ParquetTileSink, write_matrix_file
+)
+from src.ors_helper.checkpoint import Checkpoint
+from src.ors_helper.distributed import DistributedJob, run_local_workers
+from src.ors_helper.ors_helper import ORShelper
+from src.ors_helper.report import MatrixReport
+from src.ors_helper.route_cache import RouteCache
+from src.ors_helper.tile_planner import TileLimits
+
+STREAM_SINKS = {"csv": CsvTileSink, "parquet": ParquetTileSink}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Returns the argument parser of the command line interface.
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="ors_matrix",
+        description="Requests distance matrices from an openrouteservice server."
+    )
+    parser.add_argument(
+        "input_file",
+        help="Input *.xlsx, *.csv, *.parquet or *.feather file with id, latitude, longitude"
+    )
+    parser.add_argument(
+        "--destinations",
+        help="Input file with the destinations. The input_file then holds the "
+             "sources and only sources x destinations is requested"
+    )
+    parser.add_argument(
+        "-p", "--profile",
+        action="append",
+        choices=["car", "hgv"],
+        help="Profile to request, can be repeated. Default: car"
+    )
+    parser.add_argument(
+        "-o", "--output-dir",
+        default=".",
+        help="Directory the results are written to. Default: current directory"
+    )
+    parser.add_argument(
+        "-f", "--format",
+        choices=MATRIX_FORMATS,
+        default="csv",
+        help="Output file format. Default: csv"
+    )
+    parser.add_argument(
+        "-w", "--workers",
+        type=int,
+        default=1,
+        help="Number of concurrent tile requests. Default: 1"
+    )
+    parser.add_argument(
+        "--tile-size",
+        type=int,
+        help="Square tile size. Default: planned from the server limits"
+    )
+    parser.add_argument(
+        "--max-routes",
+        type=int,
+        help="Maximum sources x destinations of a request. Overrides the .env file"
+    )
+    parser.add_argument(
+        "--requests-per-minute",
+        type=int,
+        help="Request quota of the server"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Write tiles as they finish instead of holding the matrix in memory "
+             "(csv and parquet only)"
+    )
+    parser.add_argument(
+        "--checkpoint",
+        action="store_true",
+        help="Record finished tiles next to the output and resume an interrupted "
+             "job (requires --stream and csv)"
+    )
+    parser.add_argument(
+        "--deduplicate",
+        action="store_true",
+        help="Request locations with the same coordinates only once"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.0,
+        help="Distance in meters within which --deduplicate collapses locations"
+    )
+    parser.add_argument(
+        "--distributed",
+        metavar="DIRECTORY",
+        help="Shared job directory. Writes the tile plan of every profile into "
+             "DIRECTORY/<profile>, requests the tiles with --local-workers processes "
+             "and merges the results. Workers on other hosts join with "
+             "'python -m src.ors_helper.distributed DIRECTORY/<profile>'"
+    )
+    parser.add_argument(
+        "--local-workers",
+        type=int,
+        default=1,
+        help="Number of worker processes of a --distributed job. Default: 1"
+    )
+    parser.add_argument(
+        "-v", "--verbose",
+        action="count",
+        default=0,
+        help="Log the progress of the run, -vv also logs the metrics of every tile"
+    )
+    parser.add_argument("--cache", help="Path to a SQLite route cache")
+    parser.add_argument("--env-file", help="Path to the .env file")
+
+    return parser
+
+
+def write_unroutable_pairs(
+        report: MatrixReport, locations: pd.DataFrame, output_path: str) -> None:
+    """
+    Writes the unroutable pairs of 'report' to '<output_path>.unroutable.csv'
+    if there are any. 'locations' are the locations the positions of the
+    report refer to.
+    """
+
+    unroutable = report.unroutable_pairs(locations)
+    if unroutable.empty:
+        return
+
+    path = f"{output_path}.unroutable.csv"
+    unroutable.to_csv(path, index=False)
+    print(f"Wrote {len(unroutable)} unroutable pairs to {path}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Runs the matrix job described by the command line arguments.
+    """
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    profiles = args.profile or ["car"]
+
+    if args.stream and args.format not in STREAM_SINKS:
+        parser.error(f"--stream is not supported for the format {args.format}")
+
+    if args.checkpoint and not (args.stream and args.format == "csv"):
+        parser.error("--checkpoint requires --stream and the csv format")
+
+    if args.deduplicate and args.stream:
+        parser.error("--deduplicate is not supported with --stream")
+
+    if args.destinations is not None and (args.stream or args.deduplicate):
+        parser.error("--destinations is not supported with --stream or --deduplicate")
+
+    if args.distributed is not None and (
+            args.stream or args.deduplicate or args.destinations is not None):
+        parser.error(
+            "--distributed is not supported with --stream, --deduplicate or --destinations")
+
+    if args.local_workers < 1:
+        parser.error("--local-workers has to be at least 1")
+
+    if args.verbose:
+        logging.basicConfig(
+            level=logging.DEBUG if args.verbose > 1 else logging.INFO,
+            format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+        )
+
+    locations = input_reader.read_input_file(args.input_file)
+    destinations = None
+    if args.destinations is not None:
+        destinations = input_reader.read_input_file(args.destinations)
+
+    cache = None if args.cache is None else RouteCache(args.cache)
+    helper_kwargs = {
+        "max_workers": args.workers,
+        "requests_per_minute": args.requests_per_minute,
+        "cache": cache
+    }
+    helper = ORShelper.from_env_file(dotenv_path=args.env_file, **helper_kwargs)
+    if args.max_routes is not None:
+        # keeps the MATRIX_MAX_LOCATIONS of the .env file
+        helper.tile_limits = replace(helper.tile_limits, max_routes=args.max_routes)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(args.input_file))[0]
+
+    try:
+        if args.distributed is not None:
+            for profile in profiles:
+                job = DistributedJob.create(
+                    os.path.join(args.distributed, profile), locations, profile,
+                    tile_limits=(
+                        helper.tile_limits if args.tile_size is None
+                        else TileLimits.from_chunk_size(args.tile_size)
+                    ))
+                # the quota is shared by the worker processes
+                requests_per_minute = args.requests_per_minute
+                if requests_per_minute is not None:
+                    requests_per_minute = max(1, requests_per_minute // args.local_workers)
+                requested = run_local_workers(
+                    job.directory, args.local_workers, dotenv_path=args.env_file,
+                    max_workers=args.workers, requests_per_minute=requests_per_minute)
+                output_path = os.path.join(args.output_dir, f"{stem}_{profile}.{args.format}")
+                distance_matrix = job.merge(dense=True)
+                write_matrix_file(distance_matrix, output_path)
+                print(
+                    f"{profile}: requested {requested} of {job.n_tiles} tiles locally, "
+                    f"wrote {len(distance_matrix)} rows to {output_path}")
+        elif args.stream or destinations is not None:
+            for profile in profiles:
+                report = MatrixReport()
+                output_path = os.path.join(args.output_dir, f"{stem}_{profile}.{args.format}")
+                if args.stream:
+                    checkpoint = None
+                    sink_kwargs = {}
+                    if args.checkpoint:
+                        checkpoint_path = f"{output_path}.checkpoint"
+                        sink_kwargs["append"] = os.path.exists(checkpoint_path)
+                        checkpoint = Checkpoint(checkpoint_path)
+                    with STREAM_SINKS[args.format](output_path, locations, **sink_kwargs) as sink:
+                        written = helper.write_distance_matrix(
+                            locations, profile, sink,
+                            checkpoint=checkpoint, chunk_size=args.tile_size, report=report)
+                    print(f"Wrote {written} tiles to {output_path}")
+                    write_unroutable_pairs(report, locations, output_path)
+                else:
+                    distance_matrix = helper.get_source_destination_matrix(
+                        locations, destinations, profile,
+                        chunk_size=args.tile_size, report=report)
+                    write_matrix_file(distance_matrix, output_path)
+                    print(f"Wrote {len(distance_matrix)} rows to {output_path}")
+                    # the report positions refer to the sources, then the destinations
+                    write_unroutable_pairs(
+                        report, pd.concat([locations, destinations]), output_path)
+                print(f"{profile}: {report.summary()}")
+        else:
+            # all profiles in one pass over a shared tile plan
+            report = MatrixReport()
+            distance_matrices = helper.get_distance_matrices(
+                locations, profiles, chunk_size=args.tile_size, report=report,
+                deduplicate=args.deduplicate, tolerance=args.tolerance)
+            for profile, distance_matrix in distance_matrices.items():
+                output_path = os.path.join(args.output_dir, f"{stem}_{profile}.{args.format}")
+                write_matrix_file(distance_matrix, output_path)
+                print(f"Wrote {len(distance_matrix)} rows to {output_path}")
+            print(f"{', '.join(profiles)}: {report.summary()}")
+            # one report covers the pairs of all profiles
+            write_unroutable_pairs(report, locations, os.path.join(args.output_dir, stem))
+    finally:
+        helper.close()
+        if cache is not None:
+            cache.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
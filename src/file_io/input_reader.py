@@ -1,9 +1,65 @@
 """This module handles file reading and file writing."""
 
+import os
+
+import openpyxl
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from src.schemas.schemas import input_file_schema
 
 
+REQUIRED_COLUMNS = ("id", "latitude", "longitude")
+
+INPUT_FILE_EXTENSIONS = (".xlsx", ".csv", ".parquet", ".feather")
+
+
+def read_input_file(path: str) -> pd.DataFrame:
+    """Reads an input file, checks input schema and returns dataframe
+
+    The format is chosen by the file extension '.xlsx', '.csv', '.parquet' or
+    '.feather'. Only the required columns are loaded, additional columns in
+    the file are allowed but skipped.
+
+    Parameter
+    ---------
+    path : str
+        Path to the input file. Required columns are 'id', 'longitude' and
+        'latitude'.
+            - id column can be string, int or float and has to be unique
+            - latititude has to be in in the interval [-90, 90]
+            - longitude has to be in the interval [-180, 180]
+
+    Returns
+    -------
+    pd.DataFrame
+        DataFrame with the required columns that passed input_file_schema
+
+    Raises
+    ------
+    SchemaError
+        When the dataframe does not pass the input_file_schema
+    ValueError
+        When the file extension is not supported
+    """
+
+    extension = os.path.splitext(path)[1].lower()
+    readers = {
+        ".xlsx": _read_xlsx_columns,
+        ".csv": _read_csv_columns,
+        ".parquet": _read_parquet_columns,
+        ".feather": _read_feather_columns
+    }
+
+    if extension not in readers:
+        raise ValueError(f"Unsupported input file extension {extension}")
+
+    input_file_df = readers[extension](path)
+    input_file_schema.validate(input_file_df)
+
+    return input_file_df
+
+
 def read_xlsx_input_file(path: str) -> pd.DataFrame:
     """Reads xlsx file from device checks input schema and returns dataframe
 
@@ -15,7 +71,7 @@ def read_xlsx_input_file(path: str) -> pd.DataFrame:
             - id column can be string, int or float and has to be unique
             - latititude has to be in in the interval [-90, 90]
             - longitude has to be in the interval [-180, 180]
-        Additional columns are allowed.
+        Additional columns are allowed but not loaded.
 
     Returns
     -------
@@ -28,7 +84,114 @@ def read_xlsx_input_file(path: str) -> pd.DataFrame:
         When the dataframe does not pass the input_file_schema
     """
 
-    input_file_df = pd.read_excel(path)
+    input_file_df = _read_xlsx_columns(path)
     input_file_schema.validate(input_file_df)
 
     return input_file_df
+
+
+def _read_xlsx_columns(path: str) -> pd.DataFrame:
+    """Streams the required columns of the first sheet of a xlsx file with
+    openpyxl in read-only mode."""
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, ())
+        positions = {
+            name: position for position, name in enumerate(header)
+            if name in REQUIRED_COLUMNS
+        }
+        columns = [name for name in REQUIRED_COLUMNS if name in positions]
+        selected = [positions[name] for name in columns]
+
+        records = [
+            [row[position] for position in selected]
+            for row in rows
+            if any(value is not None for value in row)
+        ]
+    finally:
+        workbook.close()
+
+    return pd.DataFrame.from_records(records, columns=columns)
+
+
+def _read_csv_columns(path: str) -> pd.DataFrame:
+    """Reads the required columns of a csv file with the pyarrow engine."""
+
+    header = pd.read_csv(path, nrows=0).columns
+    columns = [name for name in REQUIRED_COLUMNS if name in header]
+
+    return pd.read_csv(
+        path,
+        usecols=columns,
+        dtype={"id": str} if "id" in columns else None,
+        engine="pyarrow"
+    )[columns]
+
+
+def _read_parquet_columns(path: str) -> pd.DataFrame:
+    """Reads only the required columns of a parquet file."""
+
+    names = pq.read_schema(path).names
+    columns = [name for name in REQUIRED_COLUMNS if name in names]
+
+    return pd.read_parquet(path, columns=columns)
+
+
+def _read_feather_columns(path: str) -> pd.DataFrame:
+    """Reads only the required columns of a feather file."""
+
+    with pa.ipc.open_file(path) as reader:
+        names = reader.schema.names
+    columns = [name for name in REQUIRED_COLUMNS if name in names]
+
+    return pd.read_feather(path, columns=columns)[columns]
+
+
+def read_matrix_file(path: str) -> pd.DataFrame:
+    """Reads a previously written long format distance matrix
+
+    Parameter
+    ---------
+    path : str
+        Path to a *.csv, *.csv.zst, *.xlsx or *.parquet file with at least
+        the columns 'start_id', 'destination_id', 'distance' and 'duration'.
+        All sheets of an *.xlsx file are read. The ids of *.csv and *.xlsx
+        files are read as str, like the ids of read_input_file.
+
+    Returns
+    -------
+    pd.DataFrame
+        DataFrame of the matrix file
+
+    Raises
+    ------
+    ValueError
+        When the file extension is not supported or required columns are
+        missing.
+    """
+
+    id_dtypes = {"start_id": str, "destination_id": str}
+    lower_path = path.lower()
+    if lower_path.endswith(".csv"):
+        matrix_df = pd.read_csv(path, dtype=id_dtypes)
+    elif lower_path.endswith(".csv.zst"):
+        with pa.CompressedInputStream(pa.OSFile(path), "zstd") as stream:
+            matrix_df = pd.read_csv(stream, dtype=id_dtypes)
+    elif lower_path.endswith(".xlsx"):
+        matrix_df = pd.concat(
+            pd.read_excel(path, sheet_name=None, dtype=id_dtypes).values(),
+            ignore_index=True)
+    elif lower_path.endswith(".parquet"):
+        matrix_df = pd.read_parquet(path)
+    else:
+        extension = os.path.splitext(path)[1]
+        raise ValueError(f"Unsupported matrix file extension {extension}")
+
+    missing_columns = {"start_id", "destination_id", "distance", "duration"}
+    missing_columns -= set(matrix_df.columns)
+    if missing_columns:
+        raise ValueError(f"Matrix file is missing the columns {sorted(missing_columns)}")
+
+    return matrix_df
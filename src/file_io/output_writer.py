@@ -0,0 +1,400 @@
+"""This module writes matrix results to files."""
+
+import os
+from typing import Any, BinaryIO, Iterator, List, Union
+
+import numpy as np
+from numpy.typing import DTypeLike
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.ors_helper.distance_matrix import DistanceMatrix
+from src.ors_helper.ors_utils import tile_to_long_format
+from src.ors_helper.tile_planner import TileResult
+
+MATRIX_FORMATS = ("csv", "csv.zst", "xlsx", "parquet")
+
+# rows of an Excel worksheet, including the header row
+EXCEL_MAX_ROWS = 1_048_576
+
+CHUNK_ROWS = 500_000
+
+MatrixResult = Union[pd.DataFrame, DistanceMatrix]
+
+
+def matrix_file_format(path: str) -> str:
+    """
+    Returns the matrix format of 'path' from its extension, one of
+    MATRIX_FORMATS.
+
+    Raises
+    ------
+    ValueError
+        When the file extension is not supported.
+    """
+
+    lower_path = path.lower()
+    for matrix_format in sorted(MATRIX_FORMATS, key=len, reverse=True):
+        if lower_path.endswith(f".{matrix_format}"):
+            return matrix_format
+
+    extension = os.path.splitext(path)[1]
+    raise ValueError(f"Unsupported matrix file extension {extension}")
+
+
+def iter_matrix_chunks(matrix: MatrixResult, chunk_rows: int=CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Yields the long format rows of 'matrix' in chunks of about 'chunk_rows'
+    rows. A DistanceMatrix is converted one block of sources at a time, so
+    the long format is never built for the whole matrix.
+    """
+
+    if isinstance(matrix, DistanceMatrix):
+        n_sources, n_destinations = matrix.shape
+        sources_per_chunk = max(1, chunk_rows // max(n_destinations, 1))
+        for start in range(0, n_sources, sources_per_chunk):
+            yield matrix.iloc(slice(start, start + sources_per_chunk)).to_long_dataframe()
+        return
+
+    for start in range(0, len(matrix), chunk_rows):
+        yield matrix.iloc[start:start + chunk_rows]
+
+
+def write_matrix_file(matrix: MatrixResult, path: str, chunk_rows: int=CHUNK_ROWS) -> None:
+    """Writes a long format distance matrix to a file
+
+    Parameter
+    ---------
+    matrix : pd.DataFrame or DistanceMatrix
+        Result of ORShelper.get_distance_matrix.
+    path : str
+        Path of the output file. The format is chosen by the extension
+        '.csv', '.csv.zst' (zstd compressed csv), '.xlsx' or '.parquet'.
+    chunk_rows : int
+        Number of rows converted and written at a time.
+
+    Raises
+    ------
+    ValueError
+        When the file extension is not supported.
+    """
+
+    matrix_format = matrix_file_format(path)
+    chunks = iter_matrix_chunks(matrix, chunk_rows)
+
+    if matrix_format == "csv":
+        with open(path, "wb") as file:
+            _write_csv_chunks(chunks, file)
+    elif matrix_format == "csv.zst":
+        with pa.CompressedOutputStream(path, "zstd") as stream:
+            _write_csv_chunks(chunks, stream)
+    elif matrix_format == "xlsx":
+        write_xlsx_file(matrix, path, chunk_rows=chunk_rows)
+    else:
+        _write_parquet_chunks(chunks, path)
+
+
+def _write_csv_chunks(chunks: Iterator[pd.DataFrame], file: BinaryIO) -> None:
+    header = True
+    for chunk in chunks:
+        file.write(chunk.to_csv(header=header, index=False).encode("utf-8"))
+        header = False
+
+
+def _write_parquet_chunks(chunks: Iterator[pd.DataFrame], path: str) -> None:
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table.cast(writer.schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_parquet_dataset(
+        matrix: MatrixResult,
+        directory: str,
+        rows_per_file: int=CHUNK_ROWS) -> List[str]:
+    """Writes a long format distance matrix as a partitioned parquet dataset
+
+    Parameter
+    ---------
+    matrix : pd.DataFrame or DistanceMatrix
+        Result of ORShelper.get_distance_matrix.
+    directory : str
+        Directory the 'part-00000.parquet', ... files are written to. The
+        dataset can be read with pd.read_parquet(directory).
+    rows_per_file : int
+        Number of rows of a single file.
+
+    Returns
+    -------
+    List[str]
+        Paths of the written files.
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for number, chunk in enumerate(iter_matrix_chunks(matrix, rows_per_file)):
+        path = os.path.join(directory, f"part-{number:05d}.parquet")
+        chunk.to_parquet(path, index=False)
+        paths.append(path)
+
+    return paths
+
+
+def write_xlsx_file(
+        matrix: MatrixResult,
+        path: str,
+        rows_per_sheet: int=EXCEL_MAX_ROWS - 1,
+        chunk_rows: int=CHUNK_ROWS) -> int:
+    """Writes a long format distance matrix to an Excel file
+
+    The workbook is written in the write-only mode of openpyxl, so rows are
+    streamed to disk. When the matrix has more rows than fit into a sheet it
+    is continued on the sheets 'matrix (2)', 'matrix (3)', ... each with its
+    own header row. Missing values are written as empty cells.
+
+    Parameter
+    ---------
+    matrix : pd.DataFrame or DistanceMatrix
+        Result of ORShelper.get_distance_matrix.
+    path : str
+        Path of the *.xlsx file.
+    rows_per_sheet : int
+        Number of data rows of a sheet. Defaults to the row limit of Excel.
+    chunk_rows : int
+        Number of rows converted at a time.
+
+    Returns
+    -------
+    int
+        Number of written sheets.
+    """
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = None
+    sheet_rows = 0
+    n_sheets = 0
+
+    for chunk in iter_matrix_chunks(matrix, chunk_rows):
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            if sheet is None or sheet_rows == rows_per_sheet:
+                n_sheets += 1
+                sheet = workbook.create_sheet(
+                    "matrix" if n_sheets == 1 else f"matrix ({n_sheets})")
+                sheet.append(list(chunk.columns))
+                sheet_rows = 0
+            sheet.append(row)
+            sheet_rows += 1
+
+    if sheet is None:
+        sheet = workbook.create_sheet("matrix")
+        n_sheets = 1
+
+    workbook.save(path)
+    return n_sheets
+
+
+class TileSink:
+    """
+    Base class of the streaming writers. A sink receives the finished tiles of
+    ORShelper.iter_distance_matrix one by one and writes them to disk, so the
+    whole matrix never has to be in memory.
+
+    Parameter
+    ---------
+    locations : pd.DataFrame
+        Locations the matrix is requested for. Used for the ids of the rows.
+    """
+    def __init__(self, locations: pd.DataFrame):
+        self.locations = locations
+        self.tiles_written = 0
+
+    def write(self, tile: TileResult) -> None:
+        """
+        Writes a single tile.
+        """
+        self._write(tile)
+        self.tiles_written += 1
+
+    def _write(self, tile: TileResult) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """
+        Flushes and closes the output.
+        """
+
+    def checkpoint_state(self) -> Any:
+        """
+        Returns the JSON serializable state that is needed to resume the
+        output after the tiles written so far.
+        """
+        return None
+
+    def resume(self, state: Any) -> None:
+        """
+        Restores the output to 'state' before the remaining tiles of an
+        interrupted job are written.
+        """
+        raise ValueError(f"{type(self).__name__} does not support resuming")
+
+    def _tile_frame(self, tile: TileResult) -> pd.DataFrame:
+        return tile_to_long_format(
+            self.locations.iloc[tile.sources],
+            self.locations.iloc[tile.destinations],
+            tile.distances,
+            tile.durations
+        )
+
+    def __enter__(self) -> 'TileSink':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class CsvTileSink(TileSink):
+    """
+    Appends the long format rows of every tile to a csv file.
+
+    Parameter
+    ---------
+    path : str
+        Path of the csv file.
+    locations : pd.DataFrame
+        Locations the matrix is requested for.
+    append : bool
+        Appends to an existing file instead of overwriting it. Needed to
+        resume an interrupted job.
+    """
+    def __init__(self, path: str, locations: pd.DataFrame, append: bool=False):
+        super().__init__(locations)
+        self.path = path
+        # binary mode, so tell() and truncate() work with byte offsets
+        self._file = open(path, "ab" if append else "wb")
+        self._header = self._file.tell() == 0
+
+    def _write(self, tile: TileResult) -> None:
+        self._file.write(
+            self._tile_frame(tile).to_csv(header=self._header, index=False).encode("utf-8"))
+        self._header = False
+
+    def checkpoint_state(self) -> int:
+        self._file.flush()
+        return self._file.tell()
+
+    def resume(self, state: int) -> None:
+        self._file.flush()
+        self._file.truncate(state)
+        self._file.seek(state)
+        self._header = state == 0
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetTileSink(TileSink):
+    """
+    Writes the long format rows to a parquet file. Tiles are buffered until
+    'row_group_size' rows are collected and then written as one row group.
+
+    Parameter
+    ---------
+    path : str
+        Path of the parquet file. An existing file is overwritten.
+    locations : pd.DataFrame
+        Locations the matrix is requested for.
+    row_group_size : int
+        Number of rows of a row group.
+    """
+    def __init__(self, path: str, locations: pd.DataFrame, row_group_size: int=1_000_000):
+        super().__init__(locations)
+        self.path = path
+        self.row_group_size = row_group_size
+        self._buffer: List[pd.DataFrame] = []
+        self._buffered_rows = 0
+        self._writer = None
+
+    def _write(self, tile: TileResult) -> None:
+        tile_df = self._tile_frame(tile)
+        self._buffer.append(tile_df)
+        self._buffered_rows += len(tile_df)
+        if self._buffered_rows >= self.row_group_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+
+        table = pa.Table.from_pandas(
+            pd.concat(self._buffer, ignore_index=True), preserve_index=False)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+        self._buffer = []
+        self._buffered_rows = 0
+
+    def close(self) -> None:
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+
+
+class NpyTileSink(TileSink):
+    """
+    Writes the tiles into memory-mapped N x N '.npy' files for distances and
+    durations. The files can be opened with np.load(path, mmap_mode="r").
+
+    Parameter
+    ---------
+    distances_path : str
+        Path of the distances '.npy' file.
+    durations_path : str
+        Path of the durations '.npy' file.
+    locations : pd.DataFrame
+        Locations the matrix is requested for.
+    dtype : DTypeLike
+        Data type of the arrays.
+    append : bool
+        Opens existing files instead of creating new ones. Needed to resume
+        an interrupted job.
+    """
+    def __init__(
+            self,
+            distances_path: str,
+            durations_path: str,
+            locations: pd.DataFrame,
+            dtype: DTypeLike=np.float32,
+            append: bool=False):
+        super().__init__(locations)
+        if append:
+            self.distances = np.lib.format.open_memmap(distances_path, mode="r+")
+            self.durations = np.lib.format.open_memmap(durations_path, mode="r+")
+            return
+
+        shape = (len(locations), len(locations))
+        self.distances = np.lib.format.open_memmap(
+            distances_path, mode="w+", dtype=dtype, shape=shape)
+        self.durations = np.lib.format.open_memmap(
+            durations_path, mode="w+", dtype=dtype, shape=shape)
+        self.distances[:] = np.nan
+        self.durations[:] = np.nan
+
+    def _write(self, tile: TileResult) -> None:
+        self.distances[np.ix_(tile.sources, tile.destinations)] = tile.distances
+        self.durations[np.ix_(tile.sources, tile.destinations)] = tile.durations
+
+    def resume(self, state: Any) -> None:
+        # every tile is written to its own cells, nothing to restore
+        pass
+
+    def close(self) -> None:
+        self.distances.flush()
+        self.durations.flush()
@@ -2,14 +2,22 @@
 Module for GUI main window creation.
 """
 
+import queue
+import threading
+import time
 import tkinter as tk
-from tkinter import filedialog, scrolledtext
-from typing import Union
+from concurrent.futures import Future, ThreadPoolExecutor
+from tkinter import filedialog, scrolledtext, ttk
+from typing import Dict, Union
 
 import pandas as pd
 from pandera.errors import SchemaError
 from src.file_io import input_reader
-from src.ors_helper.ors_helper import ORShelper
+from src.file_io.output_writer import write_matrix_file
+from src.ors_helper.ors_helper import MatrixCancelled, ORShelper
+
+PROFILES = ("car", "hgv")
+POLL_INTERVAL_MS = 100
 
 class MainWindow:
     """
@@ -23,7 +31,18 @@ class MainWindow:
         self.distance_matrix_car = pd.DataFrame()
         self.distance_matrix_hgv = pd.DataFrame()
         self.ors_helper = ORShelper.from_env_file()
+        # one worker per profile, so car and hgv can run side by side
+        self.executor = ThreadPoolExecutor(max_workers=len(PROFILES))
+        self.jobs: Dict[str, Future] = {}
+        self.cancel_events: Dict[str, threading.Event] = {}
+        self.job_started: Dict[str, float] = {}
+        self.messages: queue.Queue = queue.Queue()
+        self.progress_bars: Dict[str, ttk.Progressbar] = {}
+        self.progress_labels: Dict[str, tk.Label] = {}
+        self.cancel_buttons: Dict[str, tk.Button] = {}
         self.create_widgets()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        self.root.after(POLL_INTERVAL_MS, self.process_messages)
 
     def create_widgets(self):
         """
@@ -52,6 +71,48 @@ class MainWindow:
         )
         self.get_distance_matrix_car_button.pack(side=tk.TOP, anchor=tk.W, padx=10, pady=10)
 
+        self.get_distance_matrices_button = tk.Button(
+            self.root,
+            text="Get Distance Matrices Car + HGV",
+            command=self.start_distance_matrices
+        )
+        self.get_distance_matrices_button.pack(side=tk.TOP, anchor=tk.W, padx=10, pady=10)
+
+        self.save_buttons: Dict[str, tk.Button] = {}
+        for profile in PROFILES:
+            self.save_buttons[profile] = tk.Button(
+                self.root,
+                text=f"Save Distance Matrix {profile.upper()}",
+                command=lambda profile=profile: self.save_distance_matrix(profile)
+            )
+            self.save_buttons[profile].pack(side=tk.TOP, anchor=tk.W, padx=10, pady=5)
+
+        # Create progress bar, progress label and cancel button per profile
+        for profile in PROFILES:
+            frame = tk.Frame(self.root)
+            frame.pack(side=tk.TOP, anchor=tk.W, padx=10, pady=5, fill=tk.X)
+
+            tk.Label(frame, text=profile.upper(), width=4, anchor=tk.W).pack(side=tk.LEFT)
+
+            self.progress_bars[profile] = ttk.Progressbar(
+                frame,
+                orient=tk.HORIZONTAL,
+                length=300,
+                mode="determinate"
+            )
+            self.progress_bars[profile].pack(side=tk.LEFT, padx=5)
+
+            self.cancel_buttons[profile] = tk.Button(
+                frame,
+                text="Cancel",
+                state=tk.DISABLED,
+                command=lambda profile=profile: self.cancel_distance_matrix(profile)
+            )
+            self.cancel_buttons[profile].pack(side=tk.LEFT, padx=5)
+
+            self.progress_labels[profile] = tk.Label(frame, text="", anchor=tk.W)
+            self.progress_labels[profile].pack(side=tk.LEFT, padx=5)
+
         # Create text_widget for input_file
         self.info_field = scrolledtext.ScrolledText(
             self.root,
@@ -76,7 +137,14 @@ class MainWindow:
 
         file_path = filedialog.askopenfilename(
             title="Select File",
-            filetypes=[("Excel file", "*.xlsx")]
+            filetypes=[
+                ("Input file", " ".join(
+                    f"*{extension}" for extension in input_reader.INPUT_FILE_EXTENSIONS)),
+                ("Excel file", "*.xlsx"),
+                ("CSV file", "*.csv"),
+                ("Parquet file", "*.parquet"),
+                ("Feather file", "*.feather")
+            ]
         )
 
         return file_path
@@ -86,13 +154,13 @@ class MainWindow:
         """
         Sets the input_file attribute.
         """
-        file_df = input_reader.read_xlsx_input_file(path)
+        file_df = input_reader.read_input_file(path)
         self.input_file = file_df
 
 
     def load_input_file(self, file_path: Union[str, None] = None) -> None:
         """
-        Opens a file dialog to choose a input *.xlsx file, loads the data as
+        Opens a file dialog to choose a input file, loads the data as
         a pd.DataFrame and sets the input_file attribute to it.
         """
 
@@ -144,18 +212,224 @@ class MainWindow:
             profile=profile
         )
 
+    def start_distance_matrix(self, profile: str) -> None:
+        """
+        Starts the distance matrix request for 'profile' in a background
+        thread. Progress and the result are posted to the messages queue and
+        shown by process_messages on the Tk main loop.
+        """
+
+        if self.input_file.empty:
+            self.update_info_field_text("Select input file first!")
+            return
+
+        if profile in self.jobs and not self.jobs[profile].done():
+            self.update_info_field_text(f"Distance matrix {profile} is already running")
+            return
+
+        cancel = threading.Event()
+        self.reset_progress(profile, cancel)
+
+        def progress(finished: int, total: int) -> None:
+            self.messages.put(("progress", profile, (finished, total)))
+
+        def run() -> None:
+            try:
+                result = self.ors_helper.get_distance_matrix(
+                    locations=self.input_file,
+                    profile=profile,
+                    progress=progress,
+                    cancel=cancel
+                )
+                self.messages.put(("done", profile, result))
+            except MatrixCancelled:
+                self.messages.put(("cancelled", profile, None))
+            except Exception as exc: # pylint: disable=broad-exception-caught
+                self.messages.put(("error", profile, exc))
+
+        self.jobs[profile] = self.executor.submit(run)
+
+    def start_distance_matrices(self) -> None:
+        """
+        Starts the distance matrices of all profiles as one background pass,
+        so they share the tile plan and the requests are interleaved. Both
+        progress bars show the progress of the whole pass, cancelling one
+        profile cancels the pass.
+        """
+
+        if self.input_file.empty:
+            self.update_info_field_text("Select input file first!")
+            return
+
+        running = [
+            profile for profile in PROFILES
+            if profile in self.jobs and not self.jobs[profile].done()
+        ]
+        if running:
+            self.update_info_field_text(
+                f"Distance matrix {', '.join(running)} is already running")
+            return
+
+        cancel = threading.Event()
+        for profile in PROFILES:
+            self.reset_progress(profile, cancel)
+
+        def progress(finished: int, total: int) -> None:
+            for profile in PROFILES:
+                self.messages.put(("progress", profile, (finished, total)))
+
+        def run() -> None:
+            try:
+                results = self.ors_helper.get_distance_matrices(
+                    locations=self.input_file,
+                    profiles=PROFILES,
+                    progress=progress,
+                    cancel=cancel
+                )
+                for profile, result in results.items():
+                    self.messages.put(("done", profile, result))
+            except MatrixCancelled:
+                for profile in PROFILES:
+                    self.messages.put(("cancelled", profile, None))
+            except Exception as exc: # pylint: disable=broad-exception-caught
+                for profile in PROFILES:
+                    self.messages.put(("error", profile, exc))
+
+        job = self.executor.submit(run)
+        for profile in PROFILES:
+            self.jobs[profile] = job
+
+    def reset_progress(self, profile: str, cancel: threading.Event) -> None:
+        """
+        Registers the cancel event of a new job of 'profile' and resets its
+        progress bar, label and cancel button.
+        """
+
+        self.cancel_events[profile] = cancel
+        self.job_started[profile] = time.monotonic()
+        self.progress_bars[profile]["value"] = 0
+        self.progress_labels[profile].config(text="Planning ...")
+        self.cancel_buttons[profile].config(state=tk.NORMAL)
+
+    def save_distance_matrix(self, profile: str, path: Union[str, None] = None) -> None:
+        """
+        Writes the distance matrix of 'profile' in the background to 'path'
+        or to a file chosen in a save dialog. The format is chosen by the
+        extension.
+        """
+
+        distance_matrix = getattr(self, f"distance_matrix_{profile}")
+        if distance_matrix.empty:
+            self.update_info_field_text(f"Get distance matrix {profile} first!")
+            return
+
+        if path is None:
+            path = filedialog.asksaveasfilename(
+                title=f"Save distance matrix {profile}",
+                initialfile=f"distance_matrix_{profile}.xlsx",
+                defaultextension=".xlsx",
+                filetypes=[
+                    ("Excel file", "*.xlsx"),
+                    ("CSV file", "*.csv"),
+                    ("Compressed CSV file", "*.csv.zst"),
+                    ("Parquet file", "*.parquet")
+                ]
+            )
+        if not path:
+            return
+
+        def run() -> None:
+            try:
+                write_matrix_file(distance_matrix, path)
+                self.messages.put(("saved", profile, path))
+            except Exception as exc: # pylint: disable=broad-exception-caught
+                self.messages.put(("save_error", profile, exc))
+
+        self.update_info_field_text(f"Saving distance matrix {profile} ...")
+        self.jobs[f"save_{profile}"] = self.executor.submit(run)
+
+    def cancel_distance_matrix(self, profile: str) -> None:
+        """
+        Cancels the running distance matrix request of 'profile'.
+        """
+
+        if profile in self.cancel_events:
+            self.cancel_events[profile].set()
+            self.progress_labels[profile].config(text="Cancelling ...")
+            self.cancel_buttons[profile].config(state=tk.DISABLED)
+
+    def process_messages(self) -> None:
+        """
+        Shows the progress and results posted by the background threads.
+        Reschedules itself with root.after.
+        """
+
+        while True:
+            try:
+                kind, profile, payload = self.messages.get_nowait()
+            except queue.Empty:
+                break
+
+            if kind == "progress":
+                self.show_progress(profile, *payload)
+                continue
+
+            if kind == "saved":
+                self.update_info_field_text(f"Saved distance matrix {profile} to {payload}")
+                continue
+
+            if kind == "save_error":
+                self.update_info_field_text(
+                    f"Saving distance matrix {profile} failed\nError message: {payload}")
+                continue
+
+            self.cancel_buttons[profile].config(state=tk.DISABLED)
+            if kind == "done":
+                setattr(self, f"distance_matrix_{profile}", payload)
+                self.progress_labels[profile].config(text="Finished")
+                self.update_info_field_text(str(payload.head(2)))
+            elif kind == "cancelled":
+                self.progress_labels[profile].config(text="Cancelled")
+            else:
+                self.progress_labels[profile].config(text="Failed")
+                self.update_info_field_text(
+                    f"Distance matrix {profile} failed\nError message: {payload}")
+
+        self.root.after(POLL_INTERVAL_MS, self.process_messages)
+
+    def show_progress(self, profile: str, finished: int, total: int) -> None:
+        """
+        Updates the progress bar and the label with tiles done, requests per
+        second and the estimated remaining time.
+        """
+
+        elapsed = max(time.monotonic() - self.job_started[profile], 1e-9)
+        rate = finished / elapsed
+        remaining = (total - finished) / rate if rate > 0 else 0.0
+
+        self.progress_bars[profile]["maximum"] = total
+        self.progress_bars[profile]["value"] = finished
+        self.progress_labels[profile].config(
+            text=f"{finished}/{total} tiles, {rate:.1f} req/s, ETA {remaining:.0f} s")
+
+    def close(self) -> None:
+        """
+        Cancels running requests and closes the window.
+        """
+
+        for cancel in self.cancel_events.values():
+            cancel.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
+
     def get_distance_matrix_car(self) -> None:
         """
-        Executes get_distance_matrix with attribut car
+        Starts get_distance_matrix with attribut car in the background
         """
-        self.distance_matrix_car = self.get_distance_matrix("car")
-        if not self.distance_matrix_car.empty:
-            self.update_info_field_text(str(self.distance_matrix_car.head(2)))
+        self.start_distance_matrix("car")
 
     def get_distance_matrix_hgv(self) -> None:
         """
-        Executes get_distance_matrix with attribut car
+        Starts get_distance_matrix with attribut hgv in the background
         """
-        self.distance_matrix_hgv = self.get_distance_matrix("hgv")
-        if not self.distance_matrix_hgv.empty:
-            self.update_info_field_text(str(self.distance_matrix_hgv.head(2)))
+        self.start_distance_matrix("hgv")
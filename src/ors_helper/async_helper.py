@@ -0,0 +1,369 @@
+"""
+Asyncio counterpart of the ORShelper. Tiles are planned and assembled by the
+shared BaseORShelper, the requests are sent with an httpx.AsyncClient and at
+most 'max_concurrency' of them are in flight at the same time.
+"""
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Callable, List, Optional, Tuple, Union
+
+import httpx
+import numpy as np
+from numpy.typing import DTypeLike
+import openrouteservice as ors
+import pandas as pd
+from .base_helper import _results_before_errors, BaseORShelper, METRICS
+from .distance_matrix import DistanceMatrix
+from .instrumentation import MetricsHook, TileMetrics
+from .ors_utils import matrix_to_long_format
+from .report import MatrixReport
+from .retry import RetryPolicy
+from .route_cache import RouteCache
+from .tile_planner import iter_rectangle, Tile, TileLimits, TileResult
+from .transport import HttpSettings
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncORShelper(BaseORShelper):
+    """
+    Helper for asyncio applications. Requests the distance matrix without
+    blocking the event loop.
+
+    Parameter
+    ---------
+    server_url : str
+        Base url of the openrouteservice server.
+    api_key : str or None
+        API key for the server.
+    max_concurrency : int
+        Number of tile requests that are in flight at the same time.
+    cache : RouteCache or None
+        Persistent cache. Only pairs that are not cached are requested.
+    tile_limits : TileLimits or None
+        Limits of a single matrix request of the server. Defaults to the
+        limits of an openrouteservice server with default configuration.
+    retry_policy : RetryPolicy or None
+        Retry policy of the tile requests. Defaults to RetryPolicy().
+    http_settings : HttpSettings or None
+        Connection limits, keep-alive and timeouts of the client built by
+        the helper. gzip_requests is not supported.
+    client : httpx.AsyncClient or None
+        Custom client used instead of the one built from http_settings, for
+        example with a mock transport or http2=True. Its base_url has to be
+        the server url.
+    metrics_hook : callable or None
+        Called with the TileMetrics of every finished tile, from the event
+        loop.
+    """
+    def __init__(
+            self,
+            server_url: str,
+            api_key: Optional[str]=None,
+            max_concurrency: int=1,
+            cache: Optional[RouteCache]=None,
+            tile_limits: Optional[TileLimits]=None,
+            retry_policy: Optional[RetryPolicy]=None,
+            http_settings: Optional[HttpSettings]=None,
+            client: Optional[httpx.AsyncClient]=None,
+            metrics_hook: Optional[MetricsHook]=None):
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency has to be at least 1, got {max_concurrency}")
+
+        super().__init__(
+            cache=cache, tile_limits=tile_limits, retry_policy=retry_policy,
+            metrics_hook=metrics_hook)
+        self.server_url = server_url
+        self.http_settings = HttpSettings() if http_settings is None else http_settings
+        self.max_concurrency = max_concurrency
+
+        headers = {"Content-Type": "application/json; charset=utf-8"}
+        if api_key is not None:
+            headers["Authorization"] = api_key
+
+        if client is None:
+            settings = self.http_settings
+            pool_maxsize = settings.pool_maxsize or max_concurrency
+            headers["Connection"] = "keep-alive" if settings.keep_alive else "close"
+            client = httpx.AsyncClient(
+                base_url=server_url,
+                timeout=httpx.Timeout(settings.read_timeout, connect=settings.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=pool_maxsize,
+                    max_keepalive_connections=pool_maxsize if settings.keep_alive else 0
+                )
+            )
+        client.headers.update(headers)
+        self.client = client
+
+    async def close(self) -> None:
+        """
+        Closes the connections of the HTTP client.
+        """
+        await self.client.aclose()
+
+    async def __aenter__(self) -> 'AsyncORShelper':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def get_distance_matrix(
+            self,
+            locations: pd.DataFrame,
+            profile: str,
+            chunk_size: Optional[int]=None,
+            max_concurrency: Optional[int]=None,
+            dense: bool=False,
+            dtype: Optional[DTypeLike]=None,
+            previous_locations: Optional[pd.DataFrame]=None,
+            previous_matrix: Optional[pd.DataFrame]=None,
+            report: Optional[MatrixReport]=None,
+            progress: Optional[Callable[[int, int], None]]=None
+    ) -> Union[pd.DataFrame, DistanceMatrix]:
+        """
+        Generates a distance matrix from a locations list. With the given
+        profile 'car' or 'hgv'.
+
+        Tiles, cache, previous results, dtype and the result format are
+        handled like in ORShelper.get_distance_matrix. 'max_concurrency'
+        overrides the number of requests in flight of the helper.
+        'progress' is called with (finished tiles, total tiles) after every
+        tile. Cancelling the awaiting task cancels the tile requests.
+        """
+
+        self._check_profile(profile)
+
+        if max_concurrency is None:
+            max_concurrency = self.max_concurrency
+
+        if dtype is None:
+            dtype = np.float32 if dense else np.float64
+
+        # the cache lookup runs in a thread, SQLite would block the event loop
+        coordinates, distances, durations, tiles = await asyncio.to_thread(
+            self._prepare_matrix, locations, profile, chunk_size, dtype,
+            previous_locations, previous_matrix, report)
+
+        logger.info(
+            "requesting %d tiles with %d concurrent requests", len(tiles), max_concurrency)
+        started = time.perf_counter()
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+        tasks = [
+            asyncio.ensure_future(
+                self._fetch_tile(coordinates, tile, profile, index, report, semaphore))
+            for index, tile in enumerate(tiles)
+        ]
+        try:
+            for finished, task in enumerate(asyncio.as_completed(tasks), start=1):
+                # raises the exception of a failed tile here
+                result = await task
+                assembly_started = time.perf_counter()
+                distances[np.ix_(result.sources, result.destinations)] = result.distances
+                durations[np.ix_(result.sources, result.destinations)] = result.durations
+                self._finish_tile_metrics(result, assembly_started)
+                if progress is not None:
+                    progress(finished, len(tasks))
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        logger.info("%d tiles finished in %.1f s", len(tiles), time.perf_counter() - started)
+
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.evict)
+
+        if dense:
+            return DistanceMatrix.from_locations(locations, locations, distances, durations)
+
+        return matrix_to_long_format(locations, distances, durations)
+
+    async def iter_distance_matrix(
+            self,
+            locations: pd.DataFrame,
+            profile: str,
+            chunk_size: Optional[int]=None,
+            max_concurrency: Optional[int]=None,
+            report: Optional[MatrixReport]=None) -> AsyncIterator[TileResult]:
+        """
+        Requests the distance matrix like get_distance_matrix, but yields
+        every tile as a TileResult as soon as it is finished, while later
+        tiles are still in flight. At most 2 * 'max_concurrency' tiles are
+        in flight or waiting to be consumed. Leaving the loop early cancels
+        the pending requests.
+
+        The cache is filled with the results, but not read, because the
+        lookup needs the full N x N matrix.
+        """
+
+        self._check_profile(profile)
+
+        if max_concurrency is None:
+            max_concurrency = self.max_concurrency
+
+        coordinates = list(
+            zip(locations["longitude"].to_list(), locations["latitude"].to_list())
+        )
+        positions = np.arange(len(coordinates))
+        tiles = iter_rectangle(positions, positions, self._tile_limits(chunk_size))
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+        pending = set()
+        try:
+            for index, tile in enumerate(tiles):
+                pending.add(asyncio.ensure_future(
+                    self._fetch_tile(coordinates, tile, profile, index, report, semaphore)))
+                if len(pending) >= 2 * max_concurrency:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED)
+                    for result in _results_before_errors(done):
+                        yield result
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for result in _results_before_errors(done):
+                    yield result
+        finally:
+            # do not request queued tiles after an error or an early stop
+            for task in pending:
+                task.cancel()
+
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.evict)
+
+    async def _fetch_tile(
+            self,
+            coordinates: List[Tuple[float, float]],
+            tile: Tile,
+            profile: str,
+            index: int=-1,
+            report: Optional[MatrixReport]=None,
+            semaphore: Optional[asyncio.Semaphore]=None) -> TileResult:
+        """
+        Requests a tile of positions in 'coordinates' while holding
+        'semaphore', stores it in the cache and returns it as a TileResult
+        with the TileMetrics of the tile.
+        """
+
+        if report is None:
+            report = MatrixReport()
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(1)
+
+        start, destination = tile
+        metrics = TileMetrics(index, profile, len(start), len(destination))
+        async with semaphore:
+            tile_distances, tile_durations = await self._request_tile_parts(
+                coordinates, start, destination, profile, report, metrics)
+
+        if self.cache is not None:
+            await asyncio.to_thread(
+                self.cache.store,
+                [coordinates[i] for i in start],
+                [coordinates[i] for i in destination],
+                profile, METRICS, tile_distances, tile_durations)
+
+        return TileResult(
+            start, destination, tile_distances, tile_durations, index, metrics)
+
+    async def _request_tile_parts(
+            self,
+            coordinates: List[Tuple[float, float]],
+            start: np.ndarray,
+            destination: np.ndarray,
+            profile: str,
+            report: MatrixReport,
+            metrics: Optional[TileMetrics]=None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Requests the parts of the start x destination positions that
+        _split_tile plans and returns the distances and durations.
+        """
+
+        parts = self._split_tile(start, destination, report, metrics)
+        part_start, part_destination = next(parts)
+        while True:
+            try:
+                try:
+                    routes = await self._request_with_retry(
+                        [coordinates[i] for i in part_start],
+                        [coordinates[i] for i in part_destination],
+                        profile,
+                        report,
+                        metrics
+                    )
+                except ors.exceptions.ApiError as exc:
+                    part_start, part_destination = parts.throw(exc)
+                else:
+                    part_start, part_destination = parts.send(routes)
+            except StopIteration as stop:
+                return stop.value
+
+    async def _request_with_retry(
+            self,
+            start_list: List[Tuple[float, float]],
+            destination_list: List[Tuple[float, float]],
+            profile: str,
+            report: MatrixReport,
+            metrics: Optional[TileMetrics]=None) -> dict:
+        """
+        Sends a tile request and retries transient errors with exponential
+        backoff and jitter within the time budget of the retry_policy.
+        """
+
+        started = time.monotonic()
+        attempt = 1
+
+        while True:
+            try:
+                return await self._request_tile(
+                    start_list, destination_list, profile, metrics)
+            except Exception as exc: # pylint: disable=broad-exception-caught
+                delay = self._retry_delay(exc, attempt, started, report, metrics)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _request_tile(
+            self,
+            start_list: List[Tuple[float, float]],
+            destination_list: List[Tuple[float, float]],
+            profile: str,
+            metrics: Optional[TileMetrics]=None) -> dict:
+        """
+        Requests a single tile of the matrix with the body the
+        openrouteservice client sends and returns the raw response. Raises
+        ors.exceptions.ApiError for an error status.
+        """
+
+        n_sources = len(start_list)
+        body = {
+            "locations": [list(coordinate) for coordinate in start_list + destination_list],
+            "sources": list(range(n_sources)),
+            "destinations": list(range(n_sources, n_sources + len(destination_list))),
+            "metrics": METRICS
+        }
+
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await self.client.post(
+                f"/v2/matrix/driving-{profile}/json", json=body)
+        finally:
+            if metrics is not None:
+                metrics.requests += 1
+                metrics.request_seconds += time.perf_counter() - started
+                if response is not None:
+                    metrics.bytes_sent += len(response.request.content)
+                    metrics.bytes_received += response.num_bytes_downloaded
+
+        if response.status_code != 200:
+            try:
+                message = response.json()
+            except ValueError:
+                message = response.text
+            raise ors.exceptions.ApiError(response.status_code, message)
+
+        return response.json()
@@ -0,0 +1,283 @@
+"""
+Pool of openrouteservice servers. Every tile request is sent to the healthy
+backend with the lowest expected wait, estimated from its requests in flight
+and its measured latency. A backend that fails several times in a row is
+taken out of rotation for a cooldown and probed again afterwards.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, List, Optional, Sequence
+
+import openrouteservice as ors
+import pandas as pd
+import requests
+from .ors_utils import RateLimiter
+from .tile_planner import TileLimits
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Backend:
+    """
+    A server of a BackendPool.
+
+    Parameter
+    ---------
+    server_url : str
+        Base url of the openrouteservice server.
+    api_key : str or None
+        API key for the server.
+    max_workers : int or None
+        Number of requests the server gets at the same time. None does not
+        limit the requests of this server.
+    requests_per_minute : int or None
+        Request quota of the server. None disables the limit.
+    tile_limits : TileLimits or None
+        Matrix limits of the server. None uses the tile_limits of the helper.
+    """
+    server_url: str
+    api_key: Optional[str] = None
+    max_workers: Optional[int] = None
+    requests_per_minute: Optional[int] = None
+    tile_limits: Optional[TileLimits] = None
+
+    def __post_init__(self):
+        if self.max_workers is not None and self.max_workers < 1:
+            raise ValueError(f"max_workers has to be at least 1, got {self.max_workers}")
+
+
+class BackendState:
+    """
+    Client, rate limiter, load and health of a backend in the pool. Only
+    changed by the pool while it holds its lock.
+    """
+    def __init__(self, backend: Backend, client: Any):
+        self.backend = backend
+        self.client = client
+        self.rate_limiter = RateLimiter(backend.requests_per_minute)
+        self.in_flight = 0
+        # smoothed seconds per successful request, None until the first one
+        self.latency: Optional[float] = None
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def has_capacity(self) -> bool:
+        """
+        Returns True if the backend can take another request.
+        """
+        return self.backend.max_workers is None or self.in_flight < self.backend.max_workers
+
+    def expected_wait(self) -> float:
+        """
+        Returns the estimated seconds until another request to the backend
+        would be answered. Backends without a measurement are tried first.
+        """
+        latency = 0.0 if self.latency is None else self.latency
+        return latency * (self.in_flight + 1) / (self.backend.max_workers or 1)
+
+    def is_suspect(self) -> bool:
+        """
+        Returns True if the backend failed before it answered a single
+        request, for example a server that is down from the start. Its
+        expected wait is unknown, not zero. Once its cooldown ended, it is
+        probed like any other backend.
+        """
+        return self.latency is None and self.consecutive_failures > 0 and not self.down_until
+
+    def post(self, url: str, body: dict) -> dict:
+        """
+        Sends 'body' to the path 'url' of the backend once and returns the
+        parsed response. Unlike ors.Client.request, rate limits and server
+        errors are not retried here but raised as ApiError, so they reach
+        the retry policy of the helper and the health of the backend.
+        """
+
+        client = self.client
+        response = client._session.post( # pylint: disable=protected-access
+            client._base_url + url, # pylint: disable=protected-access
+            json=body,
+            **client._requests_kwargs # pylint: disable=protected-access
+        )
+
+        try:
+            content = response.json()
+        except ValueError:
+            content = response.text
+        if response.status_code != 200:
+            raise ors.exceptions.ApiError(response.status_code, content)
+
+        return content
+
+
+class BackendPool:
+    """
+    Thread safe pool of openrouteservice servers that share one HTTP session.
+
+    Parameter
+    ---------
+    backends : sequence of Backend
+        Servers of the pool.
+    session : requests.Session or None
+        HTTP session of the clients. None creates one session for all of
+        them.
+    timeout : float or tuple or None
+        Timeout of the clients.
+    failure_threshold : int
+        Number of transient failures in a row that take a backend out of
+        rotation.
+    cooldown : float
+        Seconds a failing backend is out of rotation before it is probed
+        again. Every failed probe starts a new cooldown.
+    latency_smoothing : float
+        Weight of the latest request in the smoothed latency of a backend.
+    """
+    def __init__(
+            self,
+            backends: Sequence[Backend],
+            session: Optional[Any]=None,
+            timeout: Optional[Any]=None,
+            failure_threshold: int=3,
+            cooldown: float=30.0,
+            latency_smoothing: float=0.2):
+        if not backends:
+            raise ValueError("A backend pool needs at least one backend")
+        if failure_threshold < 1:
+            raise ValueError(
+                f"failure_threshold has to be at least 1, got {failure_threshold}")
+
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.latency_smoothing = latency_smoothing
+        self.session = requests.Session() if session is None else session
+        self.backends: List[BackendState] = []
+        for backend in backends:
+            client = ors.Client(
+                base_url=backend.server_url, key=backend.api_key, timeout=timeout,
+                retry_over_query_limit=False)
+            # ors.Client builds a session of its own, the clients share one
+            client._session.close() # pylint: disable=protected-access
+            client._session = self.session # pylint: disable=protected-access
+            self.backends.append(BackendState(backend, client))
+        self._condition = threading.Condition()
+
+    def __len__(self) -> int:
+        return len(self.backends)
+
+    @property
+    def max_workers(self) -> Optional[int]:
+        """
+        Sum of the max_workers of the backends, None if a backend is not
+        limited.
+        """
+        if any(state.backend.max_workers is None for state in self.backends):
+            return None
+        return sum(state.backend.max_workers for state in self.backends)
+
+    def tile_limits(self, default: TileLimits) -> TileLimits:
+        """
+        Returns limits every backend accepts, so a tile can be sent to any of
+        them. Backends without own limits have the 'default' limits.
+        """
+        limits = [
+            default if state.backend.tile_limits is None else state.backend.tile_limits
+            for state in self.backends
+        ]
+        max_locations = [
+            backend_limits.max_locations for backend_limits in limits
+            if backend_limits.max_locations is not None
+        ]
+        return TileLimits(
+            max_routes=min(backend_limits.max_routes for backend_limits in limits),
+            max_locations=min(max_locations) if max_locations else None
+        )
+
+    def acquire(self) -> BackendState:
+        """
+        Blocks until a backend has capacity and returns the healthy one with
+        the lowest expected wait. Suspect backends, that failed before
+        answering a single request, come after the others. If
+        every backend is out of rotation, the one whose cooldown ends first
+        is probed. Pass the backend to
+        release() after the request.
+        """
+
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                candidates = [
+                    state for state in self.backends
+                    if state.down_until <= now and state.has_capacity()
+                ]
+                if all(state.down_until > now for state in self.backends):
+                    candidates = sorted(
+                        (state for state in self.backends if state.has_capacity()),
+                        key=lambda state: state.down_until
+                    )[:1]
+
+                if candidates:
+                    state = min(
+                        candidates,
+                        key=lambda state: (
+                            state.is_suspect(),
+                            state.expected_wait(),
+                            state.in_flight / (state.backend.max_workers or 1)
+                        )
+                    )
+                    state.in_flight += 1
+                    return state
+
+                recoveries = [
+                    state.down_until - now for state in self.backends
+                    if state.down_until > now
+                ]
+                self._condition.wait(timeout=min(recoveries) if recoveries else None)
+
+    def release(self, state: BackendState, seconds: float, failed: bool) -> None:
+        """
+        Returns 'state' to the pool after a request that took 'seconds'.
+        'failed' marks a transient failure like a connection error, timeout
+        or gateway error, which counts against the health of the backend.
+        """
+
+        with self._condition:
+            state.in_flight -= 1
+            state.requests += 1
+            if failed:
+                state.failures += 1
+                state.consecutive_failures += 1
+                if state.consecutive_failures >= self.failure_threshold:
+                    state.down_until = time.monotonic() + self.cooldown
+                    logger.warning(
+                        "%s failed %d times in a row, out of rotation for %.0f s",
+                        state.backend.server_url, state.consecutive_failures, self.cooldown)
+            else:
+                if state.down_until:
+                    logger.info("%s is back in rotation", state.backend.server_url)
+                state.consecutive_failures = 0
+                state.down_until = 0.0
+                if state.latency is None:
+                    state.latency = seconds
+                else:
+                    state.latency += self.latency_smoothing * (seconds - state.latency)
+            self._condition.notify_all()
+
+    def stats(self) -> pd.DataFrame:
+        """
+        Returns one row per backend with the columns 'server_url',
+        'requests', 'failures', 'latency' and 'healthy'.
+        """
+
+        now = time.monotonic()
+        with self._condition:
+            return pd.DataFrame({
+                "server_url": [state.backend.server_url for state in self.backends],
+                "requests": [state.requests for state in self.backends],
+                "failures": [state.failures for state in self.backends],
+                "latency": [state.latency for state in self.backends],
+                "healthy": [state.down_until <= now for state in self.backends]
+            })
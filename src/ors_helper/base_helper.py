@@ -0,0 +1,359 @@
+"""
+Planning and result handling shared by the synchronous ORShelper and the
+AsyncORShelper. Nothing in this module sends a request.
+"""
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import Future
+from typing import Collection, Generator, Iterator, List, Optional, Tuple, Union
+
+from dotenv import load_dotenv
+import numpy as np
+from numpy.typing import DTypeLike
+import openrouteservice as ors
+import pandas as pd
+from .geo import morton_order
+from .instrumentation import emit_tile_metrics, MetricsHook, TileMetrics
+from .ors_utils import fill_from_previous
+from .report import MatrixReport
+from .retry import is_routing_error, is_transient, RetryPolicy, unroutable_location
+from .route_cache import RouteCache
+from .tile_planner import plan_pair_tiles, plan_tiles, Tile, TileLimits, TileResult
+
+METRICS = ["duration", "distance"]
+
+PROFILES = ("car", "hgv")
+
+logger = logging.getLogger(__name__)
+
+
+def _results_before_errors(
+        done: Collection[Union[Future, asyncio.Future]]) -> Iterator[TileResult]:
+    """
+    Yields the results of the finished futures or tasks, the successful ones
+    first, so a failing tile does not discard tiles that were already paid
+    for.
+    """
+    for future in sorted(
+            done, key=lambda future: future.cancelled() or future.exception() is not None):
+        yield future.result()
+
+
+class BaseORShelper:
+    """
+    Base class of the helpers. Holds the cache, tile limits, retry policy and
+    metrics hook and plans the tiles of a matrix.
+
+    Parameter
+    ---------
+    cache : RouteCache or None
+        Persistent cache. Only pairs that are not cached are requested.
+    tile_limits : TileLimits or None
+        Limits of a single matrix request of the server. Defaults to the
+        limits of an openrouteservice server with default configuration.
+    retry_policy : RetryPolicy or None
+        Retry policy of the tile requests. Defaults to RetryPolicy().
+    metrics_hook : callable or None
+        Called with the TileMetrics of every finished tile.
+    """
+    def __init__(
+            self,
+            cache: Optional[RouteCache]=None,
+            tile_limits: Optional[TileLimits]=None,
+            retry_policy: Optional[RetryPolicy]=None,
+            metrics_hook: Optional[MetricsHook]=None):
+        self.cache = cache
+        self.tile_limits = TileLimits() if tile_limits is None else tile_limits
+        self.retry_policy = RetryPolicy() if retry_policy is None else retry_policy
+        self.metrics_hook = metrics_hook
+
+    @classmethod
+    def from_env_file(cls, dotenv_path: Optional[str] = None, **kwargs):
+        """returns an instance of the helper with base_url and API key from .env
+        file. The optional MATRIX_MAX_ROUTES and MATRIX_MAX_LOCATIONS set the
+        matrix limits of the server. Further keyword arguments are passed to
+        the constructor.
+
+        SERVER_URL can list several comma separated servers if the helper
+        supports backends, like ORShelper. ORS_API_KEY is then either one key
+        for all of them or one comma separated key per server."""
+
+        load_dotenv(dotenv_path=dotenv_path)
+        server_url = os.getenv("SERVER_URL")
+        api_key = os.getenv("ORS_API_KEY")
+        max_routes = os.getenv("MATRIX_MAX_ROUTES")
+        max_locations = os.getenv("MATRIX_MAX_LOCATIONS")
+
+        if server_url is None:
+            raise ValueError("No server URL found. Check .env file")
+
+        tile_limits = TileLimits(
+            max_routes=TileLimits.max_routes if max_routes is None else int(max_routes),
+            max_locations=None if max_locations is None else int(max_locations)
+        )
+
+        kwargs.setdefault("tile_limits", tile_limits)
+
+        server_urls = [url.strip() for url in server_url.split(",")]
+        return cls._from_servers(server_urls, api_key, **kwargs)
+
+    @classmethod
+    def _from_servers(cls, server_urls: List[str], api_key: Optional[str], **kwargs):
+        """returns an instance of the helper for the servers of the .env file.
+        Helpers that support several servers override this."""
+
+        if len(server_urls) > 1:
+            raise ValueError(
+                f"{cls.__name__} supports a single server, found {len(server_urls)} "
+                "in SERVER_URL. Check .env file")
+
+        return cls(server_url=server_urls[0], api_key=api_key, **kwargs)
+
+    def plan_distance_matrix(
+            self,
+            locations: pd.DataFrame,
+            chunk_size: Optional[int]=None,
+            previous_locations: Optional[pd.DataFrame]=None,
+            previous_matrix: Optional[pd.DataFrame]=None,
+            profile: Optional[str]=None) -> List[Tile]:
+        """
+        Returns the tiles get_distance_matrix would request, without sending
+        a request. len() of the result is the planned number of requests.
+        With a 'profile' cached pairs are left out of the plan.
+        """
+
+        return self._prepare_matrix(
+            locations, profile, chunk_size, np.float32,
+            previous_locations, previous_matrix)[3]
+
+    def _prepare_matrix(
+            self,
+            locations: pd.DataFrame,
+            profile: Optional[str],
+            chunk_size: Optional[int],
+            dtype: DTypeLike,
+            previous_locations: Optional[pd.DataFrame],
+            previous_matrix: Optional[pd.DataFrame],
+            report: Optional[MatrixReport]=None,
+            route_mask: Optional[np.ndarray]=None
+    ) -> Tuple[List[Tuple[float, float]], np.ndarray, np.ndarray, List[Tile]]:
+        """
+        Builds the coordinates and the result arrays, fills them from the
+        previous result and the cache and plans the tiles of the missing
+        pairs. With a 'route_mask' only the True pairs are planned, packed
+        into tiles of nearby sources like in get_sparse_distance_matrix.
+        """
+
+        if (previous_locations is None) != (previous_matrix is None):
+            raise ValueError(
+                "previous_locations and previous_matrix have to be given together")
+
+        tile_limits = self._tile_limits(chunk_size)
+
+        coordinates = list(
+            zip(locations["longitude"].to_list(), locations["latitude"].to_list())
+        )
+        n_locations = len(coordinates)
+
+        distances = np.full((n_locations, n_locations), np.nan, dtype=dtype)
+        durations = np.full((n_locations, n_locations), np.nan, dtype=dtype)
+
+        missing = np.ones((n_locations, n_locations), dtype=bool)
+        if previous_matrix is not None:
+            missing = fill_from_previous(
+                locations, previous_locations, previous_matrix, distances, durations)
+
+        if route_mask is not None:
+            missing &= route_mask
+
+        if self.cache is not None and profile is not None and missing.any():
+            missing &= self._lookup_cache(
+                coordinates, coordinates, profile, distances, durations, report)
+
+        if route_mask is not None:
+            # the pairs of a distance threshold are scattered over the rows,
+            # grouping rows by their pattern would cover far more pairs
+            pair_sources, pair_destinations = np.nonzero(missing)
+            order = morton_order(
+                locations["latitude"].to_numpy(dtype=float),
+                locations["longitude"].to_numpy(dtype=float))
+            tiles = plan_pair_tiles(pair_sources, pair_destinations, order, tile_limits)
+        else:
+            tiles = plan_tiles(missing, tile_limits)
+
+        return coordinates, distances, durations, tiles
+
+    def _lookup_cache(
+            self,
+            sources: List[Tuple[float, float]],
+            destinations: List[Tuple[float, float]],
+            profile: str,
+            distances: np.ndarray,
+            durations: np.ndarray,
+            report: Optional[MatrixReport]) -> np.ndarray:
+        """
+        Fills the arrays from the cache, counts the hits in 'report' and
+        returns the mask of the pairs that are not cached.
+        """
+
+        missing = self.cache.lookup(
+            sources, destinations, profile, METRICS, distances, durations)
+        n_hits = missing.size - int(missing.sum())
+        if report is not None:
+            report.add_cache_hits(n_hits)
+        logger.info("%s: %d of %d pairs found in the cache", profile, n_hits, missing.size)
+
+        return missing
+
+    def _finish_tile_metrics(self, result: TileResult, assembly_started: float) -> None:
+        """
+        Adds the assembly time since 'assembly_started' to the metrics of
+        'result', logs them and passes them to the metrics hook.
+        """
+
+        if result.metrics is not None:
+            result.metrics.assembly_seconds += time.perf_counter() - assembly_started
+        emit_tile_metrics(result.metrics, self.metrics_hook)
+
+    def _tile_limits(self, chunk_size: Optional[int]) -> TileLimits:
+        """
+        Returns the tile limits of square 'chunk_size' tiles if a chunk_size
+        is given, otherwise the tile_limits of the helper.
+        """
+
+        if chunk_size is None:
+            return self.tile_limits
+
+        return TileLimits.from_chunk_size(chunk_size)
+
+
+    def _retry_delay(
+            self,
+            exc: Exception,
+            attempt: int,
+            started: float,
+            report: MatrixReport,
+            metrics: Optional[TileMetrics]=None) -> Optional[float]:
+        """
+        Returns the delay in seconds before the next attempt of a request that
+        failed with 'exc' in attempt number 'attempt', or None if the request
+        is not retried. 'started' is the time.monotonic() of the first
+        attempt. A retry is counted in 'report' and 'metrics'.
+        """
+
+        policy = self.retry_policy
+        if not is_transient(exc) or attempt >= policy.max_attempts:
+            return None
+
+        delay = policy.delay(attempt)
+        elapsed = time.monotonic() - started
+        if policy.tile_timeout is not None and elapsed + delay > policy.tile_timeout:
+            return None
+
+        report.add_retry()
+        if metrics is not None:
+            metrics.retries += 1
+        return delay
+
+    def _split_tile(
+            self,
+            start: np.ndarray,
+            destination: np.ndarray,
+            report: MatrixReport,
+            metrics: Optional[TileMetrics]=None
+    ) -> Generator[Tuple[np.ndarray, np.ndarray], dict, Tuple[np.ndarray, np.ndarray]]:
+        """
+        Plans the requests of the start x destination positions. Yields the
+        start and destination positions of the next part to request, expects
+        the response to be sent or the ApiError of the part to be thrown in
+        and returns the distances and durations of the tile.
+
+        A part that fails with a routing error drops the location the error
+        names and is requested again. If the error names no location the
+        part is split into halves. A part with a single start or destination
+        that still fails is unroutable as a whole, even if only one of the
+        other locations can not be routed. Other errors are raised, so no
+        pair of the tile is cached.
+        """
+
+        distances = np.full((len(start), len(destination)), np.nan)
+        durations = np.full((len(start), len(destination)), np.nan)
+        parts = [(np.arange(len(start)), np.arange(len(destination)))]
+
+        while parts:
+            rows, columns = parts.pop()
+            try:
+                routes = yield start[rows], destination[columns]
+            except ors.exceptions.ApiError as exc:
+                if not is_routing_error(exc) or not self.retry_policy.split_failed_tiles:
+                    raise
+
+                positions = np.concatenate([start[rows], destination[columns]])
+                location = unroutable_location(exc)
+                if location is not None and location < len(positions):
+                    # the location is unroutable as start and as destination
+                    bad_rows = start[rows] == positions[location]
+                    bad_columns = destination[columns] == positions[location]
+                elif len(rows) == 1 or len(columns) == 1:
+                    bad_rows = np.ones(len(rows), dtype=bool)
+                    bad_columns = np.ones(len(columns), dtype=bool)
+                else:
+                    report.add_split()
+                    if len(rows) >= len(columns):
+                        half = len(rows) // 2
+                        parts += [(rows[half:], columns), (rows[:half], columns)]
+                    else:
+                        half = len(columns) // 2
+                        parts += [(rows, columns[half:]), (rows, columns[:half])]
+                    continue
+
+                bad_rows_index, bad_columns_index = np.nonzero(
+                    bad_rows[:, None] | bad_columns[None, :])
+                report.add_unroutable(
+                    start[rows[bad_rows_index]],
+                    destination[columns[bad_columns_index]],
+                    str(exc))
+                if not bad_rows.all() and not bad_columns.all():
+                    parts.append((rows[~bad_rows], columns[~bad_columns]))
+                continue
+
+            cells = np.ix_(rows, columns)
+            distances[cells], durations[cells] = self._parse_routes(
+                routes, start[rows], destination[columns], report, metrics)
+
+        return distances, durations
+
+    @staticmethod
+    def _check_profile(profile: str) -> None:
+        """
+        Raises ValueError for a profile that is not in PROFILES.
+        """
+        if profile not in PROFILES:
+            raise ValueError(
+                f"Chosen profile is expected to be 'car' or 'hgv', got {profile}")
+
+    @staticmethod
+    def _parse_routes(
+            routes: dict,
+            start: np.ndarray,
+            destination: np.ndarray,
+            report: MatrixReport,
+            metrics: Optional[TileMetrics]=None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Converts a matrix response into distance and duration arrays and
+        records the pairs without a route in 'report'.
+        """
+
+        started = time.perf_counter()
+        tile_distances = np.asarray(routes["distances"], dtype=float)
+        tile_durations = np.asarray(routes["durations"], dtype=float)
+        if metrics is not None:
+            metrics.parse_seconds += time.perf_counter() - started
+
+        rows, columns = np.nonzero(np.isnan(tile_distances) | np.isnan(tile_durations))
+        if len(rows):
+            report.add_unroutable(start[rows], destination[columns], "no route found")
+
+        return tile_distances, tile_durations
@@ -0,0 +1,127 @@
+"""
+Checkpoint manifest of a streamed matrix job. Every finished tile is
+appended as one JSON line, so a job that was interrupted can be rerun and
+only requests the tiles that are still missing.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Optional, Set, Tuple
+
+import pandas as pd
+
+from .tile_planner import TileLimits
+
+
+def job_fingerprint(locations: pd.DataFrame, profile: str, tile_limits: TileLimits) -> str:
+    """
+    Returns a hash of everything that decides the tile plan of a job: the
+    ids and coordinates of the locations, the profile and the tile limits.
+    """
+
+    digest = hashlib.sha256()
+    digest.update(profile.encode())
+    digest.update(repr((tile_limits.max_routes, tile_limits.max_locations)).encode())
+    digest.update(
+        pd.util.hash_pandas_object(
+            locations[["id", "latitude", "longitude"]], index=False
+        ).to_numpy().tobytes()
+    )
+    return digest.hexdigest()
+
+
+class Checkpoint:
+    """
+    Append-only manifest of the finished tiles of a job.
+
+    Parameter
+    ---------
+    path : str
+        Path of the manifest file, usually next to the partial output.
+    sync_every : int
+        The manifest is flushed after every tile and synced to disk after
+        every 'sync_every' tiles.
+    """
+    def __init__(self, path: str, sync_every: int=100):
+        self.path = path
+        self.sync_every = sync_every
+        self.completed: Set[int] = set()
+        self.finished = False
+        # True when open() continued the manifest of an earlier run
+        self.resumed = False
+        self._file = None
+        self._unsynced = 0
+
+    def open(self, fingerprint: str) -> Tuple[Set[int], Optional[Any]]:
+        """
+        Opens the manifest for the job with 'fingerprint'. Returns the indices
+        of the finished tiles and the last state of the output sink.
+
+        Raises
+        ------
+        ValueError
+            When the manifest belongs to a job with other input.
+        """
+
+        sink_state = None
+        valid_size = 0
+
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as file:
+                for number, line in enumerate(file):
+                    if not line.endswith(b"\n"):
+                        # the last line of an interrupted write
+                        break
+                    entry = json.loads(line)
+                    if number == 0 and entry["fingerprint"] != fingerprint:
+                        raise ValueError(
+                            f"Checkpoint {self.path} belongs to a job with other input")
+                    if "tile" in entry:
+                        self.completed.add(entry["tile"])
+                        sink_state = entry["sink_state"]
+                    elif entry.get("finished"):
+                        self.finished = True
+                    valid_size += len(line)
+
+            os.truncate(self.path, valid_size)
+
+        self.resumed = valid_size > 0
+        self._file = open(self.path, "a", encoding="utf-8")
+        if valid_size == 0:
+            self._file.write(json.dumps({"fingerprint": fingerprint}) + "\n")
+            self._file.flush()
+
+        return set(self.completed), sink_state
+
+    def mark_done(self, tile_index: int, sink_state: Optional[Any]=None) -> None:
+        """
+        Records a tile as finished together with the state of the sink after
+        it was written.
+        """
+
+        self._file.write(json.dumps({"tile": tile_index, "sink_state": sink_state}) + "\n")
+        self._file.flush()
+        self.completed.add(tile_index)
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def finish(self) -> None:
+        """
+        Marks the job as finished and closes the manifest.
+        """
+
+        self._file.write(json.dumps({"finished": True}) + "\n")
+        self.finished = True
+        self.close()
+
+    def close(self) -> None:
+        """
+        Syncs and closes the manifest.
+        """
+
+        if self._file is not None and not self._file.closed:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
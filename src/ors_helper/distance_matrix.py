@@ -0,0 +1,276 @@
+"""
+Compact dense result of a matrix run. Holds the ids of the sources and
+destinations and one sources x destinations array per metric, instead of
+a long DataFrame with four index and id columns per pair.
+"""
+import os
+from typing import Dict, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from .ors_utils import tile_to_long_format
+
+NPY_FILES = (
+    "start_ids", "destination_ids", "start_index", "destination_index",
+    "distances", "durations"
+)
+
+
+class DistanceMatrix:
+    """
+    Distances and durations between every source and every destination.
+
+    Parameter
+    ---------
+    start_ids : array like
+        Ids of the sources, one per row.
+    destination_ids : array like
+        Ids of the destinations, one per column.
+    distances : np.ndarray
+        len(start_ids) x len(destination_ids) distances in meters.
+    durations : np.ndarray
+        len(start_ids) x len(destination_ids) durations in seconds.
+    start_index : array like or None
+        Index of the sources in the input DataFrame. Defaults to the positions.
+    destination_index : array like or None
+        Index of the destinations in the input DataFrame. Defaults to the
+        positions.
+    estimated : np.ndarray or None
+        Boolean array that is True for the pairs with an estimated instead of
+        a routed value. None means every pair was routed.
+    """
+    def __init__(
+            self,
+            start_ids: Sequence[Hashable],
+            destination_ids: Sequence[Hashable],
+            distances: np.ndarray,
+            durations: np.ndarray,
+            start_index: Optional[Sequence]=None,
+            destination_index: Optional[Sequence]=None,
+            estimated: Optional[np.ndarray]=None):
+        self.start_ids = np.asarray(start_ids)
+        self.destination_ids = np.asarray(destination_ids)
+        self.distances = distances
+        self.durations = durations
+        self.start_index = (
+            np.arange(len(self.start_ids)) if start_index is None
+            else np.asarray(start_index)
+        )
+        self.destination_index = (
+            np.arange(len(self.destination_ids)) if destination_index is None
+            else np.asarray(destination_index)
+        )
+
+        self.estimated = estimated
+
+        expected = (len(self.start_ids), len(self.destination_ids))
+        if distances.shape != expected or durations.shape != expected:
+            raise ValueError(
+                f"distances and durations have to be of shape {expected}, "
+                f"got {distances.shape} and {durations.shape}")
+
+        self._start_positions: Optional[Dict[Hashable, int]] = None
+        self._destination_positions: Optional[Dict[Hashable, int]] = None
+
+    @classmethod
+    def from_locations(
+            cls,
+            source_locations: pd.DataFrame,
+            destination_locations: pd.DataFrame,
+            distances: np.ndarray,
+            durations: np.ndarray,
+            estimated: Optional[np.ndarray]=None) -> 'DistanceMatrix':
+        """returns the matrix with ids and index taken from the location
+        DataFrames the arrays are ordered like"""
+        return cls(
+            source_locations["id"].to_numpy(),
+            destination_locations["id"].to_numpy(),
+            distances,
+            durations,
+            start_index=source_locations.index.to_numpy(),
+            destination_index=destination_locations.index.to_numpy(),
+            estimated=estimated
+        )
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """
+        Number of (sources, destinations).
+        """
+        return self.distances.shape
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory of the arrays in bytes.
+        """
+        return sum(
+            array.nbytes for array in (
+                self.start_ids, self.destination_ids, self.start_index,
+                self.destination_index, self.distances, self.durations
+            )
+        )
+
+    def __len__(self) -> int:
+        return self.distances.size
+
+    def __repr__(self) -> str:
+        return (
+            f"DistanceMatrix({self.shape[0]} sources x {self.shape[1]} destinations, "
+            f"dtype={self.distances.dtype})"
+        )
+
+    def start_position(self, start_id: Hashable) -> int:
+        """
+        Returns the row of 'start_id'. Raises KeyError for an unknown id.
+        """
+        if self._start_positions is None:
+            self._start_positions = {
+                start_id: position for position, start_id in enumerate(self.start_ids.tolist())
+            }
+        return self._start_positions[start_id]
+
+    def destination_position(self, destination_id: Hashable) -> int:
+        """
+        Returns the column of 'destination_id'. Raises KeyError for an unknown
+        id.
+        """
+        if self._destination_positions is None:
+            self._destination_positions = {
+                destination_id: position
+                for position, destination_id in enumerate(self.destination_ids.tolist())
+            }
+        return self._destination_positions[destination_id]
+
+    def lookup(self, start_id: Hashable, destination_id: Hashable) -> Tuple[float, float]:
+        """
+        Returns (distance, duration) from 'start_id' to 'destination_id'.
+        """
+        row = self.start_position(start_id)
+        column = self.destination_position(destination_id)
+        return float(self.distances[row, column]), float(self.durations[row, column])
+
+    def __getitem__(self, key: Tuple[Hashable, Hashable]) -> Tuple[float, float]:
+        return self.lookup(*key)
+
+    def rows(self, start_ids: Sequence[Hashable]) -> 'DistanceMatrix':
+        """
+        Returns the matrix of the sources 'start_ids' to all destinations.
+        """
+        positions = [self.start_position(start_id) for start_id in start_ids]
+        return self._take(positions, slice(None))
+
+    def columns(self, destination_ids: Sequence[Hashable]) -> 'DistanceMatrix':
+        """
+        Returns the matrix of all sources to the destinations
+        'destination_ids'.
+        """
+        positions = [
+            self.destination_position(destination_id) for destination_id in destination_ids
+        ]
+        return self._take(slice(None), positions)
+
+    def iloc(self, rows: slice=slice(None), columns: slice=slice(None)) -> 'DistanceMatrix':
+        """
+        Returns the matrix of the positions 'rows' x 'columns'. Slices return
+        views of the arrays without a copy.
+        """
+        return self._take(rows, columns)
+
+    def _take(self, rows, columns) -> 'DistanceMatrix':
+        def take(array: Optional[np.ndarray]) -> Optional[np.ndarray]:
+            if array is None:
+                return None
+            if isinstance(rows, slice) or isinstance(columns, slice):
+                return array[rows][:, columns]
+            return array[np.ix_(rows, columns)]
+
+        return DistanceMatrix(
+            self.start_ids[rows],
+            self.destination_ids[columns],
+            take(self.distances),
+            take(self.durations),
+            start_index=self.start_index[rows],
+            destination_index=self.destination_index[columns],
+            estimated=take(self.estimated)
+        )
+
+    def to_numpy(self, metric: str="distance") -> np.ndarray:
+        """
+        Returns the array of 'metric' ('distance' or 'duration') without a
+        copy.
+        """
+        if metric == "distance":
+            return self.distances
+        if metric == "duration":
+            return self.durations
+        raise ValueError(f"metric is expected to be 'distance' or 'duration', got {metric}")
+
+    def to_arrow(self, metric: str="distance") -> pa.FixedSizeListArray:
+        """
+        Returns the rows of 'metric' as a fixed size list array. The values
+        buffer shares the memory of a C-contiguous array.
+        """
+        array = self.to_numpy(metric)
+        values = pa.array(np.ascontiguousarray(array).reshape(-1))
+        return pa.FixedSizeListArray.from_arrays(values, self.shape[1])
+
+    def save(self, directory: str) -> None:
+        """
+        Saves the ids and arrays as *.npy files into 'directory', so load()
+        can memory-map them.
+        """
+        os.makedirs(directory, exist_ok=True)
+        arrays = {
+            "start_ids": self.start_ids.astype(str),
+            "destination_ids": self.destination_ids.astype(str),
+            "start_index": self.start_index,
+            "destination_index": self.destination_index,
+            "distances": self.distances,
+            "durations": self.durations
+        }
+        if self.estimated is not None:
+            arrays["estimated"] = self.estimated
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), array, allow_pickle=False)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str]="r") -> 'DistanceMatrix':
+        """
+        Loads a matrix written by save(). With the default 'mmap_mode' the
+        distances and durations are memory-mapped and only read from disk
+        when they are accessed. Ids are loaded as strings.
+        """
+        arrays = {
+            name: np.load(
+                os.path.join(directory, f"{name}.npy"),
+                mmap_mode=mmap_mode if name in ("distances", "durations") else None,
+                allow_pickle=False
+            )
+            for name in NPY_FILES
+        }
+        estimated_path = os.path.join(directory, "estimated.npy")
+        if os.path.exists(estimated_path):
+            arrays["estimated"] = np.load(estimated_path, allow_pickle=False)
+        return cls(**arrays)
+
+    def to_long_dataframe(self) -> pd.DataFrame:
+        """
+        Returns the long format DataFrame with the columns 'start_index',
+        'destination_index', 'distance', 'duration', 'start_id' and
+        'destination_id', ordered by start and then by destination. A matrix
+        with estimated pairs gets the column 'method' with the values
+        'routed' and 'estimated'.
+        """
+        long_df = tile_to_long_format(
+            pd.DataFrame({"id": self.start_ids}, index=self.start_index),
+            pd.DataFrame({"id": self.destination_ids}, index=self.destination_index),
+            self.distances,
+            self.durations
+        )
+        if self.estimated is not None:
+            long_df["method"] = pd.Categorical.from_codes(
+                self.estimated.ravel().astype(np.int8), categories=["routed", "estimated"])
+
+        return long_df
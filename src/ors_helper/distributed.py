@@ -0,0 +1,368 @@
+"""
+Distributed matrix jobs. A coordinator writes the tile plan of a job into a
+shared directory, workers on this or other hosts claim tiles, request them
+and write the tile results into the directory, and a merge step assembles
+the final matrix. A claim is a file that is created exclusively, so the
+directory is the only coordination the workers need, locally or on a
+network file system.
+
+Layout of a job directory:
+
+    job.json           profile, number of tiles, fingerprint, dtype and lease
+                       of a claim
+    locations.parquet  locations of the job
+    tiles.npy          n_tiles x 4 array of the source and destination
+                       position ranges of every tile
+    claims/            one file per claimed tile with the id of the worker
+    results/           one *.npz file per finished tile
+
+Usage of a worker: python -m src.ors_helper.distributed job_directory
+    [--env-file .env] [--workers 4]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Union
+
+import numpy as np
+from numpy.typing import DTypeLike
+import pandas as pd
+from .base_helper import BaseORShelper
+from .checkpoint import job_fingerprint
+from .distance_matrix import DistanceMatrix
+from .ors_helper import ORShelper
+from .ors_utils import matrix_to_long_format
+from .tile_planner import iter_rectangle, Tile, TileLimits, TileResult
+
+JOB_FILE = "job.json"
+LOCATIONS_FILE = "locations.parquet"
+TILES_FILE = "tiles.npy"
+CLAIMS_DIR = "claims"
+RESULTS_DIR = "results"
+
+DEFAULT_LEASE_SECONDS = 900.0
+
+
+class DistributedJob:
+    """
+    Tile plan, claims and results of a distributed matrix job in a shared
+    directory. Create a job with DistributedJob.create, open it on the
+    workers with DistributedJob(directory).
+
+    Parameter
+    ---------
+    directory : str
+        Job directory written by DistributedJob.create.
+    lease_seconds : float or None
+        A claim without a result that is older than this is treated as the
+        claim of a dead worker and taken over. Has to be longer than a tile
+        takes, including its retries. None uses the lease the job was
+        created with.
+    """
+    def __init__(self, directory: str, lease_seconds: Optional[float]=None):
+        self.directory = directory
+
+        with open(os.path.join(directory, JOB_FILE), encoding="utf-8") as file:
+            job = json.load(file)
+        if lease_seconds is None:
+            lease_seconds = job.get("lease_seconds", DEFAULT_LEASE_SECONDS)
+        self.lease_seconds: float = lease_seconds
+        self.profile: str = job["profile"]
+        self.fingerprint: str = job["fingerprint"]
+        self.dtype = np.dtype(job["dtype"])
+        self.tile_ranges: np.ndarray = np.load(os.path.join(directory, TILES_FILE))
+        self._locations: Optional[pd.DataFrame] = None
+
+    @classmethod
+    def create(
+            cls,
+            directory: str,
+            locations: pd.DataFrame,
+            profile: str,
+            tile_limits: Optional[TileLimits]=None,
+            dtype: DTypeLike=np.float32,
+            lease_seconds: float=DEFAULT_LEASE_SECONDS) -> 'DistributedJob':
+        """
+        Writes the tile plan of the matrix of 'locations' with 'profile' into
+        'directory' and returns the job. The tiles are planned like in
+        ORShelper.get_distance_matrix with 'tile_limits', the results are
+        stored as 'dtype'. 'lease_seconds' is stored with the job, so every
+        worker that opens it uses the same lease.
+
+        An existing job with the same input is returned as it is, so its
+        finished tiles are kept.
+
+        Raises
+        ------
+        ValueError
+            When the directory holds a job with other input.
+        """
+
+        BaseORShelper._check_profile(profile) # pylint: disable=protected-access
+        if tile_limits is None:
+            tile_limits = TileLimits()
+
+        fingerprint = job_fingerprint(locations, profile, tile_limits)
+        if os.path.exists(os.path.join(directory, JOB_FILE)):
+            job = cls(directory, lease_seconds=lease_seconds)
+            if job.fingerprint != fingerprint:
+                raise ValueError(f"Job directory {directory} belongs to a job with other input")
+            return job
+
+        os.makedirs(os.path.join(directory, CLAIMS_DIR), exist_ok=True)
+        os.makedirs(os.path.join(directory, RESULTS_DIR), exist_ok=True)
+
+        positions = np.arange(len(locations))
+        tile_ranges = np.array([
+            (sources[0], sources[-1] + 1, destinations[0], destinations[-1] + 1)
+            for sources, destinations in iter_rectangle(positions, positions, tile_limits)
+        ], dtype=np.int64).reshape(-1, 4)
+        np.save(os.path.join(directory, TILES_FILE), tile_ranges)
+        locations.to_parquet(os.path.join(directory, LOCATIONS_FILE))
+
+        # written last, a directory with a job file holds a complete plan
+        _write_atomic(os.path.join(directory, JOB_FILE), json.dumps({
+            "profile": profile,
+            "n_tiles": len(tile_ranges),
+            "fingerprint": fingerprint,
+            "dtype": np.dtype(dtype).name,
+            "lease_seconds": lease_seconds
+        }))
+
+        return cls(directory, lease_seconds=lease_seconds)
+
+    @property
+    def n_tiles(self) -> int:
+        """
+        Number of tiles of the job.
+        """
+        return len(self.tile_ranges)
+
+    @property
+    def locations(self) -> pd.DataFrame:
+        """
+        Locations of the job, read on first access.
+        """
+        if self._locations is None:
+            self._locations = pd.read_parquet(os.path.join(self.directory, LOCATIONS_FILE))
+        return self._locations
+
+    def tile(self, index: int) -> Tile:
+        """
+        Returns the source and destination positions of tile 'index'.
+        """
+        source_start, source_stop, destination_start, destination_stop = self.tile_ranges[index]
+        return np.arange(source_start, source_stop), np.arange(destination_start, destination_stop)
+
+    def claim(self, worker_id: str, start: int=0) -> Optional[int]:
+        """
+        Claims the first tile from 'start' on, wrapping around, that has no
+        result and no live claim of another worker. Returns its index, or
+        None if no tile can be claimed.
+        """
+
+        for offset in range(self.n_tiles):
+            index = (start + offset) % self.n_tiles
+            if os.path.exists(self._result_path(index)):
+                continue
+
+            claim_path = self._claim_path(index)
+            try:
+                with open(claim_path, "x", encoding="utf-8") as file:
+                    file.write(worker_id)
+                return index
+            except FileExistsError:
+                pass
+
+            try:
+                age = time.time() - os.path.getmtime(claim_path)
+            except FileNotFoundError:
+                # released in between, the next scan picks it up
+                continue
+            if age > self.lease_seconds and not os.path.exists(self._result_path(index)):
+                # the claim of a dead worker. Two workers that take it over
+                # at the same time both request the tile, the results are
+                # the same.
+                _write_atomic(claim_path, worker_id)
+                return index
+
+        return None
+
+    def release(self, index: int) -> None:
+        """
+        Removes the claim of tile 'index', so other workers can claim it.
+        """
+        try:
+            os.remove(self._claim_path(index))
+        except FileNotFoundError:
+            pass
+
+    def complete(self, result: TileResult) -> None:
+        """
+        Writes the result of a claimed tile. The file is moved into place
+        when it is complete, so a partial result is never read.
+        """
+
+        path = self._result_path(result.index)
+        temporary_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temporary_path, "wb") as file:
+            np.savez(
+                file,
+                distances=result.distances.astype(self.dtype, copy=False),
+                durations=result.durations.astype(self.dtype, copy=False)
+            )
+        os.replace(temporary_path, path)
+
+    def missing_tiles(self) -> List[int]:
+        """
+        Returns the indices of the tiles without a result.
+        """
+        finished = set(os.listdir(os.path.join(self.directory, RESULTS_DIR)))
+        return [
+            index for index in range(self.n_tiles)
+            if os.path.basename(self._result_path(index)) not in finished
+        ]
+
+    def is_complete(self) -> bool:
+        """
+        Returns True if every tile has a result.
+        """
+        return not self.missing_tiles()
+
+    def iter_results(self) -> Iterator[TileResult]:
+        """
+        Yields the TileResult of every tile in plan order, for example to
+        write them into a TileSink without holding the matrix in memory.
+
+        Raises
+        ------
+        ValueError
+            When tiles have no result yet.
+        """
+
+        missing = self.missing_tiles()
+        if missing:
+            raise ValueError(
+                f"{len(missing)} of {self.n_tiles} tiles of the job in {self.directory} "
+                "have no result yet")
+
+        for index in range(self.n_tiles):
+            sources, destinations = self.tile(index)
+            with np.load(self._result_path(index)) as data:
+                yield TileResult(
+                    sources, destinations, data["distances"], data["durations"], index)
+
+    def merge(
+            self,
+            dense: bool=False,
+            dtype: Optional[DTypeLike]=None) -> Union[pd.DataFrame, DistanceMatrix]:
+        """
+        Assembles the tile results into the distance matrix of the job, in
+        the format ORShelper.get_distance_matrix returns with 'dense' and
+        'dtype'.
+
+        Raises
+        ------
+        ValueError
+            When tiles have no result yet.
+        """
+
+        if dtype is None:
+            dtype = np.float32 if dense else np.float64
+
+        locations = self.locations
+        n_locations = len(locations)
+        distances = np.full((n_locations, n_locations), np.nan, dtype=dtype)
+        durations = np.full((n_locations, n_locations), np.nan, dtype=dtype)
+
+        for result in self.iter_results():
+            distances[np.ix_(result.sources, result.destinations)] = result.distances
+            durations[np.ix_(result.sources, result.destinations)] = result.durations
+
+        if dense:
+            return DistanceMatrix.from_locations(locations, locations, distances, durations)
+
+        return matrix_to_long_format(locations, distances, durations)
+
+    def _claim_path(self, index: int) -> str:
+        return os.path.join(self.directory, CLAIMS_DIR, f"tile-{index:08d}")
+
+    def _result_path(self, index: int) -> str:
+        return os.path.join(self.directory, RESULTS_DIR, f"tile-{index:08d}.npz")
+
+
+def _write_atomic(path: str, content: str) -> None:
+    """
+    Writes 'content' to 'path' through a temporary file that is renamed, so
+    readers see the old or the new content, never a partial one.
+    """
+    temporary_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as file:
+        file.write(content)
+    os.replace(temporary_path, path)
+
+
+def run_local_workers(
+        directory: str,
+        n_workers: int,
+        dotenv_path: Optional[str]=None,
+        **helper_kwargs) -> int:
+    """
+    Runs 'n_workers' worker processes on this host until the job in
+    'directory' is complete and returns the number of tiles they requested.
+    Every worker builds an ORShelper from 'helper_kwargs', max_workers is
+    the number of concurrent tiles within a worker. Without a server_url or
+    backends the servers are read from the .env file at 'dotenv_path'.
+    """
+
+    if n_workers < 1:
+        raise ValueError(f"n_workers has to be at least 1, got {n_workers}")
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = [
+            executor.submit(_run_worker_process, directory, dotenv_path, helper_kwargs)
+            for _ in range(n_workers)
+        ]
+        return sum(future.result() for future in futures)
+
+
+def _run_worker_process(directory: str, dotenv_path: Optional[str], helper_kwargs: dict) -> int:
+    """
+    Entry point of a worker process.
+    """
+    if "server_url" in helper_kwargs or "backends" in helper_kwargs:
+        helper = ORShelper(**helper_kwargs)
+    else:
+        helper = ORShelper.from_env_file(dotenv_path=dotenv_path, **helper_kwargs)
+    try:
+        return helper.run_worker(DistributedJob(directory))
+    finally:
+        helper.close()
+
+
+def main(argv: Optional[List[str]]=None) -> int:
+    """
+    Runs a worker on the job directory given on the command line.
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Requests the tiles of a distributed matrix job.")
+    parser.add_argument("directory", help="Job directory written by the coordinator")
+    parser.add_argument(
+        "--env-file", help="Path of the .env file with SERVER_URL and ORS_API_KEY")
+    parser.add_argument(
+        "-w", "--workers", type=int, default=1,
+        help="Number of concurrent tile requests. Default: 1")
+    args = parser.parse_args(argv)
+
+    written = _run_worker_process(args.directory, args.env_file, {"max_workers": args.workers})
+    print(f"Requested {written} tiles of {args.directory}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
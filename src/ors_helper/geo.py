@@ -0,0 +1,298 @@
+"""
+Vectorized great-circle computations on the latitude and longitude columns,
+used to select candidate pairs and to estimate road distances before
+anything is requested from the server.
+"""
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_METERS = 6_371_008.8
+
+# smallest edge of the grid cells of candidate_pairs on the unit sphere,
+# about 12 m
+MIN_CELL_SIZE = 2.0 ** -19
+
+# typical ratio of road distance to great-circle distance
+DETOUR_FACTORS: Dict[str, float] = {"car": 1.3, "hgv": 1.35}
+
+# average speeds in m/s used to estimate durations
+AVERAGE_SPEEDS: Dict[str, float] = {"car": 50 / 3.6, "hgv": 40 / 3.6}
+
+
+def haversine_matrix(
+        source_latitude: np.ndarray,
+        source_longitude: np.ndarray,
+        destination_latitude: np.ndarray,
+        destination_longitude: np.ndarray) -> np.ndarray:
+    """
+    Returns the great-circle distances in meters between every source and
+    every destination as a sources x destinations array.
+    """
+
+    source_lat = np.radians(np.asarray(source_latitude, dtype=float))[:, None]
+    source_lon = np.radians(np.asarray(source_longitude, dtype=float))[:, None]
+    destination_lat = np.radians(np.asarray(destination_latitude, dtype=float))[None, :]
+    destination_lon = np.radians(np.asarray(destination_longitude, dtype=float))[None, :]
+
+    a = (
+        np.sin((destination_lat - source_lat) / 2) ** 2
+        + np.cos(source_lat) * np.cos(destination_lat)
+        * np.sin((destination_lon - source_lon) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def estimate_matrix(
+        latitude: np.ndarray,
+        longitude: np.ndarray,
+        profile: str,
+        detour_factor: Optional[float]=None,
+        speed: Optional[float]=None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the estimated road (distances, durations) between all locations
+    as N x N arrays: the great-circle distance times 'detour_factor' and the
+    time needed for it at 'speed' m/s. Both default to the values of
+    'profile' in DETOUR_FACTORS and AVERAGE_SPEEDS.
+    """
+
+    if detour_factor is None:
+        detour_factor = DETOUR_FACTORS[profile]
+    if speed is None:
+        speed = AVERAGE_SPEEDS[profile]
+
+    distances = haversine_matrix(latitude, longitude, latitude, longitude)
+    distances *= detour_factor
+    return distances, distances / speed
+
+
+def candidate_pairs(
+        latitude: np.ndarray,
+        longitude: np.ndarray,
+        k: Optional[int]=None,
+        radius: Optional[float]=None,
+        block_size: int=1024) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the (source positions, destination positions) of the candidate
+    pairs of every location: its 'k' nearest other locations, the other
+    locations within 'radius' meters, or with both the k nearest within the
+    radius. The pairs are ordered by source and destination.
+
+    The locations are sorted into a grid of cubic cells over their unit
+    vectors, so a source is only compared with the locations in the cells
+    around it. Sources whose neighbours are not within a few rings of cells,
+    like remote outliers, are compared with all locations. 'block_size'
+    sources are handled at a time, which bounds the memory.
+    """
+
+    if k is None and radius is None:
+        raise ValueError("k or radius has to be given")
+
+    latitude = np.asarray(latitude, dtype=float)
+    longitude = np.asarray(longitude, dtype=float)
+    n_locations = len(latitude)
+    if k is not None and k >= n_locations - 1:
+        # every other location is among the k nearest
+        k = None
+    if k is None and radius is None:
+        return _scan_pairs(latitude, longitude, np.arange(n_locations), k, radius, block_size)
+
+    points = _unit_vectors(latitude, longitude)
+    radius_chord = None if radius is None else _chord(radius)
+    size = _cell_size(points, k, radius_chord)
+    cells = np.floor((points + 1.0) / size).astype(np.int64)
+    n_cells = int(cells.max()) + 1
+    keys = _cell_keys(cells, n_cells)
+    order = np.argsort(keys, kind="stable")
+    # the locations of occupied cell i are order[cell_starts[i]:][:cell_counts[i]]
+    cell_keys, cell_starts, cell_counts = np.unique(
+        keys[order], return_index=True, return_counts=True)
+    grid = (cells, n_cells, order, cell_keys, cell_starts, cell_counts)
+
+    sources, destinations = [], []
+    pending = np.arange(n_locations)
+    for ring in (1, 2, 4):
+        unresolved = []
+        for start in range(0, len(pending), block_size):
+            block_sources, block_destinations, block_unresolved = _grid_pairs(
+                points, grid, pending[start:start + block_size], ring * size,
+                ring, k, radius_chord)
+            sources.append(block_sources)
+            destinations.append(block_destinations)
+            unresolved.append(block_unresolved)
+        pending = np.concatenate(unresolved)
+        if not len(pending):
+            break
+
+    if len(pending):
+        scanned = _scan_pairs(latitude, longitude, pending, k, radius, block_size)
+        sources.append(scanned[0])
+        destinations.append(scanned[1])
+
+    sources = np.concatenate(sources)
+    destinations = np.concatenate(destinations)
+    ordering = np.lexsort((destinations, sources))
+    return sources[ordering], destinations[ordering]
+
+
+def _scan_pairs(
+        latitude: np.ndarray,
+        longitude: np.ndarray,
+        positions: np.ndarray,
+        k: Optional[int],
+        radius: Optional[float],
+        block_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Candidate pairs of the sources at 'positions', compared with every
+    location in blocks of 'block_size' sources.
+    """
+
+    n_locations = len(latitude)
+    sources = [np.array([], dtype=np.intp)]
+    destinations = [np.array([], dtype=np.intp)]
+
+    for start in range(0, len(positions), block_size):
+        block = positions[start:start + block_size]
+        distances = haversine_matrix(
+            latitude[block], longitude[block], latitude, longitude)
+        distances[np.arange(len(block)), block] = np.inf
+
+        if k is not None and k < n_locations - 1:
+            nearest = np.argpartition(distances, k, axis=1)[:, :k]
+            selected = np.zeros(distances.shape, dtype=bool)
+            np.put_along_axis(selected, nearest, True, axis=1)
+        else:
+            selected = np.isfinite(distances)
+
+        if radius is not None:
+            selected &= distances <= radius
+
+        rows, columns = np.nonzero(selected)
+        sources.append(block[rows])
+        destinations.append(columns)
+
+    return np.concatenate(sources), np.concatenate(destinations)
+
+
+def _grid_pairs(
+        points: np.ndarray,
+        grid: Tuple[np.ndarray, int, np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+        block: np.ndarray,
+        reach: float,
+        ring: int,
+        k: Optional[int],
+        radius_chord: Optional[float]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Candidate pairs of the sources in 'block' among the locations in the
+    cells up to 'ring' cells away, which hold every location within the
+    chord distance 'reach'. Returns the sources, the destinations and the
+    sources whose pairs can lie further away than 'reach'.
+    """
+
+    cells, n_cells, order, cell_keys, cell_starts, cell_counts = grid
+    span = np.arange(-ring, ring + 1)
+    offsets = np.stack(np.meshgrid(span, span, span, indexing="ij"), axis=-1).reshape(-1, 3)
+    neighbours = cells[block][:, None, :] + offsets[None, :, :]
+    inside = ((neighbours >= 0) & (neighbours < n_cells)).all(axis=2).ravel()
+    keys = _cell_keys(neighbours, n_cells).ravel()
+
+    index = np.minimum(np.searchsorted(cell_keys, keys), len(cell_keys) - 1)
+    occupied = inside & (cell_keys[index] == keys)
+    starts = cell_starts[index]
+    counts = np.where(occupied, cell_counts[index], 0)
+    rows = np.repeat(np.repeat(np.arange(len(block)), len(offsets)), counts)
+    within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    candidates = order[np.repeat(starts, counts) + within]
+
+    other = candidates != block[rows]
+    rows, candidates = rows[other], candidates[other]
+    chords = np.linalg.norm(points[block[rows]] - points[candidates], axis=1)
+
+    if k is None:
+        selected = chords <= radius_chord
+        resolved = np.ones(len(block), dtype=bool)
+    else:
+        # the candidates of a source are contiguous, they are padded into a
+        # sources x candidates array to pick the k nearest of every source
+        columns = np.arange(len(rows)) - np.searchsorted(rows, rows, side="left")
+        width = max(k, int(columns.max()) + 1 if len(columns) else 0)
+        padded = np.full((len(block), width), np.inf)
+        padded[rows, columns] = chords
+        nearest = np.argpartition(padded, k - 1, axis=1)[:, :k]
+        chosen = np.zeros(padded.shape, dtype=bool)
+        np.put_along_axis(chosen, nearest, True, axis=1)
+        selected = chosen[rows, columns]
+
+        # the k nearest are found if the k-th is within reach
+        kth = np.take_along_axis(padded, nearest, axis=1).max(axis=1)
+        resolved = kth <= reach
+        if radius_chord is not None:
+            selected &= chords <= radius_chord
+            resolved |= radius_chord <= reach
+
+    selected &= resolved[rows]
+    return block[rows[selected]], candidates[selected], block[~resolved]
+
+
+def _unit_vectors(latitude: np.ndarray, longitude: np.ndarray) -> np.ndarray:
+    """
+    Returns the locations as N x 3 unit vectors. Their chord distances are
+    ordered like the great-circle distances.
+    """
+    lat = np.radians(latitude)
+    lon = np.radians(longitude)
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+def _chord(distance: float) -> float:
+    """
+    Returns the chord length on the unit sphere of a great-circle distance
+    in meters.
+    """
+    return 2 * np.sin(min(distance / (2 * EARTH_RADIUS_METERS), np.pi / 2))
+
+
+def _cell_size(points: np.ndarray, k: Optional[int], radius_chord: Optional[float]) -> float:
+    """
+    Returns the edge length of the grid cells: the 'radius_chord', or for k
+    nearest neighbours a distance that holds the k nearest of most
+    locations, estimated on a sample of them.
+    """
+
+    size = np.inf
+    if k is not None:
+        sample = points[::max(1, len(points) // 256)]
+        squared = np.maximum(2.0 - 2.0 * (sample @ points.T), 0.0)
+        # position 0 is the location itself
+        size = float(np.quantile(np.sqrt(np.partition(squared, k, axis=1)[:, k]), 0.9))
+    if radius_chord is not None:
+        size = min(size, radius_chord)
+
+    # 2 / MIN_CELL_SIZE cells per axis fit three axes into an int64 key
+    return max(size, MIN_CELL_SIZE)
+
+
+def _cell_keys(cells: np.ndarray, n_cells: int) -> np.ndarray:
+    """
+    Returns one int64 key per cell of the ... x 3 array 'cells'.
+    """
+    return (cells[..., 0] * n_cells + cells[..., 1]) * n_cells + cells[..., 2]
+
+
+def morton_order(latitude: np.ndarray, longitude: np.ndarray) -> np.ndarray:
+    """
+    Returns the positions of the locations sorted along a Z-order curve, so
+    neighbouring positions in the result are close to each other.
+    """
+
+    lat = np.asarray(latitude, dtype=float)
+    lon = np.asarray(longitude, dtype=float)
+    y = np.round((lat + 90.0) / 180.0 * 0xFFFF).astype(np.uint64)
+    x = np.round((lon + 180.0) / 360.0 * 0xFFFF).astype(np.uint64)
+
+    code = np.zeros(len(lat), dtype=np.uint64)
+    for bit in range(16):
+        code |= ((x >> np.uint64(bit)) & np.uint64(1)) << np.uint64(2 * bit)
+        code |= ((y >> np.uint64(bit)) & np.uint64(1)) << np.uint64(2 * bit + 1)
+
+    return np.argsort(code, kind="stable")
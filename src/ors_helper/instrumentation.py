@@ -0,0 +1,77 @@
+"""
+Per-tile instrumentation of a matrix run. Every tile collects its timings,
+transferred bytes and retries in a TileMetrics record, which is logged and
+passed to the metrics hook of the helper after the tile was assembled.
+"""
+import logging
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+MetricsHook = Callable[['TileMetrics'], None]
+
+
+@dataclass
+class TileMetrics:
+    """
+    Measurements of a single tile.
+
+    Parameter
+    ---------
+    index : int
+        Position of the tile in the plan.
+    profile : str
+        Profile of the tile.
+    n_sources : int
+        Number of sources of the tile.
+    n_destinations : int
+        Number of destinations of the tile.
+    requests : int
+        Number of HTTP requests sent, including retries and split parts.
+    retries : int
+        Number of retried requests.
+    request_seconds : float
+        Time spent waiting for the server.
+    parse_seconds : float
+        Time spent converting the responses into arrays.
+    assembly_seconds : float
+        Time spent writing the tile into the result or the sink.
+    bytes_sent : int
+        Size of the request bodies. Only measured for requests sessions.
+    bytes_received : int
+        Size of the response bodies on the wire. Only measured for requests
+        sessions.
+    """
+    index: int
+    profile: str
+    n_sources: int
+    n_destinations: int
+    requests: int = 0
+    retries: int = 0
+    request_seconds: float = 0.0
+    parse_seconds: float = 0.0
+    assembly_seconds: float = 0.0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+
+
+def emit_tile_metrics(metrics: Optional[TileMetrics], hook: Optional[MetricsHook]) -> None:
+    """
+    Logs 'metrics' at debug level and passes them to 'hook'.
+    """
+
+    if metrics is None:
+        return
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "tile %d %s %dx%d: request %.3f s, parse %.3f s, assembly %.3f s, "
+            "%d requests, %d retries, %d bytes sent, %d bytes received",
+            metrics.index, metrics.profile, metrics.n_sources, metrics.n_destinations,
+            metrics.request_seconds, metrics.parse_seconds, metrics.assembly_seconds,
+            metrics.requests, metrics.retries, metrics.bytes_sent, metrics.bytes_received
+        )
+
+    if hook is not None:
+        hook(metrics)
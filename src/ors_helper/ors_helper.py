@@ -2,132 +2,990 @@
 This module sends requests to the openrouteservice server and generates
 and generates the final output
 """
+import logging
 import os
-from typing import Union, Optional
-from dotenv import load_dotenv
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import replace
+from concurrent.futures import (
+    as_completed, FIRST_COMPLETED, ThreadPoolExecutor, wait
+)
+from itertools import zip_longest
+from typing import (
+    TYPE_CHECKING, Any, Callable, Collection, Dict, Iterator, List, Optional, Sequence, Tuple,
+    Union
+)
+import numpy as np
+from numpy.typing import DTypeLike
 import openrouteservice as ors
 import pandas as pd
-from .ors_utils import chunks
+import requests
+from src.schemas.schemas import input_file_schema
+from .backend_pool import Backend, BackendPool
+from .base_helper import _results_before_errors, BaseORShelper, METRICS
+from .checkpoint import Checkpoint, job_fingerprint
+from .distance_matrix import DistanceMatrix
+from .geo import candidate_pairs, estimate_matrix, morton_order
+from .instrumentation import MetricsHook, TileMetrics
+from .ors_utils import (
+    deduplicate_coordinates, matrix_to_long_format, tile_to_long_format
+)
+from .report import MatrixReport
+from .retry import is_transient, RetryPolicy
+from .route_cache import RouteCache
+from .tile_planner import (
+    count_tiles, iter_rectangle, plan_pair_tiles, plan_rectangle, plan_tiles, Tile,
+    TileLimits, TileResult
+)
+from .transport import build_session, HttpSettings, mount_adapters
 
-class ORShelper:
+if TYPE_CHECKING:
+    from src.file_io.output_writer import TileSink
+    from .distributed import DistributedJob
+
+logger = logging.getLogger(__name__)
+
+
+class MatrixCancelled(Exception):
+    """Raised when a matrix run is cancelled."""
+
+
+class ORShelper(BaseORShelper):
     """
     Class to handle the requests to the OpenRouteService server. And transform
     the data.
+
+    Parameter
+    ---------
+    server_url : str or None
+        Base url of the openrouteservice server. Can be left out if
+        'backends' are given.
+    api_key : str or None
+        API key for the server.
+    max_workers : int or None
+        Number of tile requests that are in flight at the same time.
+        Defaults to 1 for a single server and to the sum of the max_workers
+        of the 'backends', or one per backend if they are not limited.
+    requests_per_minute : int or None
+        Request quota of the server. Requests are spaced so the quota is not
+        exceeded. None disables the limit. Backends have their own quota.
+    cache : RouteCache or None
+        Persistent cache. Only pairs that are not cached are requested.
+    tile_limits : TileLimits or None
+        Limits of a single matrix request of the server. Defaults to the
+        limits of an openrouteservice server with default configuration.
+    retry_policy : RetryPolicy or None
+        Retry policy of the tile requests. Defaults to RetryPolicy().
+    http_settings : HttpSettings or None
+        Connection pool, keep-alive, timeouts and compression of the HTTP
+        session. Defaults to HttpSettings() with a pool of 'max_workers'
+        connections.
+    session : requests.Session or None
+        Custom transport used instead of the session built from
+        http_settings, for example with mounted adapters or an
+        httpx.Client(http2=True). It has to offer the get/post methods of a
+        requests session. Only the read_timeout of the http_settings is
+        applied to sessions that are no requests.Session.
+    metrics_hook : callable or None
+        Called with the TileMetrics of every finished tile, from the thread
+        that assembles the result. The metrics are also logged at debug
+        level to the 'src.ors_helper' loggers.
+    backends : sequence of Backend or None
+        Servers the tiles are spread across instead of the single
+        'server_url', each with its own key, quota, concurrency and limits.
+        Tiles are planned with limits all backends accept. Every request goes
+        to the healthy backend with the lowest expected wait, failing
+        backends are taken out of rotation, see BackendPool.
     """
-    def __init__(self, server_url: str, api_key: Union[str, None]=None):
-        self.server_url=server_url
-        self.client = ors.Client(base_url=server_url, key=api_key)
+    def __init__(
+            self,
+            server_url: Optional[str]=None,
+            api_key: Union[str, None]=None,
+            max_workers: Optional[int]=None,
+            requests_per_minute: Union[int, None]=None,
+            cache: Optional[RouteCache]=None,
+            tile_limits: Optional[TileLimits]=None,
+            retry_policy: Optional[RetryPolicy]=None,
+            http_settings: Optional[HttpSettings]=None,
+            session: Optional[Any]=None,
+            metrics_hook: Optional[MetricsHook]=None,
+            backends: Optional[Sequence[Backend]]=None):
+        if max_workers is not None and max_workers < 1:
+            raise ValueError(f"max_workers has to be at least 1, got {max_workers}")
+
+        if backends is None:
+            if server_url is None:
+                raise ValueError("Either server_url or backends have to be given")
+            backends = [Backend(
+                server_url, api_key=api_key, requests_per_minute=requests_per_minute)]
+            if max_workers is None:
+                max_workers = 1
+        elif not backends:
+            raise ValueError("backends must not be empty")
+
+        super().__init__(
+            cache=cache, tile_limits=tile_limits, retry_policy=retry_policy,
+            metrics_hook=metrics_hook)
+        self.server_url = backends[0].server_url if server_url is None else server_url
+        self.http_settings = HttpSettings() if http_settings is None else http_settings
+        # the connection pool of an own session grows with the workers of
+        # the running calls, see _connections
+        self._session_settings: Optional[HttpSettings] = None
+        self._pool_size = 0
+        self._active_workers = 0
+        self._pool_lock = threading.Lock()
+        if session is None:
+            # one connection pool per server, sized for its concurrent requests
+            self._session_settings = replace(
+                self.http_settings,
+                pool_connections=max(self.http_settings.pool_connections, len(backends)))
+            self._pool_size = max(
+                backend.max_workers or max_workers or 1 for backend in backends)
+            session = build_session(self._session_settings, self._pool_size)
+
+        timeout: Any = self.http_settings.read_timeout
+        if isinstance(session, requests.Session):
+            timeout = (self.http_settings.connect_timeout, self.http_settings.read_timeout)
+
+        self.backend_pool = BackendPool(backends, session=session, timeout=timeout)
+        self.tile_limits = self.backend_pool.tile_limits(self.tile_limits)
+        self.client = self.backend_pool.backends[0].client
+        self.session = session
+        self._transfer = threading.local()
+        if isinstance(session, requests.Session):
+            session.hooks["response"].append(self._record_transfer)
         self.server_status = -1
+        if max_workers is None:
+            max_workers = self.backend_pool.max_workers or len(backends)
+        self.max_workers = max_workers
 
     @classmethod
-    def from_env_file(cls, dotenv_path: Optional[str] = None) -> 'ORShelper':
-        """returns an instance of ORShelper with base_url and API key from .env
-        file"""
+    def _from_servers(cls, server_urls: List[str], api_key: Optional[str], **kwargs):
+        """returns a helper for the servers of the .env file. Several servers
+        are passed as 'backends'."""
 
-        load_dotenv(dotenv_path=dotenv_path)
-        server_url = os.getenv("SERVER_URL")
-        api_key = os.getenv("ORS_API_KEY")
+        if len(server_urls) == 1:
+            return super()._from_servers(server_urls, api_key, **kwargs)
 
-        if server_url is None:
-            raise ValueError("No server URL found. Check .env file")
+        api_keys = [None] * len(server_urls)
+        if api_key is not None:
+            api_keys = [key.strip() or None for key in api_key.split(",")]
+        if len(api_keys) == 1:
+            api_keys *= len(server_urls)
+        if len(api_keys) != len(server_urls):
+            raise ValueError(
+                f"Found {len(api_keys)} API keys for {len(server_urls)} servers. "
+                "Check .env file")
+        kwargs.setdefault("backends", [
+            Backend(url, api_key=key, requests_per_minute=kwargs.get("requests_per_minute"))
+            for url, key in zip(server_urls, api_keys)
+        ])
 
-        return ORShelper(server_url=server_url, api_key=api_key)
+        return cls(**kwargs)
+
+    def close(self) -> None:
+        """
+        Closes the connections of the HTTP session.
+        """
+        self.session.close()
+
+    @contextmanager
+    def _connections(self, max_workers: int) -> Iterator[None]:
+        """
+        Reserves 'max_workers' connections for a run. The blocking connection
+        pool of a session built by the helper grows to the workers of all
+        running calls, so a larger per call max_workers or concurrent calls
+        are not serialized. A pool_maxsize of the http_settings is kept.
+        """
+
+        with self._pool_lock:
+            self._active_workers += max_workers
+            if (self._session_settings is not None
+                    and self.http_settings.pool_maxsize is None
+                    and self._active_workers > self._pool_size):
+                self._pool_size = self._active_workers
+                mount_adapters(self.session, self._session_settings, self._pool_size)
+        try:
+            yield
+        finally:
+            with self._pool_lock:
+                self._active_workers -= max_workers
 
     def get_distance_matrix(
             self,
             locations: pd.DataFrame,
             profile: str,
-            chunk_size: int=25) -> pd.DataFrame:
+            chunk_size: Optional[int]=None,
+            max_workers: Optional[int]=None,
+            dense: bool=False,
+            dtype: Optional[DTypeLike]=None,
+            previous_locations: Optional[pd.DataFrame]=None,
+            previous_matrix: Optional[pd.DataFrame]=None,
+            report: Optional[MatrixReport]=None,
+            progress: Optional[Callable[[int, int], None]]=None,
+            cancel: Optional[threading.Event]=None,
+            deduplicate: bool=False,
+            tolerance: float=0.0,
+            route_within: Optional[float]=None,
+            detour_factor: Optional[float]=None
+    ) -> Union[pd.DataFrame, DistanceMatrix]:
         """
         Generates a distance matrix from a locations list. With the given profile
         'car' or 'hgv'.
+
+        The matrix is requested in rectangular tiles that fit the tile_limits
+        of the helper, or in 'chunk_size' x 'chunk_size' tiles if a chunk_size
+        is given. With 'max_workers' > 1 the tiles are requested concurrently,
+        the result is the same as for a sequential run. With a cache only the
+        missing pairs are requested, packed into as few tiles as possible.
+
+        Every tile is written into preallocated N x N arrays of 'dtype'. With
+        'dense' these arrays are returned as a DistanceMatrix, ordered like
+        'locations', 'dtype' defaults to float32 then. Otherwise the long
+        format DataFrame with the columns 'start_index', 'destination_index',
+        'distance', 'duration', 'start_id' and 'destination_id' is built once
+        at the end, 'dtype' defaults to float64.
+
+        For an incremental update pass the locations and the long format
+        result of a previous run as 'previous_locations' and
+        'previous_matrix'. Pairs of locations with unchanged id and
+        coordinates are reused, only the rows and columns of added or moved
+        locations are requested.
+
+        Failed requests are retried with the retry_policy of the helper. Pairs
+        without a result are NaN and are recorded in 'report'.
+
+        'progress' is called with (finished tiles, total tiles) after every
+        tile, from the calling thread. When 'cancel' is set, queued tiles are
+        dropped and MatrixCancelled is raised.
+
+        With 'deduplicate' locations with the same coordinates, or within
+        'tolerance' meters, are requested only once and the result is
+        expanded to all ids. The saved requests are recorded in 'report'.
+
+        With 'route_within' only the pairs whose estimated road distance is
+        at most 'route_within' meters are requested. The other pairs get the
+        estimate of geo.estimate_matrix, the great-circle distance times the
+        'detour_factor' of the profile. The result then has the column
+        'method' with 'routed' or 'estimated' for every pair.
         """
 
-        distance_matrix = pd.DataFrame()
-        locations_copy = locations.copy()
+        self._check_profile(profile)
 
-        if profile not in ['car', 'hgv']:
-            raise ValueError(
-                "Chosen profile is expected to be 'car' or 'hgv', got {profile}")
+        if max_workers is None:
+            max_workers = self.max_workers
 
-        locations_copy["coordinates"] = list( 
-            zip(locations["longitude"], locations["latitude"])
-        )
+        if dtype is None:
+            dtype = np.float32 if dense else np.float64
 
-        for start in chunks(locations_copy, chunk_size=chunk_size):
-            for destination in chunks(locations_copy, chunk_size=chunk_size):
+        request_locations = locations
+        run_report = report
+        if deduplicate:
+            canonical, inverse = deduplicate_coordinates(locations, tolerance)
+            request_locations = locations.iloc[canonical]
+            if report is not None:
+                # the run records positions of the canonical locations
+                run_report = MatrixReport()
 
-                start_list = start["coordinates"].to_list()
-                destination_list = destination["coordinates"].to_list()
-                print(start_list)
-                print(destination_list)
+        within = None
+        if route_within is not None:
+            estimated_distances, estimated_durations = estimate_matrix(
+                request_locations["latitude"].to_numpy(dtype=float),
+                request_locations["longitude"].to_numpy(dtype=float),
+                profile, detour_factor=detour_factor)
+            within = estimated_distances <= route_within
 
-                range_start = list( range( len(start) ) )
+        coordinates, distances, durations, tiles = self._prepare_matrix(
+            request_locations, profile, chunk_size, dtype,
+            previous_locations, previous_matrix, run_report, route_mask=within)
 
-                range_destination = list( range(
-                    len(range_start), len(range_start) + len(destination)
-                ))
+        def write_tile(result: TileResult) -> None:
+            distances[np.ix_(result.sources, result.destinations)] = result.distances
+            durations[np.ix_(result.sources, result.destinations)] = result.durations
 
-                print(range_start)
-                print(range_destination)
-                routes = self.client.distance_matrix(
-                    start_list + destination_list,
-                    sources=range_start,
-                    destinations=range_destination,
-                    metrics=["duration", "distance"],
-                    profile=f"driving-{profile}"
-                )
-                print(routes)
+        self._run_tiles(
+            coordinates, tiles, profile, max_workers, run_report, write_tile,
+            progress=progress, cancel=cancel)
 
-                distance_df = pd.DataFrame(
-                    index=start.index,
-                    columns=destination.index,
-                    data=routes["distances"]
-                )
-                distance_df.reset_index(names="start_index", inplace=True)
-                chunk_distance = distance_df.melt(
-                    id_vars="start_index",
-                    value_vars=destination.index,
-                    var_name="destination_index",
-                    value_name="distance"
-                )
+        if self.cache is not None:
+            self.cache.evict()
 
-                duration_df = pd.DataFrame(
-                    index=start.index,
-                    columns=destination.index,
-                    data=routes["durations"]
-                )
-                duration_df.reset_index(names="start_index", inplace=True)
-                chunk_duration = duration_df.melt(
-                    id_vars="start_index",
-                    value_vars=destination.index,
-                    var_name="destination_index",
-                    value_name="duration"
-                )
+        estimated = None
+        if within is not None:
+            # pairs outside the threshold keep routed values of covering
+            # tiles, the previous result or the cache
+            estimated = ~within & np.isnan(distances)
+            distances[estimated] = estimated_distances[estimated]
+            durations[estimated] = estimated_durations[estimated]
 
-                chunk_result = pd.merge(
-                    chunk_distance,
-                    chunk_duration,
-                    on=["start_index", "destination_index"]
+        if deduplicate:
+            distances = distances[np.ix_(inverse, inverse)]
+            durations = durations[np.ix_(inverse, inverse)]
+            if estimated is not None:
+                estimated = estimated[np.ix_(inverse, inverse)]
+            if report is not None:
+                report.merge(run_report, inverse)
+                tile_limits = self._tile_limits(chunk_size)
+                report.duplicate_locations += len(locations) - len(canonical)
+                report.saved_requests += (
+                    count_tiles(len(locations), len(locations), tile_limits)
+                    - count_tiles(len(canonical), len(canonical), tile_limits)
                 )
 
-            distance_matrix = pd.concat(
-                (distance_matrix, chunk_result),
-                ignore_index=True
+        if dense:
+            return DistanceMatrix.from_locations(
+                locations, locations, distances, durations, estimated=estimated)
+
+        if estimated is not None:
+            return DistanceMatrix.from_locations(
+                locations, locations, distances, durations, estimated=estimated
+            ).to_long_dataframe()
+
+        return matrix_to_long_format(locations, distances, durations)
+
+    def get_distance_matrices(
+            self,
+            locations: pd.DataFrame,
+            profiles: Sequence[str],
+            chunk_size: Optional[int]=None,
+            max_workers: Optional[int]=None,
+            dense: bool=False,
+            dtype: Optional[DTypeLike]=None,
+            report: Optional[MatrixReport]=None,
+            progress: Optional[Callable[[int, int], None]]=None,
+            cancel: Optional[threading.Event]=None,
+            deduplicate: bool=False,
+            tolerance: float=0.0
+    ) -> Dict[str, Union[pd.DataFrame, DistanceMatrix]]:
+        """
+        Generates the distance matrices of several 'profiles' in one pass and
+        returns them as a dict keyed by profile.
+
+        The coordinates are prepared and the tiles are planned once. The
+        requests of all profiles are interleaved on the same workers, so the
+        total throughput is higher than running get_distance_matrix for one
+        profile after another. With a cache the cached pairs of every profile
+        are left out of its own plan.
+
+        'progress' counts the tiles of all profiles. The other arguments work
+        like in get_distance_matrix.
+        """
+
+        for profile in profiles:
+            self._check_profile(profile)
+
+        if max_workers is None:
+            max_workers = self.max_workers
+
+        if dtype is None:
+            dtype = np.float32 if dense else np.float64
+
+        request_locations = locations
+        run_report = report
+        if deduplicate:
+            canonical, inverse = deduplicate_coordinates(locations, tolerance)
+            request_locations = locations.iloc[canonical]
+            if report is not None:
+                # the run records positions of the canonical locations
+                run_report = MatrixReport()
+
+        coordinates = list(
+            zip(request_locations["longitude"].to_list(),
+                request_locations["latitude"].to_list())
+        )
+        n_locations = len(coordinates)
+        tile_limits = self._tile_limits(chunk_size)
+        positions = np.arange(n_locations)
+        shared_tiles = plan_rectangle(positions, positions, tile_limits)
+
+        arrays = {}
+        plans = []
+        for profile in profiles:
+            distances = np.full((n_locations, n_locations), np.nan, dtype=dtype)
+            durations = np.full((n_locations, n_locations), np.nan, dtype=dtype)
+            arrays[profile] = (distances, durations)
+
+            tiles = shared_tiles
+            if self.cache is not None:
+                missing = self._lookup_cache(
+                    coordinates, coordinates, profile, distances, durations, run_report)
+                if not missing.all():
+                    tiles = plan_tiles(missing, tile_limits)
+            plans.append([(profile, tile) for tile in tiles])
+
+        jobs = [
+            job for round_jobs in zip_longest(*plans) for job in round_jobs if job is not None
+        ]
+
+        def write_tile(profile: str, result: TileResult) -> None:
+            distances, durations = arrays[profile]
+            distances[np.ix_(result.sources, result.destinations)] = result.distances
+            durations[np.ix_(result.sources, result.destinations)] = result.durations
+
+        self._run_jobs(
+            coordinates, jobs, max_workers, run_report, write_tile,
+            progress=progress, cancel=cancel)
+
+        if self.cache is not None:
+            self.cache.evict()
+
+        if deduplicate and report is not None:
+            report.merge(run_report, inverse)
+            report.duplicate_locations += len(locations) - len(canonical)
+            report.saved_requests += len(profiles) * (
+                count_tiles(len(locations), len(locations), tile_limits)
+                - len(shared_tiles)
             )
 
-        distance_matrix = pd.merge(
-            distance_matrix,
-            locations["id"],
-            left_on="start_index",
-            right_index=True
-        ).rename(columns={"id": "start_id"})
-
-        distance_matrix = pd.merge(
-            distance_matrix,
-            locations["id"],
-            left_on="destination_index",
-            right_index=True
-        ).rename(columns={"id": "destination_id"})
-
-        return distance_matrix
+        results = {}
+        for profile, (distances, durations) in arrays.items():
+            if deduplicate:
+                distances = distances[np.ix_(inverse, inverse)]
+                durations = durations[np.ix_(inverse, inverse)]
+            if dense:
+                results[profile] = DistanceMatrix.from_locations(
+                    locations, locations, distances, durations)
+            else:
+                results[profile] = matrix_to_long_format(locations, distances, durations)
+
+        return results
+
+    def get_source_destination_matrix(
+            self,
+            sources: pd.DataFrame,
+            destinations: pd.DataFrame,
+            profile: str,
+            chunk_size: Optional[int]=None,
+            max_workers: Optional[int]=None,
+            dense: bool=False,
+            dtype: Optional[DTypeLike]=None,
+            report: Optional[MatrixReport]=None,
+            progress: Optional[Callable[[int, int], None]]=None,
+            cancel: Optional[threading.Event]=None
+    ) -> Union[pd.DataFrame, DistanceMatrix]:
+        """
+        Generates the distance matrix from every location in 'sources' to
+        every location in 'destinations'. Both DataFrames are validated with
+        the input_file_schema. Only the sources x destinations rectangle is
+        requested, so 30 depots x 8,000 customers cost 240,000 pairs instead
+        of 8,030 x 8,030.
+
+        With 'dense' a len(sources) x len(destinations) DistanceMatrix is
+        returned. Otherwise the long format
+        DataFrame of get_distance_matrix, with 'start_index' and 'start_id'
+        taken from 'sources' and 'destination_index' and 'destination_id'
+        taken from 'destinations'.
+
+        The positions of the unroutable pairs in 'report' refer to the rows
+        of pd.concat([sources, destinations]). The other arguments work like
+        in get_distance_matrix.
+        """
+
+        self._check_profile(profile)
+
+        if max_workers is None:
+            max_workers = self.max_workers
+
+        if dtype is None:
+            dtype = np.float32 if dense else np.float64
+
+        sources = input_file_schema.validate(sources)
+        destinations = input_file_schema.validate(destinations)
+
+        source_coordinates = list(
+            zip(sources["longitude"].to_list(), sources["latitude"].to_list())
+        )
+        destination_coordinates = list(
+            zip(destinations["longitude"].to_list(), destinations["latitude"].to_list())
+        )
+        n_sources = len(source_coordinates)
+        shape = (n_sources, len(destination_coordinates))
+
+        distances = np.full(shape, np.nan, dtype=dtype)
+        durations = np.full(shape, np.nan, dtype=dtype)
+
+        missing = np.ones(shape, dtype=bool)
+        if self.cache is not None:
+            missing &= self._lookup_cache(
+                source_coordinates, destination_coordinates, profile,
+                distances, durations, report)
+
+        # destinations follow the sources in the coordinates of the requests
+        tiles = [
+            (start, destination + n_sources)
+            for start, destination in plan_tiles(missing, self._tile_limits(chunk_size))
+        ]
+
+        def write_tile(result: TileResult) -> None:
+            columns = result.destinations - n_sources
+            distances[np.ix_(result.sources, columns)] = result.distances
+            durations[np.ix_(result.sources, columns)] = result.durations
+
+        self._run_tiles(
+            source_coordinates + destination_coordinates, tiles, profile, max_workers,
+            report, write_tile, progress=progress, cancel=cancel)
+
+        if self.cache is not None:
+            self.cache.evict()
+
+        if dense:
+            return DistanceMatrix.from_locations(sources, destinations, distances, durations)
+
+        return tile_to_long_format(sources, destinations, distances, durations)
+
+    def get_sparse_distance_matrix(
+            self,
+            locations: pd.DataFrame,
+            profile: str,
+            k: Optional[int]=None,
+            radius: Optional[float]=None,
+            max_workers: Optional[int]=None,
+            report: Optional[MatrixReport]=None,
+            progress: Optional[Callable[[int, int], None]]=None,
+            cancel: Optional[threading.Event]=None) -> pd.DataFrame:
+        """
+        Generates a sparse distance matrix that only contains candidate pairs:
+        for every location its 'k' nearest other locations by great-circle
+        distance, the other locations within 'radius' meters, or with both
+        the k nearest within the radius.
+
+        The candidate pairs are grouped into dense tiles of spatially close
+        sources, so the number of requests grows with N x k instead of
+        N x N. Returns the long format DataFrame of get_distance_matrix with
+        one row per candidate pair.
+        """
+
+        self._check_profile(profile)
+
+        if max_workers is None:
+            max_workers = self.max_workers
+
+        latitude = locations["latitude"].to_numpy(dtype=float)
+        longitude = locations["longitude"].to_numpy(dtype=float)
+        pair_sources, pair_destinations = candidate_pairs(
+            latitude, longitude, k=k, radius=radius)
+
+        by_pair = np.lexsort((pair_destinations, pair_sources))
+        pair_sources, pair_destinations = pair_sources[by_pair], pair_destinations[by_pair]
+        positions = np.arange(len(locations))
+        starts = np.searchsorted(pair_sources, positions, side="left")
+        ends = np.searchsorted(pair_sources, positions, side="right")
+
+        tiles = plan_pair_tiles(
+            pair_sources, pair_destinations,
+            morton_order(latitude, longitude), self.tile_limits)
+
+        pair_distances = np.full(len(pair_sources), np.nan)
+        pair_durations = np.full(len(pair_sources), np.nan)
+
+        def write_tile(result: TileResult) -> None:
+            counts = ends[result.sources] - starts[result.sources]
+            pairs = np.concatenate([
+                np.arange(starts[source], ends[source]) for source in result.sources
+            ])
+            rows = np.repeat(np.arange(len(result.sources)), counts)
+            columns = np.searchsorted(result.destinations, pair_destinations[pairs])
+            columns = np.minimum(columns, len(result.destinations) - 1)
+            covered = result.destinations[columns] == pair_destinations[pairs]
+
+            pair_distances[pairs[covered]] = result.distances[rows[covered], columns[covered]]
+            pair_durations[pairs[covered]] = result.durations[rows[covered], columns[covered]]
+
+        coordinates = list(zip(longitude.tolist(), latitude.tolist()))
+        self._run_tiles(
+            coordinates, tiles, profile, max_workers, report, write_tile,
+            progress=progress, cancel=cancel)
+
+        if self.cache is not None:
+            self.cache.evict()
+
+        index = locations.index.to_numpy()
+        ids = locations["id"].to_numpy()
+        return pd.DataFrame({
+            "start_index": index[pair_sources],
+            "destination_index": index[pair_destinations],
+            "distance": pair_distances,
+            "duration": pair_durations,
+            "start_id": ids[pair_sources],
+            "destination_id": ids[pair_destinations]
+        })
+
+    def iter_distance_matrix(
+            self,
+            locations: pd.DataFrame,
+            profile: str,
+            chunk_size: Optional[int]=None,
+            max_workers: Optional[int]=None,
+            skip_tiles: Optional[Collection[int]]=None,
+            report: Optional[MatrixReport]=None) -> Iterator[TileResult]:
+        """
+        Requests the distance matrix like get_distance_matrix, but yields
+        every tile as a TileResult as soon as it is finished instead of
+        assembling the N x N matrix. At most 2 * 'max_workers' tiles are in
+        flight or waiting to be consumed, so memory does not grow with N x N.
+        The tiles are yielded in the order they finish. Tiles whose plan index
+        is in 'skip_tiles' are not requested.
+
+        The cache is filled with the results, but not read, because the
+        lookup needs the full N x N matrix.
+        """
+
+        self._check_profile(profile)
+
+        if max_workers is None:
+            max_workers = self.max_workers
+
+        tile_limits = self._tile_limits(chunk_size)
+
+        coordinates = list(
+            zip(locations["longitude"].to_list(), locations["latitude"].to_list())
+        )
+        positions = np.arange(len(coordinates))
+        tiles = iter_rectangle(positions, positions, tile_limits)
+
+        connections = self._connections(max_workers)
+        with connections, ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = set()
+            try:
+                for index, tile in enumerate(tiles):
+                    if skip_tiles is not None and index in skip_tiles:
+                        continue
+                    pending.add(executor.submit(
+                        self._fetch_tile, coordinates, tile, profile, index, report))
+                    if len(pending) >= 2 * max_workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        yield from _results_before_errors(done)
+
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from _results_before_errors(done)
+            finally:
+                # do not request queued tiles after an error or an early stop
+                for future in pending:
+                    future.cancel()
+
+        if self.cache is not None:
+            self.cache.evict()
+
+    def write_distance_matrix(
+            self,
+            locations: pd.DataFrame,
+            profile: str,
+            sink: 'TileSink',
+            checkpoint: Optional[Checkpoint]=None,
+            chunk_size: Optional[int]=None,
+            max_workers: Optional[int]=None,
+            report: Optional[MatrixReport]=None) -> int:
+        """
+        Streams the distance matrix into 'sink' and returns the number of
+        tiles written.
+
+        With a checkpoint every written tile is recorded in the manifest. A
+        rerun with the same locations, profile and tile limits resumes the
+        sink and only requests the tiles that are not in the manifest. The
+        sink has to be opened in append mode for that.
+        """
+
+        tile_limits = self._tile_limits(chunk_size)
+
+        skip_tiles: Collection[int] = set()
+        if checkpoint is not None:
+            skip_tiles, sink_state = checkpoint.open(
+                job_fingerprint(locations, profile, tile_limits))
+            if checkpoint.resumed:
+                # rows of tiles that were written but not marked done yet
+                # are dropped, also when no tile was marked done at all
+                sink.resume(sink_state or 0)
+
+        written = 0
+        try:
+            for tile in self.iter_distance_matrix(
+                    locations, profile, chunk_size=chunk_size,
+                    max_workers=max_workers, skip_tiles=skip_tiles, report=report):
+                started = time.perf_counter()
+                sink.write(tile)
+                self._finish_tile_metrics(tile, started)
+                written += 1
+                if checkpoint is not None:
+                    checkpoint.mark_done(tile.index, sink.checkpoint_state())
+        except BaseException:
+            if checkpoint is not None:
+                checkpoint.close()
+            raise
+
+        if checkpoint is not None:
+            checkpoint.finish()
+
+        return written
+
+    def run_worker(
+            self,
+            job: 'DistributedJob',
+            worker_id: Optional[str]=None,
+            max_workers: Optional[int]=None,
+            report: Optional[MatrixReport]=None,
+            wait: bool=True,
+            poll_interval: float=1.0) -> int:
+        """
+        Works on the tiles of a distributed job and returns the number of
+        tiles this worker requested. 'max_workers' tiles are claimed and
+        requested at the same time.
+
+        The worker runs until every tile of the job has a result. Tiles that
+        are claimed by other workers are waited for with 'poll_interval'
+        seconds between the checks and taken over when their lease runs out.
+        Without 'wait' the worker stops as soon as no tile can be claimed.
+
+        A tile that fails is released for other workers and its error is
+        raised after the running tiles are finished.
+        """
+
+        if max_workers is None:
+            max_workers = self.max_workers
+        if worker_id is None:
+            worker_id = f"{socket.gethostname()}-{os.getpid()}"
+
+        locations = job.locations
+        coordinates = list(
+            zip(locations["longitude"].to_list(), locations["latitude"].to_list())
+        )
+        failed = threading.Event()
+
+        def work() -> int:
+            requested = 0
+            cursor = 0
+            while not failed.is_set():
+                index = job.claim(worker_id, cursor)
+                if index is None:
+                    if not wait or job.is_complete():
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                cursor = index + 1
+                try:
+                    result = self._fetch_tile(
+                        coordinates, job.tile(index), job.profile, index, report)
+                except BaseException:
+                    failed.set()
+                    job.release(index)
+                    raise
+                started = time.perf_counter()
+                job.complete(result)
+                self._finish_tile_metrics(result, started)
+                requested += 1
+            return requested
+
+        logger.info(
+            "worker %s: %d tiles of %s with %d workers",
+            worker_id, job.n_tiles, job.directory, max_workers)
+        connections = self._connections(max_workers)
+        with connections, ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(work) for _ in range(max_workers)]
+            return sum(future.result() for future in futures)
+
+    def _run_tiles(
+            self,
+            coordinates: List[Tuple[float, float]],
+            tiles: List[Tile],
+            profile: str,
+            max_workers: int,
+            report: Optional[MatrixReport],
+            on_result: Callable[[TileResult], None],
+            progress: Optional[Callable[[int, int], None]]=None,
+            cancel: Optional[threading.Event]=None) -> None:
+        """
+        Requests all tiles with 'max_workers' threads and passes every
+        TileResult to 'on_result' in the calling thread as it finishes.
+        """
+
+        self._run_jobs(
+            coordinates, [(profile, tile) for tile in tiles], max_workers, report,
+            lambda _, result: on_result(result), progress=progress, cancel=cancel)
+
+    def _run_jobs(
+            self,
+            coordinates: List[Tuple[float, float]],
+            jobs: List[Tuple[str, Tile]],
+            max_workers: int,
+            report: Optional[MatrixReport],
+            on_result: Callable[[str, TileResult], None],
+            progress: Optional[Callable[[int, int], None]]=None,
+            cancel: Optional[threading.Event]=None) -> None:
+        """
+        Requests the (profile, tile) jobs with 'max_workers' threads and
+        passes the profile and TileResult of every job to 'on_result' in the
+        calling thread as it finishes.
+        """
+
+        logger.info("requesting %d tiles with %d workers", len(jobs), max_workers)
+        started = time.perf_counter()
+
+        connections = self._connections(max_workers)
+        with connections, ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(
+                    self._fetch_tile, coordinates, tile, profile, index, report
+                ): profile
+                for index, (profile, tile) in enumerate(jobs)
+            }
+            try:
+                for finished, future in enumerate(as_completed(futures), start=1):
+                    # raises the exception of a failed tile here
+                    result = future.result()
+                    assembly_started = time.perf_counter()
+                    on_result(futures[future], result)
+                    self._finish_tile_metrics(result, assembly_started)
+                    if progress is not None:
+                        progress(finished, len(futures))
+                    if cancel is not None and cancel.is_set():
+                        raise MatrixCancelled("Distance matrix request was cancelled")
+            finally:
+                for future in futures:
+                    future.cancel()
+
+        logger.info("%d tiles finished in %.1f s", len(jobs), time.perf_counter() - started)
+
+    def _fetch_tile(
+            self,
+            coordinates: List[Tuple[float, float]],
+            tile: Tile,
+            profile: str,
+            index: int=-1,
+            report: Optional[MatrixReport]=None) -> TileResult:
+        """
+        Requests a tile of positions in 'coordinates', stores it in the cache
+        and returns it as a TileResult with the TileMetrics of the tile.
+        """
+
+        if report is None:
+            report = MatrixReport()
+
+        start, destination = tile
+        metrics = TileMetrics(index, profile, len(start), len(destination))
+        tile_distances, tile_durations = self._request_tile_parts(
+            coordinates, start, destination, profile, report, metrics)
+
+        if self.cache is not None:
+            self.cache.store(
+                [coordinates[i] for i in start],
+                [coordinates[i] for i in destination],
+                profile, METRICS, tile_distances, tile_durations)
+
+        return TileResult(
+            start, destination, tile_distances, tile_durations, index, metrics)
+
+    def _request_tile_parts(
+            self,
+            coordinates: List[Tuple[float, float]],
+            start: np.ndarray,
+            destination: np.ndarray,
+            profile: str,
+            report: MatrixReport,
+            metrics: Optional[TileMetrics]=None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Requests the parts of the start x destination positions that
+        _split_tile plans and returns the distances and durations.
+        """
+
+        parts = self._split_tile(start, destination, report, metrics)
+        part_start, part_destination = next(parts)
+        while True:
+            try:
+                try:
+                    routes = self._request_with_retry(
+                        [coordinates[i] for i in part_start],
+                        [coordinates[i] for i in part_destination],
+                        profile,
+                        report,
+                        metrics
+                    )
+                except ors.exceptions.ApiError as exc:
+                    part_start, part_destination = parts.throw(exc)
+                else:
+                    part_start, part_destination = parts.send(routes)
+            except StopIteration as stop:
+                return stop.value
+
+    def _request_with_retry(
+            self,
+            start_list: List[Tuple[float, float]],
+            destination_list: List[Tuple[float, float]],
+            profile: str,
+            report: MatrixReport,
+            metrics: Optional[TileMetrics]=None) -> dict:
+        """
+        Sends a tile request and retries transient errors with exponential
+        backoff and jitter within the time budget of the retry_policy.
+        """
+
+        started = time.monotonic()
+        attempt = 1
+
+        while True:
+            try:
+                return self._request_tile(start_list, destination_list, profile, metrics)
+            except Exception as exc: # pylint: disable=broad-exception-caught
+                delay = self._retry_delay(exc, attempt, started, report, metrics)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+
+    def _request_tile(
+            self,
+            start_list: List[Tuple[float, float]],
+            destination_list: List[Tuple[float, float]],
+            profile: str,
+            metrics: Optional[TileMetrics]=None) -> dict:
+        """
+        Requests a single tile of the matrix from a backend of the pool and
+        returns the raw response. The request time and the transferred bytes
+        are added to 'metrics'.
+        """
+
+        range_start = list( range( len(start_list) ) )
+
+        range_destination = list( range(
+            len(range_start), len(range_start) + len(destination_list)
+        ))
+
+        backend = self.backend_pool.acquire()
+        backend.rate_limiter.acquire()
+        self._transfer.sent = self._transfer.received = 0
+        failed = False
+        started = time.perf_counter()
+        try:
+            routes = backend.post(f"/v2/matrix/driving-{profile}/json", {
+                "locations": start_list + destination_list,
+                "sources": range_start,
+                "destinations": range_destination,
+                "metrics": METRICS
+            })
+        except Exception as exc:
+            failed = is_transient(exc)
+            raise
+        finally:
+            self.backend_pool.release(backend, time.perf_counter() - started, failed)
+            if metrics is not None:
+                metrics.requests += 1
+                metrics.request_seconds += time.perf_counter() - started
+                metrics.bytes_sent += self._transfer.sent
+                metrics.bytes_received += self._transfer.received
+
+        return routes
+
+    def _record_transfer(self, response: requests.Response, *args, **kwargs) -> None:
+        """
+        Response hook of the requests session that records the size of the
+        request and response bodies for the thread that sent the request.
+        """
+
+        body = response.request.body
+        self._transfer.sent = 0 if body is None else len(body)
+        content_length = response.headers.get("Content-Length")
+        self._transfer.received = (
+            len(response.content) if content_length is None else int(content_length)
+        )
@@ -1,8 +1,12 @@
 """
 Helper functions for ors_helper
 """
+import threading
+import time
 from typing import List, Tuple, Union
+import numpy as np
 from pandas import DataFrame
+from .geo import candidate_pairs
 
 def chunks(to_iterate: Union[List, Tuple, DataFrame], chunk_size: int):
     """
@@ -12,3 +16,171 @@ def chunks(to_iterate: Union[List, Tuple, DataFrame], chunk_size: int):
 
     for i in range(0, len(to_iterate), chunk_size):
         yield to_iterate[i:i+chunk_size]
+
+
+def deduplicate_coordinates(
+        locations: DataFrame,
+        tolerance: float=0.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Collapses locations with the same coordinates to one canonical location.
+
+    With a 'tolerance' in meters nearly identical points are collapsed too.
+    In input order, every location that is not collapsed yet becomes
+    canonical and collapses the other locations within 'tolerance' meters
+    great-circle distance, so every location is within 'tolerance' of its
+    canonical location.
+
+    Returns the positions of the canonical locations in input order and for
+    every location the index of its canonical location in that array, so
+    that 'canonical[inverse]' maps every location to its canonical position.
+    """
+
+    latitude = locations["latitude"].to_numpy(dtype=float)
+    longitude = locations["longitude"].to_numpy(dtype=float)
+    n_locations = len(locations)
+
+    if tolerance > 0 and n_locations > 1:
+        sources, destinations = candidate_pairs(latitude, longitude, radius=tolerance)
+        # the pairs are ordered by source, the neighbours of location i are
+        # destinations[bounds[i]:bounds[i + 1]]
+        bounds = np.searchsorted(sources, np.arange(n_locations + 1))
+        inverse = np.full(n_locations, -1, dtype=np.intp)
+        canonical = []
+        for position in range(n_locations):
+            if inverse[position] >= 0:
+                continue
+            neighbours = destinations[bounds[position]:bounds[position + 1]]
+            inverse[neighbours[inverse[neighbours] < 0]] = len(canonical)
+            inverse[position] = len(canonical)
+            canonical.append(position)
+        return np.asarray(canonical, dtype=np.intp), inverse
+
+    keys = np.column_stack((latitude, longitude))
+    _, canonical, inverse = np.unique(
+        keys, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+
+    # np.unique sorts by the coordinates, restore the input order
+    order = np.argsort(canonical)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+
+    return canonical[order], rank[inverse]
+
+
+def fill_from_previous(
+        locations: DataFrame,
+        previous_locations: DataFrame,
+        previous_matrix: DataFrame,
+        distances: np.ndarray,
+        durations: np.ndarray) -> np.ndarray:
+    """
+    Fills 'distances' and 'durations' (N x N, ordered like 'locations') with
+    the values of a previous long format result and returns a boolean array
+    that is True for every pair that still has to be requested.
+
+    A location is reused when its id exists in 'previous_locations' with the
+    same latitude and longitude. Pairs of reused locations are taken from
+    'previous_matrix', ids that are no longer in 'locations' are dropped.
+    """
+
+    n_locations = len(locations)
+    missing = np.ones((n_locations, n_locations), dtype=bool)
+
+    # ids are compared as str, a file may hold "7" where the input has 7
+    current = locations[["id", "latitude", "longitude"]].reset_index(drop=True)
+    current["id"] = current["id"].astype(str)
+    current["position"] = np.arange(n_locations)
+    previous = previous_locations[["id", "latitude", "longitude"]].astype({"id": str})
+    unchanged = current.merge(previous, on=["id", "latitude", "longitude"])
+    if unchanged.empty:
+        return missing
+
+    positions = unchanged.set_index("id")["position"]
+    start = previous_matrix["start_id"].astype(str).map(positions)
+    destination = previous_matrix["destination_id"].astype(str).map(positions)
+    reused = start.notna() & destination.notna()
+
+    rows = start[reused].to_numpy(dtype=np.intp)
+    columns = destination[reused].to_numpy(dtype=np.intp)
+    distances[rows, columns] = previous_matrix.loc[reused, "distance"].to_numpy()
+    durations[rows, columns] = previous_matrix.loc[reused, "duration"].to_numpy()
+    missing[rows, columns] = False
+
+    return missing
+
+
+def tile_to_long_format(
+        source_locations: DataFrame,
+        destination_locations: DataFrame,
+        distances: np.ndarray,
+        durations: np.ndarray) -> DataFrame:
+    """
+    Builds the long format DataFrame from sources x destinations distance and
+    duration arrays that are ordered like 'source_locations' and
+    'destination_locations'. Every start/destination pair becomes a row,
+    ordered by start and then by destination.
+    """
+
+    n_sources = len(source_locations)
+    n_destinations = len(destination_locations)
+    destination_ids = destination_locations["id"].to_numpy()
+
+    return DataFrame({
+        "start_index": np.repeat(source_locations.index.to_numpy(), n_destinations),
+        "destination_index": np.tile(destination_locations.index.to_numpy(), n_sources),
+        "distance": distances.ravel(),
+        "duration": durations.ravel(),
+        "start_id": np.repeat(source_locations["id"].to_numpy(), n_destinations),
+        "destination_id": np.tile(destination_ids, n_sources)
+    })
+
+
+def matrix_to_long_format(
+        locations: DataFrame,
+        distances: np.ndarray,
+        durations: np.ndarray) -> DataFrame:
+    """
+    Builds the long format DataFrame from N x N distance and duration arrays
+    that are ordered like 'locations'.
+    """
+    return tile_to_long_format(locations, locations, distances, durations)
+
+
+class RateLimiter:
+    """
+    Thread safe limiter that spaces calls evenly so that no more than
+    'requests_per_minute' calls are started within a minute.
+
+    Parameter
+    ---------
+    requests_per_minute : int or None
+        Allowed number of requests per minute. None disables the limit.
+    """
+    def __init__(self, requests_per_minute: Union[int, None] = None):
+        if requests_per_minute is not None and requests_per_minute <= 0:
+            raise ValueError(
+                f"requests_per_minute has to be positive, got {requests_per_minute}")
+
+        self.requests_per_minute = requests_per_minute
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self) -> None:
+        """
+        Blocks until the next request is allowed to be sent.
+        """
+
+        if self.requests_per_minute is None:
+            return
+
+        interval = 60.0 / self.requests_per_minute
+
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + interval
+
+        wait = slot - now
+        if wait > 0:
+            time.sleep(wait)
@@ -0,0 +1,154 @@
+"""
+Report of a matrix run. Collects the pairs that could not be routed and
+counts retried and split requests, so large runs can be checked after they
+finished in one pass.
+"""
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class MatrixReport:
+    """
+    Thread safe collector of the problems of a matrix run. Pass an instance to
+    ORShelper.get_distance_matrix and read it after the run.
+    """
+    def __init__(self):
+        self.retries = 0
+        self.split_tiles = 0
+        self.duplicate_locations = 0
+        self.saved_requests = 0
+        self.cache_hits = 0
+        self._unroutable: List[Tuple[np.ndarray, np.ndarray, str]] = []
+        self._lock = threading.Lock()
+
+    def add_retry(self) -> None:
+        """
+        Counts a retried request.
+        """
+        with self._lock:
+            self.retries += 1
+
+    def add_cache_hits(self, n_hits: int) -> None:
+        """
+        Counts pairs that were taken from the cache.
+        """
+        with self._lock:
+            self.cache_hits += n_hits
+
+    def add_split(self) -> None:
+        """
+        Counts a tile that was split after it failed.
+        """
+        with self._lock:
+            self.split_tiles += 1
+
+    def add_unroutable(
+            self,
+            sources: np.ndarray,
+            destinations: np.ndarray,
+            reason: str) -> None:
+        """
+        Records pairs of source and destination positions without a result.
+        """
+        with self._lock:
+            self._unroutable.append((np.asarray(sources), np.asarray(destinations), reason))
+
+    def merge(self, other: "MatrixReport", inverse: Optional[np.ndarray]=None) -> None:
+        """
+        Adds the counts and unroutable pairs of 'other' to the report.
+
+        Parameter
+        ---------
+        other : MatrixReport
+            Report of a run on the canonical locations of a deduplicated run.
+        inverse : np.ndarray or None
+            Index of the canonical location of every location, like returned
+            by deduplicate_coordinates. The unroutable pairs of 'other' are
+            expanded to all locations of their canonical locations. None
+            keeps the positions.
+        """
+
+        with other._lock: # pylint: disable=protected-access
+            unroutable = list(other._unroutable) # pylint: disable=protected-access
+            counts = (other.retries, other.split_tiles, other.duplicate_locations,
+                      other.saved_requests, other.cache_hits)
+
+        if inverse is not None:
+            order = np.argsort(inverse, kind="stable")
+            sizes = np.bincount(inverse)
+            offsets = np.cumsum(sizes) - sizes
+            expanded = []
+            for sources, destinations, reason in unroutable:
+                sources, destinations = _expand(sources, destinations, order, sizes, offsets)
+                destinations, sources = _expand(destinations, sources, order, sizes, offsets)
+                expanded.append((sources, destinations, reason))
+            unroutable = expanded
+
+        with self._lock:
+            self.retries += counts[0]
+            self.split_tiles += counts[1]
+            self.duplicate_locations += counts[2]
+            self.saved_requests += counts[3]
+            self.cache_hits += counts[4]
+            self._unroutable.extend(unroutable)
+
+    @property
+    def n_unroutable(self) -> int:
+        """
+        Number of pairs without a result.
+        """
+        with self._lock:
+            return sum(len(sources) for sources, _, _ in self._unroutable)
+
+    def unroutable_pairs(self, locations: pd.DataFrame) -> pd.DataFrame:
+        """
+        Returns the pairs without a result with the columns 'start_id',
+        'destination_id' and 'reason'.
+        """
+
+        with self._lock:
+            unroutable = list(self._unroutable)
+
+        if not unroutable:
+            return pd.DataFrame(columns=["start_id", "destination_id", "reason"])
+
+        ids = locations["id"].to_numpy()
+        return pd.DataFrame({
+            "start_id": np.concatenate([ids[sources] for sources, _, _ in unroutable]),
+            "destination_id": np.concatenate(
+                [ids[destinations] for _, destinations, _ in unroutable]),
+            "reason": np.concatenate(
+                [np.repeat(reason, len(sources)) for sources, _, reason in unroutable])
+        })
+
+    def summary(self) -> str:
+        """
+        Returns a short text summary of the run.
+        """
+        return (
+            f"{self.n_unroutable} unroutable pairs, {self.retries} retries, "
+            f"{self.split_tiles} split tiles, {self.duplicate_locations} duplicate "
+            f"locations saved {self.saved_requests} requests, {self.cache_hits} cached pairs"
+        )
+
+
+def _expand(
+        positions: np.ndarray,
+        partners: np.ndarray,
+        order: np.ndarray,
+        sizes: np.ndarray,
+        offsets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Replaces every canonical position by the positions of its locations and
+    repeats the partner of the pair for each of them. 'order' lists the
+    locations grouped by canonical position, a group has 'sizes' locations
+    and starts at 'offsets'.
+    """
+
+    repeats = sizes[positions]
+    first = np.repeat(offsets[positions], repeats)
+    within = np.arange(repeats.sum()) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+    return order[first + within], np.repeat(partners, repeats)
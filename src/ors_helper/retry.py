@@ -0,0 +1,113 @@
+"""
+Retry policy for tile requests. Transient errors (timeouts, connection
+errors, rate limits and server errors) are retried with exponential backoff
+and jitter within a time budget per tile.
+"""
+import random
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+import openrouteservice as ors
+import requests
+
+TRANSIENT_STATUSES = {429, 500, 502, 503, 504}
+
+# openrouteservice matrix error code of a coordinate without a routable point
+ROUTING_ERROR_CODES = {6010}
+
+# the error message of ROUTING_ERROR_CODES names the index of the coordinate
+_COORDINATE_PATTERN = re.compile(r"coordinate (\d+)")
+
+
+def is_transient(exc: Exception) -> bool:
+    """
+    Returns True if the request that raised 'exc' can succeed when it is sent
+    again. Other errors, for example an unroutable coordinate, fail again.
+    """
+
+    if isinstance(exc, ors.exceptions.ApiError):
+        return exc.status in TRANSIENT_STATUSES
+    if isinstance(exc, ors.exceptions.HTTPError):
+        return exc.status_code in TRANSIENT_STATUSES
+    return isinstance(
+        exc,
+        (ors.exceptions.Timeout, requests.exceptions.RequestException, httpx.TransportError)
+    )
+
+
+def is_routing_error(exc: Exception) -> bool:
+    """
+    Returns True if 'exc' is an answer of the server that a coordinate of the
+    request can not be routed, like 404 or the openrouteservice error codes
+    in ROUTING_ERROR_CODES. Only such requests are split to isolate the
+    coordinate. Errors like a bad API key, a used up quota or a too large
+    request fail for every part and are raised.
+    """
+
+    if not isinstance(exc, ors.exceptions.ApiError):
+        return False
+    if exc.status == 404:
+        return True
+
+    error = exc.message.get("error") if isinstance(exc.message, dict) else None
+    return isinstance(error, dict) and error.get("code") in ROUTING_ERROR_CODES
+
+
+def unroutable_location(exc: Exception) -> Optional[int]:
+    """
+    Returns the index of the coordinate in the 'locations' of the request
+    that the routing error 'exc' names, like 'specified coordinate 3' of the
+    openrouteservice error 6010, or None if the error names no coordinate.
+    """
+
+    if not is_routing_error(exc):
+        return None
+
+    error = exc.message.get("error") if isinstance(exc.message, dict) else exc.message
+    if isinstance(error, dict):
+        error = error.get("message")
+    match = _COORDINATE_PATTERN.search(error) if isinstance(error, str) else None
+    return None if match is None else int(match.group(1))
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Retry policy of a single tile request.
+
+    Parameter
+    ---------
+    max_attempts : int
+        Maximum number of attempts of a request, including the first one.
+    base_delay : float
+        Delay in seconds before the first retry. Doubles with every retry.
+    max_delay : float
+        Upper bound of the delay in seconds.
+    jitter : float
+        Relative random deviation of the delay, 0.5 means +-50%.
+    tile_timeout : float or None
+        Time budget in seconds for all attempts of a tile. No retry is started
+        that would end after the budget. None disables the budget.
+    split_failed_tiles : bool
+        Splits a tile that fails with a routing error into halves to isolate
+        the coordinates that can not be routed.
+    """
+    max_attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+    jitter: float = 0.5
+    tile_timeout: Optional[float] = 300.0
+    split_failed_tiles: bool = True
+
+    def __post_init__(self):
+        if self.max_attempts < 1:
+            raise ValueError(f"max_attempts has to be at least 1, got {self.max_attempts}")
+
+    def delay(self, attempt: int) -> float:
+        """
+        Returns the delay in seconds before retry number 'attempt' (1 based).
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay * (1 + self.jitter * (2 * random.random() - 1))
@@ -0,0 +1,199 @@
+"""
+Persistent SQLite cache for the results of matrix requests. Entries are keyed
+by the rounded source and destination coordinates, the profile and the
+requested metrics.
+"""
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+Coordinate = Tuple[float, float]
+
+
+class RouteCache:
+    """
+    Cache for distances and durations between coordinate pairs.
+
+    Parameter
+    ---------
+    path : str
+        Path to the SQLite database file. ':memory:' keeps the cache in memory.
+    precision : int
+        Number of decimal places the coordinates are rounded to for the key.
+    ttl : float or None
+        Time in seconds an entry is valid. None keeps entries forever.
+    max_entries : int or None
+        Maximum number of entries kept by evict(). The oldest entries are
+        removed first. None disables the limit.
+    """
+    def __init__(
+            self,
+            path: str,
+            precision: int=5,
+            ttl: Optional[float]=None,
+            max_entries: Optional[int]=None):
+        self.path = path
+        self.precision = precision
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS routes (
+                source_lon REAL NOT NULL,
+                source_lat REAL NOT NULL,
+                destination_lon REAL NOT NULL,
+                destination_lat REAL NOT NULL,
+                profile TEXT NOT NULL,
+                metrics TEXT NOT NULL,
+                distance REAL,
+                duration REAL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (
+                    source_lon, source_lat, destination_lon, destination_lat,
+                    profile, metrics
+                )
+            )
+            """
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS routes_created_at ON routes (created_at)"
+        )
+        self._connection.commit()
+
+    def close(self) -> None:
+        """
+        Closes the database connection.
+        """
+        self._connection.close()
+
+    def _round(self, coordinate: Coordinate) -> Coordinate:
+        return (
+            round(float(coordinate[0]), self.precision),
+            round(float(coordinate[1]), self.precision)
+        )
+
+    def _valid_since(self) -> float:
+        if self.ttl is None:
+            return float("-inf")
+        return time.time() - self.ttl
+
+    def lookup(
+            self,
+            sources: List[Coordinate],
+            destinations: List[Coordinate],
+            profile: str,
+            metrics: Iterable[str],
+            distances: np.ndarray,
+            durations: np.ndarray) -> np.ndarray:
+        """
+        Fills 'distances' and 'durations' (shape sources x destinations) with
+        the cached values and returns a boolean array that is True for every
+        pair that is not in the cache.
+        """
+
+        metrics_key = ",".join(sorted(metrics))
+        valid_since = self._valid_since()
+
+        destination_positions: Dict[Coordinate, List[int]] = {}
+        for position, destination in enumerate(destinations):
+            destination_positions.setdefault(self._round(destination), []).append(position)
+
+        missing = np.ones((len(sources), len(destinations)), dtype=bool)
+
+        with self._lock:
+            for row, source in enumerate(sources):
+                source_lon, source_lat = self._round(source)
+                cursor = self._connection.execute(
+                    """
+                    SELECT destination_lon, destination_lat, distance, duration
+                    FROM routes
+                    WHERE source_lon = ? AND source_lat = ? AND profile = ?
+                        AND metrics = ? AND created_at >= ?
+                    """,
+                    (source_lon, source_lat, profile, metrics_key, valid_since)
+                )
+                for destination_lon, destination_lat, distance, duration in cursor:
+                    for column in destination_positions.get(
+                            (destination_lon, destination_lat), []):
+                        distances[row, column] = np.nan if distance is None else distance
+                        durations[row, column] = np.nan if duration is None else duration
+                        missing[row, column] = False
+
+            n_missing = int(missing.sum())
+            self.misses += n_missing
+            self.hits += missing.size - n_missing
+
+        return missing
+
+    def store(
+            self,
+            sources: List[Coordinate],
+            destinations: List[Coordinate],
+            profile: str,
+            metrics: Iterable[str],
+            distances: np.ndarray,
+            durations: np.ndarray) -> None:
+        """
+        Stores the distances and durations of a sources x destinations tile.
+        """
+
+        metrics_key = ",".join(sorted(metrics))
+        created_at = time.time()
+        rows = [
+            (
+                *self._round(source),
+                *self._round(destination),
+                profile,
+                metrics_key,
+                None if np.isnan(distances[i, j]) else float(distances[i, j]),
+                None if np.isnan(durations[i, j]) else float(durations[i, j]),
+                created_at
+            )
+            for i, source in enumerate(sources)
+            for j, destination in enumerate(destinations)
+        ]
+
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO routes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._connection.commit()
+
+    def evict(self) -> int:
+        """
+        Removes expired entries and the oldest entries above 'max_entries'.
+        Returns the number of removed entries.
+        """
+
+        with self._lock:
+            removed = self._connection.execute(
+                "DELETE FROM routes WHERE created_at < ?",
+                (self._valid_since(),)
+            ).rowcount
+
+            if self.max_entries is not None:
+                removed += self._connection.execute(
+                    """
+                    DELETE FROM routes WHERE rowid IN (
+                        SELECT rowid FROM routes ORDER BY created_at DESC
+                        LIMIT -1 OFFSET ?
+                    )
+                    """,
+                    (self.max_entries,)
+                ).rowcount
+
+            self._connection.commit()
+
+        return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM routes").fetchone()[0]
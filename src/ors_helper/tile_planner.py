@@ -0,0 +1,259 @@
+"""
+Plans the tiles in which a matrix is requested from the openrouteservice
+server. The server limits the number of routes (sources x destinations) of a
+single matrix request, so rectangular tiles are used to fit as many
+locations as possible into every request.
+"""
+import math
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from .instrumentation import TileMetrics
+
+Tile = Tuple[np.ndarray, np.ndarray]
+
+
+class TileResult(NamedTuple):
+    """
+    Result of a single tile. 'distances' and 'durations' have the shape
+    len(sources) x len(destinations), the positions refer to the rows of the
+    locations. 'index' is the position of the tile in the plan, 'metrics'
+    the TileMetrics of the request.
+    """
+    sources: np.ndarray
+    destinations: np.ndarray
+    distances: np.ndarray
+    durations: np.ndarray
+    index: int = -1
+    metrics: Optional['TileMetrics'] = None
+
+
+@dataclass(frozen=True)
+class TileLimits:
+    """
+    Limits of a single matrix request.
+
+    Parameter
+    ---------
+    max_routes : int
+        Maximum number of sources x destinations. The default matches the
+        'maximum_routes' default of an openrouteservice server.
+    max_locations : int or None
+        Maximum number of sources + destinations. None disables the limit.
+    """
+    max_routes: int = 2500
+    max_locations: Optional[int] = None
+
+    def __post_init__(self):
+        if self.max_routes < 1:
+            raise ValueError(f"max_routes has to be at least 1, got {self.max_routes}")
+        if self.max_locations is not None and self.max_locations < 2:
+            raise ValueError(
+                f"max_locations has to be at least 2, got {self.max_locations}")
+
+    @classmethod
+    def from_chunk_size(cls, chunk_size: int) -> 'TileLimits':
+        """returns the limits of square tiles with 'chunk_size' locations per
+        side"""
+        return cls(max_routes=chunk_size ** 2, max_locations=2 * chunk_size)
+
+    def max_destinations(self, n_sources: int) -> int:
+        """
+        Returns the maximum number of destinations of a tile with 'n_sources'
+        sources.
+        """
+        n_destinations = self.max_routes // n_sources
+        if self.max_locations is not None:
+            n_destinations = min(n_destinations, self.max_locations - n_sources)
+        return n_destinations
+
+
+def split_evenly(positions: np.ndarray, n_parts: int) -> List[np.ndarray]:
+    """
+    Splits 'positions' into 'n_parts' parts whose sizes differ by at most one.
+    """
+    return [part for part in np.array_split(positions, n_parts) if len(part)]
+
+
+def rectangle_shape(
+        n_sources: int,
+        n_destinations: int,
+        limits: TileLimits) -> Tuple[int, int]:
+    """
+    Returns the number of (source parts, destination parts) that cover a
+    n_sources x n_destinations rectangle with the least tiles. The parts are
+    split evenly, so the last row and column of tiles are not smaller than
+    the others.
+    """
+
+    best = (n_sources, n_destinations)
+    best_count = math.inf
+    max_sources = limits.max_routes
+    if limits.max_locations is not None:
+        max_sources = min(max_sources, limits.max_locations - 1)
+
+    # only the smallest number of parts for every distinct part size matters
+    n_source_parts = 1
+    while n_source_parts <= n_sources:
+        source_size = math.ceil(n_sources / n_source_parts)
+        if source_size <= max_sources:
+            destination_size = limits.max_destinations(source_size)
+            n_destination_parts = math.ceil(n_destinations / destination_size)
+            count = n_source_parts * n_destination_parts
+            if count < best_count:
+                best, best_count = (n_source_parts, n_destination_parts), count
+        if source_size == 1:
+            break
+        n_source_parts = math.ceil(n_sources / (source_size - 1))
+
+    return best
+
+
+def iter_rectangle(
+        sources: np.ndarray,
+        destinations: np.ndarray,
+        limits: TileLimits) -> Iterator[Tile]:
+    """
+    Yields the tiles for all pairs of the 'sources' x 'destinations'
+    positions without building the whole plan in memory.
+    """
+
+    if len(sources) == 0 or len(destinations) == 0:
+        return
+
+    n_source_parts, n_destination_parts = rectangle_shape(
+        len(sources), len(destinations), limits)
+    destination_parts = split_evenly(destinations, n_destination_parts)
+
+    for source_part in split_evenly(sources, n_source_parts):
+        for destination_part in destination_parts:
+            yield source_part, destination_part
+
+
+def plan_rectangle(
+        sources: np.ndarray,
+        destinations: np.ndarray,
+        limits: TileLimits) -> List[Tile]:
+    """
+    Plans the tiles for all pairs of the 'sources' x 'destinations' positions.
+    """
+    return list(iter_rectangle(sources, destinations, limits))
+
+
+@lru_cache(maxsize=None)
+def count_tiles(n_sources: int, n_destinations: int, limits: TileLimits) -> int:
+    """
+    Returns the number of tiles of a full n_sources x n_destinations matrix.
+    """
+    n_source_parts, n_destination_parts = rectangle_shape(
+        n_sources, n_destinations, limits)
+    return n_source_parts * n_destination_parts
+
+
+def plan_tiles(missing: np.ndarray, limits: TileLimits) -> List[Tile]:
+    """
+    Plans the tiles that cover the True cells of the boolean sources x
+    destinations array 'missing'. Returns a list of (source positions,
+    destination positions) tuples.
+
+    Rows with the same missing columns are grouped. Neighbouring groups are
+    merged into one rectangle as long as this does not need more requests than
+    planning them separately.
+    """
+
+    rows = np.flatnonzero(missing.any(axis=1))
+    if len(rows) == 0:
+        return []
+
+    patterns = np.packbits(missing[rows], axis=1)
+    counts = missing[rows].sum(axis=1)
+    order = np.lexsort((*patterns.T[::-1], -counts))
+    rows, patterns = rows[order], patterns[order]
+
+    changes = np.flatnonzero((patterns[1:] != patterns[:-1]).any(axis=1)) + 1
+    groups = [
+        (group_rows, np.flatnonzero(missing[group_rows[0]]))
+        for group_rows in np.split(rows, changes)
+    ]
+
+    rectangles = []
+    current_rows, current_columns = groups[0]
+    for group_rows, group_columns in groups[1:]:
+        merged_rows = np.concatenate((current_rows, group_rows))
+        merged_columns = np.union1d(current_columns, group_columns)
+        merged_count = count_tiles(len(merged_rows), len(merged_columns), limits)
+        separate_count = (
+            count_tiles(len(current_rows), len(current_columns), limits)
+            + count_tiles(len(group_rows), len(group_columns), limits)
+        )
+        if merged_count <= separate_count:
+            current_rows, current_columns = merged_rows, merged_columns
+        else:
+            rectangles.append((current_rows, current_columns))
+            current_rows, current_columns = group_rows, group_columns
+    rectangles.append((current_rows, current_columns))
+
+    return [
+        tile
+        for rectangle_rows, rectangle_columns in rectangles
+        for tile in plan_rectangle(rectangle_rows, rectangle_columns, limits)
+    ]
+
+
+def plan_pair_tiles(
+        pair_sources: np.ndarray,
+        pair_destinations: np.ndarray,
+        order: np.ndarray,
+        limits: TileLimits) -> List[Tile]:
+    """
+    Plans dense tiles that cover the sparse (source, destination) pairs.
+
+    Sources are taken in 'order', which should put nearby locations next to
+    each other, and added to a tile as long as the union of their
+    destinations still fits the limits. A source with more destinations than
+    a single request allows gets tiles of its own.
+    """
+
+    if len(pair_sources) == 0:
+        return []
+
+    by_source = np.argsort(pair_sources, kind="stable")
+    sorted_sources = pair_sources[by_source]
+    sorted_destinations = pair_destinations[by_source]
+    starts = np.searchsorted(sorted_sources, order, side="left")
+    ends = np.searchsorted(sorted_sources, order, side="right")
+
+    tiles: List[Tile] = []
+    current_sources: List[int] = []
+    current_destinations = np.array([], dtype=pair_destinations.dtype)
+    single_destinations = limits.max_destinations(1)
+
+    for source, start, end in zip(order, starts, ends):
+        if start == end:
+            continue
+
+        destinations = np.unique(sorted_destinations[start:end])
+        if len(destinations) > single_destinations:
+            for part in range(0, len(destinations), single_destinations):
+                tiles.append((
+                    np.array([source]),
+                    destinations[part:part + single_destinations]
+                ))
+            continue
+
+        union = np.union1d(current_destinations, destinations)
+        if current_sources and limits.max_destinations(len(current_sources) + 1) < len(union):
+            tiles.append((np.array(current_sources), current_destinations))
+            current_sources, union = [], destinations
+
+        current_sources.append(source)
+        current_destinations = union
+
+    if current_sources:
+        tiles.append((np.array(current_sources), current_destinations))
+
+    return tiles
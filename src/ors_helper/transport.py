@@ -0,0 +1,123 @@
+"""
+HTTP transport of the openrouteservice client. Builds a requests session
+with a connection pool sized for the concurrent tile requests, keep-alive,
+separate connect and read timeouts and optionally gzip compressed request
+bodies.
+"""
+import gzip
+from dataclasses import dataclass
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+@dataclass(frozen=True)
+class HttpSettings:
+    """
+    Settings of the HTTP session of an ORShelper.
+
+    Parameter
+    ---------
+    pool_maxsize : int or None
+        Number of connections kept open per host. None sizes the pool to
+        the max_workers of the helper.
+    pool_connections : int
+        Number of hosts a connection pool is kept for.
+    connect_timeout : float
+        Seconds to wait for a connection to the server.
+    read_timeout : float
+        Seconds to wait for the response of a request.
+    keep_alive : bool
+        Reuse connections between requests. False closes the connection
+        after every request.
+    gzip_requests : bool
+        Compress request bodies with gzip. The server has to accept
+        'Content-Encoding: gzip', which a self-hosted openrouteservice does
+        not by default. Responses are always requested compressed.
+    gzip_min_size : int
+        Request bodies smaller than this number of bytes are sent
+        uncompressed.
+    """
+    pool_maxsize: Optional[int] = None
+    pool_connections: int = 1
+    connect_timeout: float = 10.0
+    read_timeout: float = 60.0
+    keep_alive: bool = True
+    gzip_requests: bool = False
+    gzip_min_size: int = 1024
+
+    def __post_init__(self):
+        if self.pool_maxsize is not None and self.pool_maxsize < 1:
+            raise ValueError(
+                f"pool_maxsize has to be at least 1, got {self.pool_maxsize}")
+
+
+class GzipAdapter(HTTPAdapter):
+    """
+    Adapter that compresses request bodies of at least 'min_size' bytes with
+    gzip before they are sent.
+    """
+    def __init__(self, min_size: int=1024, **kwargs):
+        self.min_size = min_size
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+        body = request.body
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        if body is not None and len(body) >= self.min_size:
+            request.body = gzip.compress(body, compresslevel=5)
+            request.headers["Content-Encoding"] = "gzip"
+            request.headers["Content-Length"] = str(len(request.body))
+        return super().send(request, **kwargs)
+
+
+def build_session(settings: HttpSettings, max_workers: int=1) -> requests.Session:
+    """
+    Returns a requests session configured with 'settings'. The connection
+    pool holds at least 'max_workers' connections, so concurrent tile
+    requests do not open and close connections.
+    """
+
+    pool_maxsize = settings.pool_maxsize
+    if pool_maxsize is None:
+        pool_maxsize = max(max_workers, 1)
+
+    session = requests.Session()
+    mount_adapters(session, settings, pool_maxsize)
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    session.headers["Connection"] = "keep-alive" if settings.keep_alive else "close"
+
+    return session
+
+
+def mount_adapters(session: requests.Session, settings: HttpSettings, pool_maxsize: int) -> None:
+    """
+    Mounts adapters with connection pools of 'pool_maxsize' connections per
+    host into 'session' and closes the replaced adapters. Requests in flight
+    finish on the replaced adapters, their connections are closed after
+    that.
+    """
+
+    adapter_kwargs = {
+        "pool_connections": settings.pool_connections,
+        "pool_maxsize": pool_maxsize,
+        # retries are handled by the RetryPolicy of the helper
+        "max_retries": 0,
+        # block instead of discarding connections above the pool size
+        "pool_block": True
+    }
+    if settings.gzip_requests:
+        adapter = GzipAdapter(min_size=settings.gzip_min_size, **adapter_kwargs)
+    else:
+        adapter = HTTPAdapter(**adapter_kwargs)
+
+    replaced = {
+        id(session.adapters[prefix]): session.adapters[prefix]
+        for prefix in ("http://", "https://") if prefix in session.adapters
+    }
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    for previous in replaced.values():
+        previous.close()
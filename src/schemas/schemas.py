@@ -21,7 +21,16 @@ def is_numeric(value: Any) -> bool:
 def check_is_numeric(s: pd.Series) -> pd.Series:
     """
     Checks if values in series are float or int dtypes. Returns a boolean series.
+
+    The result is decided from the dtype for numeric and bool series. Only
+    object series are checked element by element.
     """
+    if pd.api.types.is_bool_dtype(s.dtype):
+        return pd.Series(False, index=s.index)
+
+    if pd.api.types.is_numeric_dtype(s.dtype):
+        return pd.Series(True, index=s.index)
+
     return s.map(is_numeric)
 
 
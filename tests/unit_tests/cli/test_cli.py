@@ -0,0 +1,190 @@
+"""
+Unit tests for the command line interface.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pandas as pd
+import responses
+from pytest import fixture
+from benchmarks.mock_ors_server import MockOrsServer
+from src import cli
+
+
+@fixture(name="input_path")
+def input_path_fixture(tmp_path):
+    """Writes a valid input file and returns its path"""
+    path = os.path.join(tmp_path, "sites.xlsx")
+    pd.DataFrame({
+        "id": ["AB", "BC", "CD"],
+        "latitude": [1, 2, 3],
+        "longitude": [4, 5, 6]
+    }).to_excel(path, index=False)
+    return path
+
+
+@fixture(name="env_path")
+def env_path_fixture(tmp_path, monkeypatch):
+    """Writes a .env file for a local server and returns its path"""
+    for name in ["SERVER_URL", "ORS_API_KEY", "MATRIX_MAX_ROUTES", "MATRIX_MAX_LOCATIONS"]:
+        monkeypatch.delenv(name, raising=False)
+    path = os.path.join(tmp_path, ".env")
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write("SERVER_URL=http://127.0.0.1")
+    return path
+
+
+def test_parser_defaults():
+    """Tests the default arguments"""
+    args = cli.build_parser().parse_args(["input.xlsx"])
+
+    assert args.profile is None
+    assert args.format == "csv"
+    assert args.workers == 1
+
+
+@responses.activate
+def test_main_writes_one_file_per_profile(tmp_path, input_path, env_path, matrix_callback):
+    """Tests if a result file is written for every profile"""
+    for profile in ["car", "hgv"]:
+        responses.add_callback(
+            responses.POST,
+            f"http://127.0.0.1/v2/matrix/driving-{profile}/json",
+            callback=matrix_callback
+        )
+    output_dir = os.path.join(tmp_path, "out")
+
+    exit_code = cli.main([
+        input_path, "-p", "car", "-p", "hgv", "-o", output_dir,
+        "--env-file", env_path, "--workers", "2", "--tile-size", "2",
+        "--cache", os.path.join(tmp_path, "cache.sqlite")
+    ])
+
+    assert exit_code == 0
+    for profile in ["car", "hgv"]:
+        result = pd.read_csv(os.path.join(output_dir, f"sites_{profile}.csv"))
+        assert len(result) == 9
+
+
+@responses.activate
+def test_main_max_routes_keeps_max_locations(tmp_path, input_path, env_path, matrix_callback):
+    """Tests if --max-routes keeps the MATRIX_MAX_LOCATIONS of the .env file"""
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=matrix_callback
+    )
+    with open(env_path, 'a', encoding='utf-8') as file:
+        file.write("\nMATRIX_MAX_LOCATIONS=3")
+
+    exit_code = cli.main([
+        input_path, "-p", "car", "-o", os.path.join(tmp_path, "out"),
+        "--env-file", env_path, "--max-routes", "100"
+    ])
+
+    assert exit_code == 0
+    assert all(len(json.loads(call.request.body)["locations"]) <= 3
+               for call in responses.calls)
+
+
+@responses.activate
+def test_main_writes_unroutable_pairs(tmp_path, input_path, env_path, matrix_callback):
+    """Tests if the unroutable pairs are written next to the result"""
+    def callback(request):
+        body = json.loads(request.body)
+        response = json.loads(matrix_callback(request)[2])
+        for row, source in enumerate(body["sources"]):
+            for column, destination in enumerate(body["destinations"]):
+                if [6, 3] in (body["locations"][source], body["locations"][destination]):
+                    response["distances"][row][column] = None
+        return (200, {}, json.dumps(response))
+
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=callback
+    )
+    output_dir = os.path.join(tmp_path, "out")
+
+    exit_code = cli.main([input_path, "-p", "car", "-o", output_dir, "--env-file", env_path])
+    unroutable = pd.read_csv(os.path.join(output_dir, "sites.unroutable.csv"))
+
+    assert exit_code == 0
+    assert len(unroutable) == 5
+    assert ((unroutable["start_id"] == "CD") | (unroutable["destination_id"] == "CD")).all()
+
+
+def test_cli_does_not_import_tkinter():
+    """Tests if importing the command line interface does not load tkinter"""
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+    code = "import sys, src.cli; sys.exit('tkinter' in sys.modules)"
+
+    completed = subprocess.run([sys.executable, "-c", code], cwd=root, check=False)
+
+    assert completed.returncode == 0
+
+
+@responses.activate
+def test_main_stream(tmp_path, input_path, env_path, matrix_callback):
+    """Tests if the streamed result contains every pair"""
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=matrix_callback
+    )
+
+    cli.main([
+        input_path, "-o", str(tmp_path), "--env-file", env_path,
+        "--stream", "-f", "parquet", "--tile-size", "2"
+    ])
+
+    result = pd.read_parquet(os.path.join(tmp_path, "sites_car.parquet"))
+    assert len(result) == 9
+
+
+@responses.activate
+def test_main_destinations(tmp_path, input_path, env_path, matrix_callback):
+    """Tests if only the sources x destinations pairs are written"""
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=matrix_callback
+    )
+    destinations_path = os.path.join(tmp_path, "customers.csv")
+    pd.DataFrame({
+        "id": ["X", "Y"],
+        "latitude": [7, 8],
+        "longitude": [9, 10]
+    }).to_csv(destinations_path, index=False)
+
+    cli.main([
+        input_path, "--destinations", destinations_path, "-o", str(tmp_path),
+        "--env-file", env_path
+    ])
+
+    result = pd.read_csv(os.path.join(tmp_path, "sites_car.csv"))
+    assert len(result) == 6
+    assert set(result["destination_id"]) == {"X", "Y"}
+
+
+def test_main_distributed(tmp_path, input_path, env_path):
+    """Tests if a distributed job is planned, requested by worker processes
+    and merged into the result file"""
+    job_dir = os.path.join(tmp_path, "job")
+    output_dir = os.path.join(tmp_path, "out")
+
+    with MockOrsServer() as server:
+        with open(env_path, 'w', encoding='utf-8') as file:
+            file.write(f"SERVER_URL={server.url}")
+        exit_code = cli.main([
+            input_path, "-o", output_dir, "--env-file", env_path, "--tile-size", "2",
+            "--distributed", job_dir, "--local-workers", "2"
+        ])
+
+    assert exit_code == 0
+    assert len(os.listdir(os.path.join(job_dir, "car", "results"))) == 3
+    result = pd.read_csv(os.path.join(output_dir, "sites_car.csv"))
+    assert len(result) == 9
+    assert result["distance"].notna().all()
@@ -0,0 +1,39 @@
+"""
+Fixtures shared by the unit tests
+"""
+import json
+import pandas as pd
+from pytest import fixture
+
+
+@fixture(name="locations")
+def locations_fixture():
+    """Returns a input schema conform dataframe with 5 locations"""
+    return pd.DataFrame({
+        "id": ["A", "B", "C", "D", "E"],
+        "latitude": [1.0, 2.0, 3.0, 4.0, 5.0],
+        "longitude": [10.0, 20.0, 30.0, 40.0, 50.0]
+    })
+
+
+@fixture(name="matrix_callback")
+def matrix_callback_fixture():
+    """Returns a responses callback that answers a matrix request with
+    distances/durations computed from the coordinates of the requested
+    sources and destinations"""
+
+    def matrix_callback(request):
+        body = json.loads(request.body)
+        locations = body["locations"]
+        sources = [locations[i] for i in body["sources"]]
+        destinations = [locations[i] for i in body["destinations"]]
+
+        distances = [
+            [abs(s[0] - d[0]) + abs(s[1] - d[1]) for d in destinations]
+            for s in sources
+        ]
+        durations = [[value * 2 for value in row] for row in distances]
+
+        return (200, {}, json.dumps({"distances": distances, "durations": durations}))
+
+    return matrix_callback
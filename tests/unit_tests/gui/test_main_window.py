@@ -9,6 +9,7 @@ from os import path
 import pandas as pd
 from pytest import fixture
 from src.gui.main_window import MainWindow
+from src.ors_helper.ors_helper import MatrixCancelled
 
 
 @fixture(name="input_df")
@@ -170,3 +171,111 @@ def test_update_info_field():
     main_window.update_info_field_text(info_text)
 
     assert main_window.info_field.get("1.0", tk.END) == "This is a info field update\n"
+
+
+def wait_for_job(main_window, profile):
+    """Waits for the background job of profile and processes its messages"""
+    main_window.jobs[profile].result(timeout=5)
+    main_window.process_messages()
+
+
+def test_get_distance_matrix_car_background(input_df, monkeypatch):
+    """
+    Tests if the matrix is computed in the background and shown when done.
+    """
+
+    root = tk.Tk()
+    main_window = MainWindow(root)
+    main_window.input_file = input_df
+    result_df = pd.DataFrame({"start_id": ["AB"], "destination_id": ["BC"]})
+
+    def fake_get_distance_matrix(locations, profile, progress, cancel):
+        progress(1, 2)
+        progress(2, 2)
+        return result_df
+
+    monkeypatch.setattr(
+        main_window.ors_helper, "get_distance_matrix", fake_get_distance_matrix)
+
+    main_window.get_distance_matrix_car()
+    wait_for_job(main_window, "car")
+
+    pd.testing.assert_frame_equal(main_window.distance_matrix_car, result_df)
+    assert main_window.progress_bars["car"]["value"] == 2
+    assert main_window.progress_labels["car"].cget("text") == "Finished"
+    root.destroy()
+
+
+def test_cancel_distance_matrix(input_df, monkeypatch):
+    """
+    Tests if a running matrix request is cancelled.
+    """
+
+    root = tk.Tk()
+    main_window = MainWindow(root)
+    main_window.input_file = input_df
+
+    def fake_get_distance_matrix(locations, profile, progress, cancel):
+        cancel.wait(timeout=5)
+        raise MatrixCancelled()
+
+    monkeypatch.setattr(
+        main_window.ors_helper, "get_distance_matrix", fake_get_distance_matrix)
+
+    main_window.get_distance_matrix_hgv()
+    main_window.cancel_distance_matrix("hgv")
+    wait_for_job(main_window, "hgv")
+
+    assert main_window.progress_labels["hgv"].cget("text") == "Cancelled"
+    assert main_window.distance_matrix_hgv.empty
+    root.destroy()
+
+
+def test_start_distance_matrices(input_df, monkeypatch):
+    """
+    Tests if all profiles are computed in one background pass.
+    """
+
+    root = tk.Tk()
+    main_window = MainWindow(root)
+    main_window.input_file = input_df
+    results = {
+        profile: pd.DataFrame({"start_id": ["AB"], "profile": [profile]})
+        for profile in ["car", "hgv"]
+    }
+
+    def fake_get_distance_matrices(locations, profiles, progress, cancel):
+        progress(4, 4)
+        return results
+
+    monkeypatch.setattr(
+        main_window.ors_helper, "get_distance_matrices", fake_get_distance_matrices)
+
+    main_window.start_distance_matrices()
+    wait_for_job(main_window, "car")
+
+    assert main_window.jobs["car"] is main_window.jobs["hgv"]
+    pd.testing.assert_frame_equal(main_window.distance_matrix_car, results["car"])
+    pd.testing.assert_frame_equal(main_window.distance_matrix_hgv, results["hgv"])
+    assert main_window.progress_bars["hgv"]["value"] == 4
+    root.destroy()
+
+
+def test_save_distance_matrix(tmp_path):
+    """
+    Tests if a computed matrix is written in the background.
+    """
+
+    root = tk.Tk()
+    main_window = MainWindow(root)
+    main_window.distance_matrix_car = pd.DataFrame({
+        "start_id": ["AB"], "destination_id": ["BC"], "distance": [1.0], "duration": [2.0]
+    })
+    output_path = path.join(tmp_path, "matrix.csv")
+
+    main_window.save_distance_matrix("car", output_path)
+    wait_for_job(main_window, "save_car")
+
+    pd.testing.assert_frame_equal(pd.read_csv(output_path), main_window.distance_matrix_car)
+    assert "Saved" in main_window.info_field.get("1.0", tk.END)
+    root.destroy()
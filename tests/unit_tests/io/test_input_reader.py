@@ -2,7 +2,7 @@
 import os
 
 import pandas as pd
-from pytest import fixture, raises
+from pytest import fixture, mark, raises
 from pandera.errors import SchemaError
 
 from src.file_io import input_reader
@@ -42,3 +42,63 @@ def test_read_xlsx_input_file_schema_fail(tmp_path, input_df):
         input_reader.read_xlsx_input_file(path)
 
     assert isinstance(exc.value, SchemaError)
+
+
+def test_read_matrix_file_csv(tmp_path):
+    """Tests if a long format matrix is read from a csv file"""
+    path = os.path.join(tmp_path, "matrix.csv")
+    matrix_df = pd.DataFrame({
+        "start_id": ["A", "A"],
+        "destination_id": ["A", "B"],
+        "distance": [0.0, 1.0],
+        "duration": [0.0, 2.0]
+    })
+    matrix_df.to_csv(path, index=False)
+
+    result = input_reader.read_matrix_file(path)
+
+    pd.testing.assert_frame_equal(result, matrix_df)
+
+
+def test_read_matrix_file_missing_columns(tmp_path):
+    """Tests if ValueError is raised when columns are missing"""
+    path = os.path.join(tmp_path, "matrix.csv")
+    pd.DataFrame({"start_id": ["A"]}).to_csv(path, index=False)
+
+    with raises(ValueError):
+        input_reader.read_matrix_file(path)
+
+
+@mark.parametrize("extension", ["xlsx", "csv", "parquet", "feather"])
+def test_read_input_file_formats(tmp_path, input_df, extension):
+    """Tests if every format is read with only the required columns"""
+    path = os.path.join(tmp_path, f"temp.{extension}")
+    input_df["address"] = ["street 1", "street 2"]
+    writers = {
+        "xlsx": lambda: input_df.to_excel(path, index=False),
+        "csv": lambda: input_df.to_csv(path, index=False),
+        "parquet": lambda: input_df.to_parquet(path, index=False),
+        "feather": lambda: input_df.to_feather(path)
+    }
+    writers[extension]()
+
+    result = input_reader.read_input_file(path)
+
+    assert list(result.columns) == ["id", "latitude", "longitude"]
+    assert result["id"].tolist() == ["BE", "BE2"]
+    assert result["longitude"].tolist() == [-45, 45]
+
+
+def test_read_input_file_csv_schema_fail(tmp_path, input_df):
+    """Tests if SchemaError is raised when a required column is missing"""
+    path = os.path.join(tmp_path, "temp.csv")
+    input_df.drop(columns="latitude").to_csv(path, index=False)
+
+    with raises(SchemaError):
+        input_reader.read_input_file(path)
+
+
+def test_read_input_file_extension_error(tmp_path):
+    """Tests if ValueError is raised for an unsupported extension"""
+    with raises(ValueError):
+        input_reader.read_input_file(os.path.join(tmp_path, "temp.txt"))
@@ -0,0 +1,139 @@
+"""Tests the src.file_io.output_writer module"""
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from pytest import fixture, mark, raises
+
+from src.file_io import input_reader, output_writer
+from src.ors_helper.distance_matrix import DistanceMatrix
+from src.ors_helper.tile_planner import TileResult
+
+
+@fixture(name="matrix_df")
+def matrix_df_fixture():
+    """Returns a long format matrix"""
+    return pd.DataFrame({
+        "start_id": ["A", "A", "B", "B"],
+        "destination_id": ["A", "B", "A", "B"],
+        "distance": [0.0, 1.0, 1.0, 0.0],
+        "duration": [0.0, 2.0, 2.0, 0.0]
+    })
+
+
+@mark.parametrize("extension", ["csv", "csv.zst", "xlsx", "parquet"])
+def test_write_matrix_file(tmp_path, matrix_df, extension):
+    """Tests if the matrix is written in the format of the extension"""
+    path = os.path.join(tmp_path, f"matrix.{extension}")
+
+    output_writer.write_matrix_file(matrix_df, path, chunk_rows=3)
+
+    pd.testing.assert_frame_equal(
+        input_reader.read_matrix_file(path), matrix_df, check_dtype=False)
+
+
+@mark.parametrize("extension", ["csv", "parquet"])
+def test_write_matrix_file_distance_matrix(tmp_path, extension):
+    """Tests if a DistanceMatrix is written in chunks of sources"""
+    distances = np.arange(12, dtype=np.float32).reshape(4, 3)
+    distances[1, 2] = np.nan
+    matrix = DistanceMatrix(["A", "B", "C", "D"], ["X", "Y", "Z"], distances, distances * 2)
+    path = os.path.join(tmp_path, f"matrix.{extension}")
+
+    chunks = list(output_writer.iter_matrix_chunks(matrix, chunk_rows=7))
+    output_writer.write_matrix_file(matrix, path, chunk_rows=7)
+
+    assert [len(chunk) for chunk in chunks] == [6, 6]
+    pd.testing.assert_frame_equal(
+        input_reader.read_matrix_file(path), matrix.to_long_dataframe(), check_dtype=False)
+
+
+def test_write_xlsx_file_sheet_split(tmp_path, matrix_df):
+    """Tests if rows above the sheet limit continue on a new sheet"""
+    path = os.path.join(tmp_path, "matrix.xlsx")
+    matrix_df.loc[1, "distance"] = np.nan
+
+    n_sheets = output_writer.write_xlsx_file(matrix_df, path, rows_per_sheet=3, chunk_rows=2)
+    sheets = pd.read_excel(path, sheet_name=None)
+
+    assert n_sheets == 2
+    assert list(sheets) == ["matrix", "matrix (2)"]
+    assert [len(sheet) for sheet in sheets.values()] == [3, 1]
+    pd.testing.assert_frame_equal(
+        input_reader.read_matrix_file(path), matrix_df, check_dtype=False)
+
+
+def test_write_parquet_dataset(tmp_path, matrix_df):
+    """Tests if the matrix is split into parquet files of a dataset"""
+    directory = os.path.join(tmp_path, "matrix")
+
+    paths = output_writer.write_parquet_dataset(matrix_df, directory, rows_per_file=3)
+
+    assert [os.path.basename(path) for path in paths] == [
+        "part-00000.parquet", "part-00001.parquet"
+    ]
+    pd.testing.assert_frame_equal(pd.read_parquet(directory), matrix_df)
+
+
+def test_write_matrix_file_extension_error(tmp_path, matrix_df):
+    """Tests if ValueError is raised for an unknown extension"""
+    with raises(ValueError):
+        output_writer.write_matrix_file(matrix_df, os.path.join(tmp_path, "matrix.txt"))
+
+
+@fixture(name="tiles")
+def tiles_fixture():
+    """Returns the tiles of a 5 x 5 matrix where distance is 10 * start + destination"""
+    full = np.arange(5)[:, None] * 10.0 + np.arange(5)[None, :]
+    return [
+        TileResult(np.arange(3), np.arange(5), full[:3], full[:3] * 2),
+        TileResult(np.arange(3, 5), np.arange(5), full[3:], full[3:] * 2)
+    ]
+
+
+@mark.parametrize("sink_class, reader", [
+    (output_writer.CsvTileSink, pd.read_csv),
+    (output_writer.ParquetTileSink, pd.read_parquet)
+])
+def test_long_format_tile_sinks(tmp_path, locations, tiles, sink_class, reader):
+    """Tests if the tile sinks write all rows in long format"""
+    path = os.path.join(tmp_path, "matrix")
+
+    with sink_class(path, locations) as sink:
+        for tile in tiles:
+            sink.write(tile)
+
+    result = reader(path)
+
+    assert sink.tiles_written == 2
+    assert len(result) == 25
+    row = result[(result["start_id"] == "C") & (result["destination_id"] == "B")]
+    assert row["distance"].item() == 21.0
+    assert row["duration"].item() == 42.0
+
+
+def test_parquet_tile_sink_row_groups(tmp_path, locations, tiles):
+    """Tests if buffered tiles are written as row groups"""
+    path = os.path.join(tmp_path, "matrix.parquet")
+
+    with output_writer.ParquetTileSink(path, locations, row_group_size=12) as sink:
+        for tile in tiles:
+            sink.write(tile)
+
+    assert pq.ParquetFile(path).num_row_groups == 2
+
+
+def test_npy_tile_sink(tmp_path, locations, tiles):
+    """Tests if the tiles are written into memory-mapped arrays"""
+    distances_path = os.path.join(tmp_path, "distances.npy")
+    durations_path = os.path.join(tmp_path, "durations.npy")
+
+    with output_writer.NpyTileSink(distances_path, durations_path, locations) as sink:
+        sink.write(tiles[1])
+
+    distances = np.load(distances_path, mmap_mode="r")
+
+    assert distances.dtype == np.float32
+    np.testing.assert_array_equal(distances[3], [30.0, 31.0, 32.0, 33.0, 34.0])
+    assert np.isnan(distances[:3]).all()
@@ -0,0 +1,225 @@
+"""Tests for the AsyncORShelper class"""
+import asyncio
+import json
+import os
+import threading
+import httpx
+import numpy as np
+import openrouteservice as ors
+import pandas as pd
+from pytest import raises
+from src.ors_helper.async_helper import AsyncORShelper
+from src.ors_helper.distance_matrix import DistanceMatrix
+from src.ors_helper.report import MatrixReport
+from src.ors_helper.retry import RetryPolicy
+from src.ors_helper.route_cache import RouteCache
+from src.ors_helper.tile_planner import TileLimits
+
+TEST_URL = "http://127.0.0.1"
+
+
+def matrix_response(request: httpx.Request) -> httpx.Response:
+    """Answers a matrix request with distances/durations computed from the
+    coordinates of the requested sources and destinations"""
+    body = json.loads(request.content)
+    locations = body["locations"]
+    sources = [locations[i] for i in body["sources"]]
+    destinations = [locations[i] for i in body["destinations"]]
+
+    distances = [
+        [abs(s[0] - d[0]) + abs(s[1] - d[1]) for d in destinations]
+        for s in sources
+    ]
+    durations = [[value * 2 for value in row] for row in distances]
+
+    return httpx.Response(200, json={"distances": distances, "durations": durations})
+
+
+def build_helper(handler, **kwargs) -> AsyncORShelper:
+    """Returns a helper whose requests are answered by 'handler'"""
+    client = httpx.AsyncClient(base_url=TEST_URL, transport=httpx.MockTransport(handler))
+    return AsyncORShelper(server_url=TEST_URL, api_key="key", client=client, **kwargs)
+
+
+def test_async_get_distance_matrix(locations):
+    """Tests if the async matrix equals the expected matrix, the requests
+    are bounded by max_concurrency and carry the API key"""
+    in_flight = 0
+    max_in_flight = 0
+    keys = set()
+
+    async def handler(request):
+        nonlocal in_flight, max_in_flight
+        keys.add(request.headers["Authorization"])
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return matrix_response(request)
+
+    async def run():
+        async with build_helper(handler, max_concurrency=2) as helper:
+            return await helper.get_distance_matrix(locations, "car", chunk_size=2)
+
+    result = asyncio.run(run())
+
+    assert len(result) == 25
+    assert list(result.columns) == [
+        "start_index", "destination_index", "distance", "duration", "start_id",
+        "destination_id"]
+    row = result[(result["start_id"] == "A") & (result["destination_id"] == "E")].iloc[0]
+    assert row["distance"] == 44.0
+    assert row["duration"] == 88.0
+    assert max_in_flight == 2
+    assert keys == {"key"}
+
+
+def test_async_get_distance_matrix_dense(locations):
+    """Tests if dense returns a DistanceMatrix and progress is reported"""
+    calls = []
+
+    async def run():
+        helper = build_helper(matrix_response, max_concurrency=3)
+        try:
+            return await helper.get_distance_matrix(
+                locations, "hgv", chunk_size=2, dense=True,
+                progress=lambda finished, total: calls.append((finished, total)))
+        finally:
+            await helper.close()
+
+    matrix = asyncio.run(run())
+
+    assert isinstance(matrix, DistanceMatrix)
+    assert matrix.distances.dtype == np.float32
+    assert matrix.lookup("B", "D") == (22.0, 44.0)
+    assert calls == [(finished, 9) for finished in range(1, 10)]
+
+
+def test_async_iter_distance_matrix(locations):
+    """Tests if every tile is yielded once and covers the matrix"""
+
+    async def run():
+        helper = build_helper(
+            matrix_response, max_concurrency=2, tile_limits=TileLimits(max_routes=4))
+        return [tile async for tile in helper.iter_distance_matrix(locations, "car")]
+
+    tiles = asyncio.run(run())
+
+    covered = np.zeros((5, 5), dtype=int)
+    for tile in tiles:
+        covered[np.ix_(tile.sources, tile.destinations)] += 1
+    assert (covered == 1).all()
+    assert sorted(tile.index for tile in tiles) == list(range(len(tiles)))
+
+
+def test_async_get_distance_matrix_retry_and_split(locations):
+    """Tests if transient errors are retried and the unroutable location the
+    error names is dropped from the tile without splitting it"""
+    failures = {"transient": 1}
+
+    def handler(request):
+        body = json.loads(request.content)
+        if failures["transient"]:
+            failures["transient"] -= 1
+            return httpx.Response(503, json={"error": "busy"})
+        if [50.0, 5.0] in body["locations"]:
+            index = body["locations"].index([50.0, 5.0])
+            return httpx.Response(404, json={"error": {
+                "code": 6010,
+                "message": "Could not find routable point within a radius of 350.0 "
+                           f"meters of specified coordinate {index}: 50.0 5.0."}})
+        return matrix_response(request)
+
+    report = MatrixReport()
+
+    async def run():
+        helper = build_helper(handler, retry_policy=RetryPolicy(base_delay=0.0))
+        return await helper.get_distance_matrix(locations, "car", report=report)
+
+    result = asyncio.run(run())
+
+    unroutable = result["start_id"].eq("E") | result["destination_id"].eq("E")
+    assert result.loc[unroutable, "distance"].isna().all()
+    assert result.loc[~unroutable, "distance"].notna().all()
+    assert report.retries == 1
+    assert report.split_tiles == 0
+    assert report.n_unroutable == 9
+
+
+def test_async_get_distance_matrix_cache_off_the_loop(locations):
+    """Tests if cached pairs are not requested again and the cache is used
+    outside of the event loop thread"""
+    requests_sent = []
+
+    def handler(request):
+        requests_sent.append(request)
+        return matrix_response(request)
+
+    cache = RouteCache(":memory:")
+    cache_threads = set()
+    for name in ["lookup", "store", "evict"]:
+        method = getattr(cache, name)
+
+        def record(*args, method=method, **kwargs):
+            cache_threads.add(threading.get_ident())
+            return method(*args, **kwargs)
+
+        setattr(cache, name, record)
+
+    async def run():
+        helper = build_helper(handler, cache=cache)
+        async with helper:
+            first = await helper.get_distance_matrix(locations, "car", chunk_size=2)
+            second = await helper.get_distance_matrix(locations, "car", chunk_size=2)
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert len(requests_sent) == 9
+    pd.testing.assert_frame_equal(first, second)
+    assert cache_threads
+    assert threading.get_ident() not in cache_threads
+
+
+def test_async_ors_helper_max_concurrency_error():
+    """Tests if a max_concurrency below 1 is rejected"""
+    with raises(ValueError):
+        AsyncORShelper(server_url=TEST_URL, max_concurrency=0)
+
+
+def test_async_ors_helper_from_env_file(tmp_path, monkeypatch):
+    """Tests if a single server of the .env file is used and several servers
+    are rejected with a clear error"""
+    monkeypatch.delenv("SERVER_URL", raising=False)
+    monkeypatch.delenv("ORS_API_KEY", raising=False)
+    env_path = os.path.join(tmp_path, ".env")
+
+    with open(env_path, 'w', encoding='utf-8') as file:
+        file.write("SERVER_URL=http://ors-1\nORS_API_KEY=key-1")
+    helper = AsyncORShelper.from_env_file(dotenv_path=env_path)
+    assert helper.server_url == "http://ors-1"
+
+    monkeypatch.setenv("SERVER_URL", "http://ors-1,http://ors-2")
+    with raises(ValueError, match="single server"):
+        AsyncORShelper.from_env_file(dotenv_path=env_path)
+
+
+def test_async_get_distance_matrix_forbidden_is_raised(locations):
+    """Tests if a rejected API key is raised without splitting the tile"""
+    requests_sent = []
+
+    def handler(request):
+        requests_sent.append(request)
+        return httpx.Response(403, json={"error": "Access to this API has been disallowed"})
+
+    report = MatrixReport()
+
+    async def run():
+        helper = build_helper(handler)
+        return await helper.get_distance_matrix(locations, "car", report=report)
+
+    with raises(ors.exceptions.ApiError):
+        asyncio.run(run())
+
+    assert len(requests_sent) == 1
+    assert report.split_tiles == 0
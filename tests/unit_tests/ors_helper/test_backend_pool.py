@@ -0,0 +1,151 @@
+"""
+Unit tests for backend_pool.py
+"""
+import threading
+import requests
+from pytest import raises
+from src.ors_helper import backend_pool
+from src.ors_helper.backend_pool import Backend, BackendPool
+from src.ors_helper.tile_planner import TileLimits
+
+
+def test_backend_pool_prefers_lower_latency():
+    """Tests if untried backends are tried first and the faster backend gets
+    the next request"""
+    pool = BackendPool([Backend("http://a"), Backend("http://b")])
+
+    first = pool.acquire()
+    second = pool.acquire()
+    assert {first.backend.server_url, second.backend.server_url} == {"http://a", "http://b"}
+
+    pool.release(first, 1.0, failed=False)
+    pool.release(second, 0.1, failed=False)
+
+    assert pool.acquire() is second
+
+
+def test_backend_pool_shares_one_session(monkeypatch):
+    """Tests if the backends share one session and the sessions the clients
+    built are closed"""
+    closed = []
+    monkeypatch.setattr(
+        requests.Session, "close", lambda session: closed.append(session))
+    session = requests.Session()
+
+    pool = BackendPool([Backend("http://a"), Backend("http://b")])
+    given = BackendPool([Backend("http://a"), Backend("http://b")], session=session)
+
+    assert {id(state.client._session) for state in pool.backends} == {id(pool.session)}
+    assert all(state.client._session is session for state in given.backends)
+    assert len(closed) == 4
+    assert pool.session not in closed and session not in closed
+
+
+def test_backend_pool_spreads_by_expected_wait():
+    """Tests if requests in flight count against a backend"""
+    pool = BackendPool([Backend("http://a"), Backend("http://b")])
+    fast, slow = pool.backends
+    fast.latency, slow.latency = 0.1, 0.2
+
+    picked = [pool.acquire().backend.server_url for _ in range(5)]
+
+    assert picked.count("http://a") == 3
+    assert picked.count("http://b") == 2
+
+
+def test_backend_pool_out_of_rotation(monkeypatch):
+    """Tests if a failing backend is skipped during the cooldown and is
+    probed again afterwards"""
+    now = [100.0]
+    monkeypatch.setattr(backend_pool.time, "monotonic", lambda: now[0])
+    pool = BackendPool(
+        [Backend("http://a"), Backend("http://b")], failure_threshold=2, cooldown=10.0)
+    failing, healthy = pool.backends
+    healthy.latency = 1.0
+
+    for _ in range(2):
+        failing.in_flight += 1
+        pool.release(failing, 0.0, failed=True)
+
+    assert failing.down_until == 110.0
+    assert all(pool.acquire() is healthy for _ in range(3))
+    assert list(pool.stats()["healthy"]) == [False, True]
+
+    now[0] = 111.0
+    probe = pool.acquire()
+    assert probe is failing
+
+    pool.release(probe, 0.5, failed=False)
+    assert failing.down_until == 0.0
+    assert failing.consecutive_failures == 0
+
+
+def test_backend_pool_failed_without_latency_ranks_last():
+    """Tests if a backend that failed before its first answer is not taken
+    for the fastest one"""
+    pool = BackendPool([Backend("http://a"), Backend("http://b")])
+    dead, healthy = pool.backends
+    healthy.latency = 2.0
+
+    pool.release(pool.acquire(), 0.0, failed=True)
+    assert dead.consecutive_failures == 1
+
+    assert all(pool.acquire() is healthy for _ in range(3))
+
+
+def test_backend_pool_all_down_probes_first_recovery(monkeypatch):
+    """Tests if the backend that recovers first is used when every backend
+    is out of rotation"""
+    monkeypatch.setattr(backend_pool.time, "monotonic", lambda: 100.0)
+    pool = BackendPool([Backend("http://a"), Backend("http://b")])
+    pool.backends[0].down_until = 130.0
+    pool.backends[1].down_until = 120.0
+
+    assert pool.acquire() is pool.backends[1]
+
+
+def test_backend_pool_max_workers_blocks():
+    """Tests if acquire waits for a free slot of a limited backend"""
+    pool = BackendPool([Backend("http://a", max_workers=1)])
+    state = pool.acquire()
+    acquired = threading.Event()
+
+    def acquire():
+        pool.acquire()
+        acquired.set()
+
+    thread = threading.Thread(target=acquire)
+    thread.start()
+    assert not acquired.wait(0.05)
+
+    pool.release(state, 0.1, failed=False)
+    thread.join(timeout=1.0)
+    assert acquired.is_set()
+
+
+def test_backend_pool_tile_limits():
+    """Tests if the tile limits fit every backend"""
+    pool = BackendPool([
+        Backend("http://a", tile_limits=TileLimits(max_routes=10000, max_locations=200)),
+        Backend("http://b"),
+        Backend("http://c", tile_limits=TileLimits(max_routes=50000, max_locations=100))
+    ])
+
+    assert pool.tile_limits(TileLimits(max_routes=3500)) == TileLimits(
+        max_routes=3500, max_locations=100)
+
+
+def test_backend_pool_max_workers():
+    """Tests the total max_workers of a pool"""
+    assert BackendPool([
+        Backend("http://a", max_workers=2), Backend("http://b", max_workers=3)
+    ]).max_workers == 5
+    assert BackendPool([Backend("http://a", max_workers=2), Backend("http://b")]).max_workers is None
+
+
+def test_backend_pool_errors():
+    """Tests if invalid pools and backends are rejected"""
+    with raises(ValueError):
+        BackendPool([])
+    with raises(ValueError):
+        Backend("http://a", max_workers=0)
@@ -0,0 +1,56 @@
+"""
+Unit tests for checkpoint.py
+"""
+import os
+
+from pytest import raises
+from src.ors_helper.checkpoint import Checkpoint, job_fingerprint
+from src.ors_helper.tile_planner import TileLimits
+
+
+def test_job_fingerprint(locations):
+    """Tests if the fingerprint changes with the input"""
+    fingerprint = job_fingerprint(locations, "car", TileLimits())
+    moved = locations.assign(latitude=[1.0, 2.5, 3.0, 4.0, 5.0])
+
+    assert fingerprint == job_fingerprint(locations.copy(), "car", TileLimits())
+    assert fingerprint != job_fingerprint(locations, "hgv", TileLimits())
+    assert fingerprint != job_fingerprint(locations, "car", TileLimits(max_routes=10))
+    assert fingerprint != job_fingerprint(moved, "car", TileLimits())
+
+
+def test_checkpoint_resume(tmp_path):
+    """Tests if finished tiles and the last sink state are read back"""
+    path = os.path.join(tmp_path, "job.checkpoint")
+    checkpoint = Checkpoint(path)
+    assert checkpoint.open("abc") == (set(), None)
+    assert not checkpoint.resumed
+    checkpoint.mark_done(3, sink_state=10)
+    checkpoint.mark_done(1, sink_state=20)
+    checkpoint.close()
+
+    with open(path, "a", encoding="utf-8") as file:
+        file.write('{"tile": 7, "sink')
+
+    resumed = Checkpoint(path)
+
+    assert resumed.open("abc") == ({1, 3}, 20)
+    assert resumed.resumed
+    resumed.mark_done(7, sink_state=30)
+    resumed.finish()
+
+    finished = Checkpoint(path)
+    assert finished.open("abc") == ({1, 3, 7}, 30)
+    assert finished.finished
+    finished.close()
+
+
+def test_checkpoint_other_job(tmp_path):
+    """Tests if ValueError is raised for a manifest of another job"""
+    path = os.path.join(tmp_path, "job.checkpoint")
+    checkpoint = Checkpoint(path)
+    checkpoint.open("abc")
+    checkpoint.close()
+
+    with raises(ValueError):
+        Checkpoint(path).open("xyz")
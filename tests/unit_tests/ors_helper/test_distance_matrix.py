@@ -0,0 +1,87 @@
+"""Tests for the DistanceMatrix result class"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pytest import fixture, raises
+from src.ors_helper.distance_matrix import DistanceMatrix
+
+
+@fixture(name="matrix")
+def matrix_fixture():
+    """Returns a 2 x 3 matrix with distinct values"""
+    distances = np.arange(6, dtype=np.float32).reshape(2, 3)
+    return DistanceMatrix(
+        ["A", "B"], ["X", "Y", "Z"], distances, distances * 10,
+        start_index=[10, 11], destination_index=[20, 21, 22])
+
+
+def test_lookup(matrix):
+    """Tests the lookup by id pair"""
+    assert matrix.lookup("B", "Y") == (4.0, 40.0)
+    assert matrix["A", "Z"] == (2.0, 20.0)
+    with raises(KeyError):
+        matrix.lookup("C", "X")
+
+
+def test_shape_error():
+    """Tests if arrays that do not match the ids are rejected"""
+    with raises(ValueError):
+        DistanceMatrix(["A"], ["X"], np.zeros((2, 2)), np.zeros((2, 2)))
+
+
+def test_rows_and_columns(matrix):
+    """Tests the selection of sources and destinations by id"""
+    rows = matrix.rows(["B"])
+    columns = matrix.columns(["Z", "X"])
+
+    assert rows.shape == (1, 3)
+    assert rows.lookup("B", "X") == (3.0, 30.0)
+    assert list(columns.destination_ids) == ["Z", "X"]
+    assert columns.lookup("A", "Z") == (2.0, 20.0)
+
+
+def test_iloc_is_a_view(matrix):
+    """Tests if slicing by position does not copy the arrays"""
+    view = matrix.iloc(slice(1, 2), slice(0, 2))
+
+    assert np.shares_memory(view.distances, matrix.distances)
+    assert view.lookup("B", "Y") == (4.0, 40.0)
+
+
+def test_zero_copy_exports(matrix):
+    """Tests if the NumPy and Arrow exports share the memory of the matrix"""
+    assert matrix.to_numpy("duration") is matrix.durations
+
+    arrow = matrix.to_arrow("distance")
+    values = arrow.flatten().to_numpy(zero_copy_only=True)
+
+    assert isinstance(arrow, pa.FixedSizeListArray)
+    assert arrow.to_pylist()[1] == [3.0, 4.0, 5.0]
+    assert np.shares_memory(values, matrix.distances)
+    with raises(ValueError):
+        matrix.to_numpy("speed")
+
+
+def test_save_and_load_memory_mapped(tmp_path, matrix):
+    """Tests if a saved matrix is loaded memory-mapped"""
+    matrix.save(str(tmp_path))
+
+    loaded = DistanceMatrix.load(str(tmp_path))
+
+    assert isinstance(loaded.distances, np.memmap)
+    assert loaded.lookup("B", "Y") == (4.0, 40.0)
+    pd.testing.assert_frame_equal(loaded.to_long_dataframe(), matrix.to_long_dataframe())
+
+
+def test_to_long_dataframe(matrix):
+    """Tests the long format of the matrix"""
+    result = matrix.to_long_dataframe()
+
+    assert list(result.columns) == [
+        "start_index", "destination_index", "distance", "duration",
+        "start_id", "destination_id"
+    ]
+    assert len(result) == 6
+    row = result.iloc[5]
+    assert (row["start_id"], row["destination_id"], row["start_index"]) == ("B", "Z", 11)
+    assert row["duration"] == 50.0
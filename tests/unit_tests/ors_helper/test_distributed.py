@@ -0,0 +1,151 @@
+"""
+Unit tests for distributed.py
+"""
+import os
+import threading
+import numpy as np
+import pandas as pd
+import responses
+from pytest import fixture, raises
+from benchmarks.mock_ors_server import MockOrsServer
+from src.ors_helper.distance_matrix import DistanceMatrix
+from src.ors_helper.distributed import DistributedJob, main, run_local_workers
+from src.ors_helper.ors_helper import ORShelper
+from src.ors_helper.tile_planner import TileLimits
+
+
+@fixture(name="job")
+def job_fixture(tmp_path, locations):
+    """Returns a job of 9 tiles"""
+    return DistributedJob.create(
+        os.path.join(tmp_path, "job"), locations, "car",
+        tile_limits=TileLimits.from_chunk_size(2))
+
+
+def test_create_job(tmp_path, locations, job):
+    """Tests if the tile plan covers the matrix once and an existing job is
+    resumed only with the same input"""
+    covered = np.zeros((5, 5), dtype=int)
+    for index in range(job.n_tiles):
+        sources, destinations = job.tile(index)
+        covered[np.ix_(sources, destinations)] += 1
+
+    assert job.n_tiles == 9
+    assert (covered == 1).all()
+    pd.testing.assert_frame_equal(job.locations, locations)
+
+    resumed = DistributedJob.create(
+        job.directory, locations, "car", tile_limits=TileLimits.from_chunk_size(2))
+    assert resumed.fingerprint == job.fingerprint
+
+    with raises(ValueError):
+        DistributedJob.create(
+            job.directory, locations, "hgv", tile_limits=TileLimits.from_chunk_size(2))
+    with raises(ValueError):
+        DistributedJob.create(os.path.join(tmp_path, "other"), locations, "bike")
+
+
+def test_job_lease_is_stored(tmp_path, locations):
+    """Tests if workers open a job with the lease it was created with"""
+    job = DistributedJob.create(os.path.join(tmp_path, "job"), locations, "car", lease_seconds=5.0)
+
+    assert DistributedJob(job.directory).lease_seconds == 5.0
+    assert DistributedJob(job.directory, lease_seconds=60.0).lease_seconds == 60.0
+
+
+def test_claim_release_and_stale_claims(job):
+    """Tests if a tile is claimed once, released tiles can be claimed again
+    and the claim of a dead worker is taken over after its lease"""
+    claimed = [job.claim("a", start) for start in range(9)]
+
+    assert sorted(claimed) == list(range(9))
+    assert job.claim("b") is None
+
+    job.release(4)
+    assert job.claim("b") == 4
+
+    claim_path = job._claim_path(7)
+    old = os.path.getmtime(claim_path) - job.lease_seconds - 1
+    os.utime(claim_path, (old, old))
+    assert job.claim("b") == 7
+    with open(claim_path, encoding="utf-8") as file:
+        assert file.read() == "b"
+
+
+@responses.activate
+def test_run_worker_and_merge(locations, job, matrix_callback):
+    """Tests if concurrent workers request every tile once and the merged
+    matrix equals the matrix of a single helper"""
+    responses.add_callback(
+        responses.POST, "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=matrix_callback)
+    counts = []
+
+    def worker(worker_id):
+        helper = ORShelper(server_url="http://127.0.0.1", max_workers=2)
+        counts.append(helper.run_worker(job, worker_id=worker_id, poll_interval=0.01))
+
+    threads = [threading.Thread(target=worker, args=(str(number),)) for number in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(counts) == 9
+    assert job.is_complete()
+
+    expected = ORShelper(server_url="http://127.0.0.1").get_distance_matrix(locations, "car")
+    pd.testing.assert_frame_equal(job.merge(), expected)
+
+    matrix = job.merge(dense=True)
+    assert isinstance(matrix, DistanceMatrix)
+    assert matrix.lookup("A", "E") == (44.0, 88.0)
+
+
+def test_merge_missing_tiles(job):
+    """Tests if a merge of an incomplete job is rejected"""
+    assert job.missing_tiles() == list(range(9))
+
+    with raises(ValueError):
+        job.merge()
+
+
+def test_run_local_workers(tmp_path):
+    """Tests a job with several worker processes against a local server"""
+    rng = np.random.default_rng(0)
+    locations = pd.DataFrame({
+        "id": [f"L{number}" for number in range(40)],
+        "latitude": rng.uniform(50, 52, 40),
+        "longitude": rng.uniform(8, 10, 40)
+    })
+    job = DistributedJob.create(
+        os.path.join(tmp_path, "job"), locations, "hgv",
+        tile_limits=TileLimits(max_routes=100), dtype=np.float64)
+
+    with MockOrsServer(latency=0.01) as server:
+        requested = run_local_workers(job.directory, 3, server_url=server.url, max_workers=2)
+
+    matrix = job.merge(dense=True, dtype=np.float64)
+    coordinates = locations[["longitude", "latitude"]].to_numpy()
+    expected = np.abs(coordinates[:, None, :] - coordinates[None, :, :]).sum(axis=2) * 100_000
+
+    assert requested == job.n_tiles
+    np.testing.assert_allclose(matrix.distances, expected)
+    assert len(set(os.listdir(os.path.join(job.directory, "claims")))) == job.n_tiles
+
+
+def test_worker_main(tmp_path, monkeypatch, job, capsys):
+    """Tests the command line entry point of a worker"""
+    for name in ["SERVER_URL", "ORS_API_KEY", "MATRIX_MAX_ROUTES", "MATRIX_MAX_LOCATIONS"]:
+        monkeypatch.delenv(name, raising=False)
+
+    with MockOrsServer() as server:
+        env_path = os.path.join(tmp_path, ".env")
+        with open(env_path, 'w', encoding='utf-8') as file:
+            file.write(f"SERVER_URL={server.url}")
+
+        exit_code = main([job.directory, "--env-file", env_path, "--workers", "2"])
+
+    assert exit_code == 0
+    assert job.is_complete()
+    assert "Requested 9 tiles" in capsys.readouterr().out
@@ -0,0 +1,97 @@
+"""
+Unit tests for geo.py
+"""
+import numpy as np
+from pytest import approx, mark, raises
+from src.ors_helper import geo
+
+
+def test_haversine_matrix():
+    """Tests the great-circle distance of one degree latitude and of Berlin-Paris"""
+    distances = geo.haversine_matrix(
+        np.array([0.0, 52.52]), np.array([0.0, 13.405]),
+        np.array([1.0, 48.8566]), np.array([0.0, 2.3522]))
+
+    assert distances.shape == (2, 2)
+    assert distances[0, 0] == approx(111_195, rel=1e-3)
+    assert distances[1, 1] == approx(877_500, rel=5e-3)
+
+
+def test_candidate_pairs_k_nearest():
+    """Tests if every location gets its k nearest other locations"""
+    latitude = np.array([0.0, 0.0, 0.0, 10.0])
+    longitude = np.array([0.0, 0.1, 0.3, 0.0])
+
+    sources, destinations = geo.candidate_pairs(latitude, longitude, k=1, block_size=2)
+
+    assert sorted(zip(sources.tolist(), destinations.tolist())) == [
+        (0, 1), (1, 0), (2, 1), (3, 0)
+    ]
+
+
+def test_candidate_pairs_radius():
+    """Tests if only pairs within the radius are returned"""
+    latitude = np.array([0.0, 0.0, 0.0])
+    longitude = np.array([0.0, 0.1, 1.0])
+
+    sources, destinations = geo.candidate_pairs(latitude, longitude, radius=20_000)
+
+    assert sorted(zip(sources.tolist(), destinations.tolist())) == [(0, 1), (1, 0)]
+
+
+@mark.parametrize("k, radius", [(8, None), (None, 15_000), (5, 4_000), (2_000, None)])
+def test_candidate_pairs_grid_equals_all_pairs(k, radius):
+    """Tests if the grid search returns the pairs of a comparison with all
+    locations, for clusters and remote outliers"""
+    rng = np.random.default_rng(0)
+    latitude = np.concatenate([
+        rng.uniform(50.0, 52.0, 800), rng.normal(48.0, 0.01, 300), rng.uniform(-80, 80, 10)])
+    longitude = np.concatenate([
+        rng.uniform(7.0, 10.0, 800), rng.normal(11.0, 0.01, 300), rng.uniform(-179, 179, 10)])
+    n_locations = len(latitude)
+
+    sources, destinations = geo.candidate_pairs(
+        latitude, longitude, k=k, radius=radius, block_size=256)
+
+    distances = geo.haversine_matrix(latitude, longitude, latitude, longitude)
+    np.fill_diagonal(distances, np.inf)
+    expected = np.isfinite(distances)
+    if k is not None and k < n_locations - 1:
+        expected &= distances <= np.sort(distances, axis=1)[:, [k - 1]]
+    if radius is not None:
+        expected &= distances <= radius
+
+    expected_sources, expected_destinations = np.nonzero(expected)
+    np.testing.assert_array_equal(sources, expected_sources)
+    np.testing.assert_array_equal(destinations, expected_destinations)
+
+
+def test_candidate_pairs_error():
+    """Tests if ValueError is raised without k and radius"""
+    with raises(ValueError):
+        geo.candidate_pairs(np.zeros(2), np.zeros(2))
+
+
+def test_morton_order_groups_neighbours():
+    """Tests if nearby locations end up next to each other"""
+    latitude = np.array([0.0, 50.0, 0.01, 50.01])
+    longitude = np.array([0.0, 50.0, 0.01, 50.01])
+
+    order = geo.morton_order(latitude, longitude).tolist()
+
+    assert abs(order.index(0) - order.index(2)) == 1
+    assert abs(order.index(1) - order.index(3)) == 1
+
+
+def test_estimate_matrix():
+    """Tests if the estimate applies the detour factor and speed of the profile"""
+    latitude = np.array([0.0, 1.0])
+    longitude = np.array([0.0, 0.0])
+
+    distances, durations = geo.estimate_matrix(latitude, longitude, "hgv")
+    custom, _ = geo.estimate_matrix(latitude, longitude, "car", detour_factor=1.0)
+
+    assert distances[0, 1] == approx(111_195 * geo.DETOUR_FACTORS["hgv"], rel=1e-3)
+    assert durations[0, 1] == approx(distances[0, 1] / geo.AVERAGE_SPEEDS["hgv"])
+    assert custom[1, 0] == approx(111_195, rel=1e-3)
+    assert distances[0, 0] == 0.0
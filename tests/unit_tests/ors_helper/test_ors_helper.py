@@ -1,8 +1,27 @@
 """Tests for the ORShelper class"""
+import json
+import logging
 import os
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
 import openrouteservice as ors
+import pandas as pd
+import pandera as pa
+import requests
 import responses
+from pytest import fixture, mark, raises
+from src.file_io.input_reader import read_matrix_file
+from src.file_io.output_writer import CsvTileSink, write_matrix_file
 from src.ors_helper import ors_helper
+from src.ors_helper.backend_pool import Backend
+from src.ors_helper.checkpoint import Checkpoint
+from src.ors_helper.distance_matrix import DistanceMatrix
+from src.ors_helper.report import MatrixReport
+from src.ors_helper.retry import RetryPolicy
+from src.ors_helper.route_cache import RouteCache
+from src.ors_helper.tile_planner import TileLimits
 
 
 def test_ors_helper_init():
@@ -39,3 +58,918 @@ def test_ors_helper_init_from_env_file(tmp_path, monkeypatch):
 
     assert helper.client._key == test_key
     assert helper.client._base_url == test_url
+
+
+@responses.activate
+def test_get_distance_matrix_all_tiles(locations, matrix_callback):
+    """Tests if every tile ends up in the result"""
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=matrix_callback
+    )
+    helper = ors_helper.ORShelper(server_url="http://127.0.0.1")
+
+    result = helper.get_distance_matrix(locations, "car", chunk_size=2)
+
+    assert len(responses.calls) == 9
+    assert len(result) == 25
+    assert set(zip(result["start_id"], result["destination_id"])) == {
+        (start, destination)
+        for start in locations["id"] for destination in locations["id"]
+    }
+    row = result[(result["start_id"] == "A") & (result["destination_id"] == "E")]
+    assert row["distance"].item() == 44.0
+    assert row["duration"].item() == 88.0
+
+
+@responses.activate
+def test_get_distance_matrix_concurrent_equals_sequential(locations, matrix_callback):
+    """Tests if a concurrent run returns the same result as a sequential run"""
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-hgv/json",
+        callback=matrix_callback
+    )
+    helper = ors_helper.ORShelper(server_url="http://127.0.0.1")
+
+    sequential = helper.get_distance_matrix(locations, "hgv", chunk_size=2)
+    concurrent = helper.get_distance_matrix(
+        locations, "hgv", chunk_size=2, max_workers=4)
+
+    pd.testing.assert_frame_equal(sequential, concurrent)
+
+
+def test_get_distance_matrix_profile_error(locations):
+    """Tests if ValueError is raised for an unknown profile"""
+    helper = ors_helper.ORShelper(server_url="http://127.0.0.1")
+
+    with raises(ValueError):
+        helper.get_distance_matrix(locations, "bike")
+
+
+def test_ors_helper_init_max_workers_error():
+    """Tests if ValueError is raised for less than one worker"""
+    with raises(ValueError):
+        ors_helper.ORShelper(server_url="http://127.0.0.1", max_workers=0)
+
+
+@responses.activate
+def test_get_distance_matrix_dense(locations, matrix_callback):
+    """Tests if the dense arrays are returned in the order of locations"""
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=matrix_callback
+    )
+    helper = ors_helper.ORShelper(server_url="http://127.0.0.1")
+
+    matrix = helper.get_distance_matrix(locations, "car", chunk_size=2, dense=True)
+
+    assert isinstance(matrix, DistanceMatrix)
+    assert matrix.shape == (5, 5)
+    assert matrix.distances.dtype == np.float32
+    assert matrix.distances[0, 4] == 44.0
+    assert matrix.lookup("E", "A") == (44.0, 88.0)
+    np.testing.assert_array_equal(matrix.durations, matrix.distances * 2)
+    pd.testing.assert_frame_equal(
+        matrix.to_long_dataframe(),
+        helper.get_distance_matrix(locations, "car", chunk_size=2, dtype=np.float32))
+
+
+@responses.activate
+def test_get_distance_matrix_cache(tmp_path, locations, matrix_callback):
+    """Tests if cached pairs are not requested again"""
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=matrix_callback
+    )
+    cache = RouteCache(os.path.join(tmp_path, "routes.sqlite"))
+    helper = ors_helper.ORShelper(server_url="http://127.0.0.1", cache=cache)
+
+    expected = helper.get_distance_matrix(locations, "car", chunk_size=2)
+    n_calls = len(responses.calls)
+    result = helper.get_distance_matrix(locations, "car", chunk_size=2)
+
+    assert len(responses.calls) == n_calls
+    assert cache.hits == 25
+    pd.testing.assert_frame_equal(result, expected)
+
+    new_locations = pd.concat([locations, pd.DataFrame({
+        "id": ["F"], "latitude": [6.0], "longitude": [60.0]
+    })], ignore_index=True)
+    result = helper.get_distance_matrix(new_locations, "car", chunk_size=6)
+
+    assert len(responses.calls) == n_calls + 1
+    assert len(result) == 36
+    assert not result["distance"].isna().any()
+    cache.close()
+
+
+@responses.activate
+def test_get_distance_matrix_incremental(locations, matrix_callback):
+    """Tests if only added and moved locations are requested"""
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=matrix_callback
+    )
+    helper = ors_helper.ORShelper(server_url="http://127.0.0.1")
+    previous_matrix = helper.get_distance_matrix(locations, "car")
+
+    new_locations = locations[locations["id"] != "B"].copy()
+    new_locations.loc[new_locations["id"] == "C", "latitude"] = 3.5
+    new_locations = pd.concat([new_locations, pd.DataFrame({
+        "id": ["F"], "latitude": [6.0], "longitude": [60.0]
+    })], ignore_index=True)
+
+    n_calls = len(responses.calls)
+    result = helper.get_distance_matrix(
+        new_locations, "car", chunk_size=2,
+        previous_locations=locations, previous_matrix=previous_matrix)
+    n_requested = sum(
+        len(json.loads(call.request.body)["sources"])
+        * len(json.loads(call.request.body)["destinations"])
+        for call in responses.calls[n_calls:]
+    )
+    expected = helper.get_distance_matrix(new_locations, "car")
+
+    assert len(responses.calls) - 1 - n_calls == 5
+    assert n_requested == 2 * 5 + 3 * 2
+    assert "B" not in set(result["start_id"])
+    pd.testing.assert_frame_equal(result, expected)
+
+
+@responses.activate
+@mark.parametrize("extension", ["csv", "csv.zst", "xlsx", "parquet"])
+def test_get_distance_matrix_incremental_from_file(
+        tmp_path, locations, extension, matrix_callback):
+    """Tests if a matrix with numeric ids that was written to a file and read
+    back is reused completely"""
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=matrix_callback
+    )
+    locations["id"] = ["1", "2", "3", "4", "5"]
+    helper = ors_helper.ORShelper(server_url="http://127.0.0.1")
+    expected = helper.get_distance_matrix(locations, "car")
+    path = os.path.join(tmp_path, f"matrix.{extension}")
+    write_matrix_file(expected, path)
+
+    n_calls = len(responses.calls)
+    result = helper.get_distance_matrix(
+        locations, "car", previous_locations=locations,
+        previous_matrix=read_matrix_file(path))
+
+    assert len(responses.calls) == n_calls
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_get_distance_matrix_incremental_error(locations):
+    """Tests if ValueError is raised when only previous_matrix is given"""
+    helper = ors_helper.ORShelper(server_url="http://127.0.0.1")
+
+    with raises(ValueError):
+        helper.get_distance_matrix(locations, "car", previous_matrix=pd.DataFrame())
+
+
+def test_plan_distance_matrix(locations):
+    """Tests if the number of requests is planned without sending one"""
+    helper = ors_helper.ORShelper(
+        server_url="http://127.0.0.1",
+        tile_limits=TileLimits(max_routes=10)
+    )
+
+    tiles = helper.plan_distance_matrix(locations)
+
+    assert len(tiles) == 3
+    assert len(helper.plan_distance_matrix(locations, chunk_size=2)) == 9
+
+
+def test_ors_helper_tile_limits_from_env_file(tmp_path, monkeypatch):
+    """Tests if the matrix limits are read from the .env file"""
+    monkeypatch.delenv("SERVER_URL", raising=False)
+    monkeypatch.delenv("MATRIX_MAX_ROUTES", raising=False)
+    monkeypatch.delenv("MATRIX_MAX_LOCATIONS", raising=False)
+    env_path = os.path.join(tmp_path, ".env")
+
+    with open(env_path, 'w', encoding='utf-8') as file:
+        file.write("SERVER_URL=http://127.0.0.1\nMATRIX_MAX_ROUTES=3500")
+    helper = ors_helper.ORShelper.from_env_file(dotenv_path=env_path)
+
+    assert helper.tile_limits == TileLimits(max_routes=3500)
+
+
+def test_ors_helper_backends_from_env_file(tmp_path, monkeypatch):
+    """Tests if several servers in the .env file become backends"""
+    monkeypatch.delenv("SERVER_URL", raising=False)
+    monkeypatch.delenv("ORS_API_KEY", raising=False)
+    env_path = os.path.join(tmp_path, ".env")
+
+    with open(env_path, 'w', encoding='utf-8') as file:
+        file.write("SERVER_URL=http://ors-1, http://ors-2\nORS_API_KEY=key-1,key-2")
+    helper = ors_helper.ORShelper.from_env_file(dotenv_path=env_path, max_workers=4)
+
+    assert [
+        (state.backend.server_url, state.client._key) for state in helper.backend_pool.backends
+    ] == [("http://ors-1", "key-1"), ("http://ors-2", "key-2")]
+    assert helper.max_workers == 4
+
+
+@responses.activate
+def test_iter_distance_matrix(locations, matrix_callback):
+    """Tests if the streamed tiles cover the same matrix as the dense result"""
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=matrix_callback
+    )
+    helper = ors_helper.ORShelper(server_url="http://127.0.0.1", max_workers=2)
+    expected = helper.get_distance_matrix(locations, "car", dense=True).distances
+
+    distances = np.full((5, 5), np.nan)
+    n_tiles = 0
+    for tile in helper.iter_distance_matrix(locations, "car", chunk_size=2):
+        distances[np.ix_(tile.sources, tile.destinations)] = tile.distances
+        n_tiles += 1
+
+    assert n_tiles == 9
+    np.testing.assert_array_equal(distances, expected)
+
+
+def test_results_before_errors():
+    """Tests if tiles that finished together with a failing tile are yielded
+    before its error is raised"""
+    failed = Future()
+    failed.set_exception(ors.exceptions.ApiError(502))
+    finished = Future()
+    finished.set_result("tile")
+    results = []
+
+    with raises(ors.exceptions.ApiError):
+        for result in ors_helper._results_before_errors([failed, finished]):
+            results.append(result)
+
+    assert results == ["tile"]
+
+
+@responses.activate
+def test_write_distance_matrix_resume(tmp_path, locations, matrix_callback):
+    """Tests if an interrupted job only requests the remaining tiles"""
+    calls = []
+
+    def failing_callback(request):
+        calls.append(request)
+        if len(calls) == 4:
+            return (502, {}, json.dumps({"error": "bad gateway"}))
+        return matrix_callback(request)
+
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=failing_callback
+    )
+    helper = ors_helper.ORShelper(
+        server_url="http://127.0.0.1",
+        retry_policy=RetryPolicy(max_attempts=1)
+    )
+    path = os.path.join(tmp_path, "matrix.csv")
+    checkpoint_path = os.path.join(tmp_path, "matrix.csv.checkpoint")
+
+    with raises(ors.exceptions.ApiError):
+        with CsvTileSink(path, locations) as sink:
+            helper.write_distance_matrix(
+                locations, "car", sink, checkpoint=Checkpoint(checkpoint_path),
+                chunk_size=2)
+    first_run = sink.tiles_written
+
+    with CsvTileSink(path, locations, append=True) as sink:
+        written = helper.write_distance_matrix(
+            locations, "car", sink, checkpoint=Checkpoint(checkpoint_path),
+            chunk_size=2)
+
+    result = pd.read_csv(path)
+
+    assert first_run >= 3
+    assert written == 9 - first_run
+    assert len(result) == 25
+    assert not result.duplicated(["start_id", "destination_id"]).any()
+
+
+@responses.activate
+def test_write_distance_matrix_resume_before_first_mark(
+        tmp_path, locations, monkeypatch, matrix_callback):
+    """Tests if rows of a tile that was written but not marked done before
+    the first run died are not written twice"""
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=matrix_callback
+    )
+    helper = ors_helper.ORShelper(server_url="http://127.0.0.1")
+    path = os.path.join(tmp_path, "matrix.csv")
+    checkpoint_path = os.path.join(tmp_path, "matrix.csv.checkpoint")
+
+    def interrupted(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    with monkeypatch.context() as patch:
+        patch.setattr(Checkpoint, "mark_done", interrupted)
+        with raises(KeyboardInterrupt):
+            with CsvTileSink(path, locations) as sink:
+                helper.write_distance_matrix(
+                    locations, "car", sink, checkpoint=Checkpoint(checkpoint_path),
+                    chunk_size=2)
+    assert sink.tiles_written == 1
+
+    with CsvTileSink(path, locations, append=True) as sink:
+        written = helper.write_distance_matrix(
+            locations, "car", sink, checkpoint=Checkpoint(checkpoint_path),
+            chunk_size=2)
+
+    result = pd.read_csv(path)
+
+    assert written == 9
+    assert len(result) == 25
+    assert not result.duplicated(["start_id", "destination_id"]).any()
+
+
+@responses.activate
+def test_get_distance_matrix_retry(locations, monkeypatch, matrix_callback):
+    """Tests if transient errors are retried with backoff"""
+    sleeps = []
+    monkeypatch.setattr(ors_helper.time, "sleep", sleeps.append)
+    calls = []
+
+    def flaky_callback(request):
+        calls.append(request)
+        if len(calls) <= 2:
+            return (504, {}, json.dumps({"error": "gateway timeout"}))
+        return matrix_callback(request)
+
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=flaky_callback
+    )
+    helper = ors_helper.ORShelper(
+        server_url="http://127.0.0.1",
+        retry_policy=RetryPolicy(base_delay=1.0, jitter=0.0)
+    )
+    report = MatrixReport()
+
+    result = helper.get_distance_matrix(locations, "car", report=report)
+
+    assert sleeps == [1.0, 2.0]
+    assert report.retries == 2
+    assert not result["distance"].isna().any()
+
+
+@responses.activate
+def test_get_distance_matrix_retry_rate_limit(locations, monkeypatch, matrix_callback):
+    """Tests if rate limits and unavailable servers are retried by the retry
+    policy and not within the openrouteservice client"""
+    sleeps = []
+    monkeypatch.setattr(ors_helper.time, "sleep", sleeps.append)
+    statuses = [429, 503]
+
+    def limited_callback(request):
+        if statuses:
+            return (statuses.pop(0), {}, json.dumps({"error": "try again"}))
+        return matrix_callback(request)
+
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=limited_callback
+    )
+    helper = ors_helper.ORShelper(
+        server_url="http://127.0.0.1",
+        retry_policy=RetryPolicy(base_delay=1.0, jitter=0.0)
+    )
+    report = MatrixReport()
+
+    result = helper.get_distance_matrix(locations, "car", report=report)
+
+    assert sleeps == [1.0, 2.0]
+    assert report.retries == 2
+    assert len(responses.calls) == 3
+    assert helper.backend_pool.stats()["failures"].tolist() == [2]
+    assert not result["distance"].isna().any()
+
+
+@responses.activate
+def test_get_distance_matrix_retry_server_error(locations, monkeypatch):
+    """Tests if an internal server error is retried up to max_attempts and
+    raised after that"""
+    monkeypatch.setattr(ors_helper.time, "sleep", lambda delay: None)
+    responses.add(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        json={"error": "internal server error"},
+        status=500
+    )
+    helper = ors_helper.ORShelper(
+        server_url="http://127.0.0.1",
+        retry_policy=RetryPolicy(max_attempts=3)
+    )
+    report = MatrixReport()
+
+    with raises(ors.exceptions.ApiError):
+        helper.get_distance_matrix(locations, "car", report=report)
+
+    assert report.retries == 2
+    assert len(responses.calls) == 3
+
+
+@responses.activate
+def test_get_distance_matrix_split_unroutable(locations, matrix_callback):
+    """Tests if a failing tile without a named coordinate is split until the
+    row of the bad coordinate is isolated"""
+    def callback(request):
+        body = json.loads(request.body)
+        sources = [body["locations"][i] for i in body["sources"]]
+        destinations = [body["locations"][i] for i in body["destinations"]]
+        if [30.0, 3.0] in sources and len(destinations) > 1:
+            return (404, {}, json.dumps({"error": "Could not find routable point"}))
+        response = json.loads(matrix_callback(request)[2])
+        if [30.0, 3.0] in sources:
+            response["distances"] = [[None]]
+            response["durations"] = [[None]]
+        return (200, {}, json.dumps(response))
+
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=callback
+    )
+    helper = ors_helper.ORShelper(server_url="http://127.0.0.1")
+    report = MatrixReport()
+
+    result = helper.get_distance_matrix(locations, "car", report=report)
+    unroutable = report.unroutable_pairs(locations)
+
+    assert report.split_tiles > 0
+    assert result["distance"].isna().sum() == 5
+    assert set(unroutable["start_id"]) == {"C"}
+    assert len(unroutable) == 5
+    assert unroutable["reason"].str.startswith("404").all()
+
+
+@responses.activate
+def test_get_distance_matrix_forbidden_is_raised(locations):
+    """Tests if a rejected API key is raised without splitting the tile and
+    without caching the pairs"""
+    responses.add(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        json={"error": "Access to this API has been disallowed"},
+        status=403
+    )
+    cache = RouteCache(":memory:")
+    helper = ors_helper.ORShelper(server_url="http://127.0.0.1", cache=cache)
+    report = MatrixReport()
+
+    with raises(ors.exceptions.ApiError):
+        helper.get_distance_matrix(locations, "car", report=report)
+
+    assert len(responses.calls) == 1
+    assert report.split_tiles == 0
+    assert len(cache) == 0
+
+
+@responses.activate
+def test_get_distance_matrix_drop_named_location(matrix_callback):
+    """Tests if the location named by the routing error is dropped from the
+    tile instead of splitting the tile down to single pairs"""
+    locations = pd.DataFrame({
+        "id": [str(i) for i in range(120)],
+        "latitude": np.linspace(1.0, 2.0, 120),
+        "longitude": np.linspace(10.0, 11.0, 120)
+    })
+    bad = [locations["longitude"][7], locations["latitude"][7]]
+
+    def callback(request):
+        body = json.loads(request.body)
+        if bad in body["locations"]:
+            index = body["locations"].index(bad)
+            return (404, {}, json.dumps({"error": {
+                "code": 6010,
+                "message": "Could not find routable point within a radius of 350.0 "
+                           f"meters of specified coordinate {index}: 0 0."}}))
+        return matrix_callback(request)
+
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=callback
+    )
+    helper = ors_helper.ORShelper(server_url="http://127.0.0.1")
+    report = MatrixReport()
+    n_tiles = len(helper.plan_distance_matrix(locations))
+
+    result = helper.get_distance_matrix(locations, "car", report=report)
+    unroutable = result["start_id"].eq("7") | result["destination_id"].eq("7")
+
+    assert len(responses.calls) <= 2 * n_tiles
+    assert report.split_tiles == 0
+    assert report.n_unroutable == 239
+    assert result.loc[unroutable, "distance"].isna().all()
+    assert result.loc[~unroutable, "distance"].notna().all()
+
+
+@responses.activate
+def test_get_distance_matrix_non_transient_error_single_pair():
+    """Tests if a failing single pair is reported with the error"""
+    responses.add(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        json={"error": "Could not find routable point"},
+        status=404
+    )
+    locations = pd.DataFrame({"id": ["A"], "latitude": [1.0], "longitude": [2.0]})
+    helper = ors_helper.ORShelper(server_url="http://127.0.0.1")
+    report = MatrixReport()
+
+    result = helper.get_distance_matrix(locations, "car", report=report)
+
+    assert result["distance"].isna().all()
+    assert "404" in report.unroutable_pairs(locations)["reason"].item()
+
+
+@responses.activate
+def test_get_distance_matrix_progress_and_cancel(locations, matrix_callback):
+    """Tests if progress is reported and a set cancel event stops the run"""
+    progress = []
+    cancel = threading.Event()
+
+    def held_callback(request):
+        # hold the tiles after the third until the run is cancelled
+        if len(responses.calls) >= 3:
+            cancel.wait(timeout=5)
+            time.sleep(0.1)
+        return matrix_callback(request)
+
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=held_callback
+    )
+    helper = ors_helper.ORShelper(server_url="http://127.0.0.1")
+
+    def on_progress(finished, total):
+        progress.append((finished, total))
+        if finished == 3:
+            cancel.set()
+
+    with raises(ors_helper.MatrixCancelled):
+        helper.get_distance_matrix(
+            locations, "car", chunk_size=2, progress=on_progress, cancel=cancel)
+
+    assert progress == [(1, 9), (2, 9), (3, 9)]
+    assert len(responses.calls) < 9
+
+
+@responses.activate
+def test_get_distance_matrix_deduplicate_unroutable(locations, matrix_callback):
+    """Tests if the unroutable pairs of a deduplicated run name the ids of
+    all duplicates"""
+    def callback(request):
+        body = json.loads(request.body)
+        if [40.0, 4.0] in body["locations"]:
+            index = body["locations"].index([40.0, 4.0])
+            return (404, {}, json.dumps({"error": {
+                "code": 6010,
+                "message": f"Could not find routable point of specified coordinate {index}"}}))
+        return matrix_callback(request)
+
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=callback
+    )
+    helper = ors_helper.ORShelper(server_url="http://127.0.0.1")
+    duplicated = pd.concat(
+        [locations.iloc[:1], locations.iloc[:1].assign(id="A2"), locations.iloc[1:4]])
+    report = MatrixReport()
+
+    result = helper.get_distance_matrix(duplicated, "car", deduplicate=True, report=report)
+    unroutable = report.unroutable_pairs(duplicated)
+    pairs = set(zip(unroutable["start_id"], unroutable["destination_id"]))
+    missing = result[result["distance"].isna()]
+
+    assert pairs == set(zip(missing["start_id"], missing["destination_id"]))
+    assert pairs == (
+        {("D", id_) for id_ in ["A", "A2", "B", "C", "D"]}
+        | {(id_, "D") for id_ in ["A", "A2", "B", "C"]}
+    )
+    assert report.duplicate_locations == 1
+
+
+@responses.activate
+def test_get_distance_matrix_deduplicate(locations, matrix_callback):
+    """Tests if duplicate coordinates are requested once and expanded"""
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=matrix_callback
+    )
+    helper = ors_helper.ORShelper(server_url="http://127.0.0.1")
+    duplicated = pd.concat([locations, locations.assign(id=locations["id"] + "2")])
+    report = MatrixReport()
+
+    result = helper.get_distance_matrix(
+        duplicated, "car", chunk_size=5, deduplicate=True, report=report)
+    request = json.loads(responses.calls[0].request.body)
+
+    assert len(responses.calls) == 1
+    assert len(request["sources"]) == 5
+    assert len(result) == 100
+    row = result[(result["start_id"] == "A2") & (result["destination_id"] == "E")]
+    assert row["distance"].item() == 44.0
+    assert report.duplicate_locations == 5
+    assert report.saved_requests == 3
+
+
+@responses.activate
+def test_get_sparse_distance_matrix(locations, matrix_callback):
+    """Tests if only the k nearest pairs are requested and returned"""
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=matrix_callback
+    )
+    helper = ors_helper.ORShelper(
+        server_url="http://127.0.0.1",
+        tile_limits=TileLimits(max_routes=4)
+    )
+
+    result = helper.get_sparse_distance_matrix(locations, "car", k=2)
+    n_requested = sum(
+        len(json.loads(call.request.body)["sources"])
+        * len(json.loads(call.request.body)["destinations"])
+        for call in responses.calls
+    )
+
+    assert len(result) == 10
+    assert n_requested < 25
+    assert not result["distance"].isna().any()
+    row = result[(result["start_id"] == "A") & (result["destination_id"] == "B")]
+    assert row["distance"].item() == 11.0
+    assert set(result.loc[result["start_id"] == "C", "destination_id"]) == {"B", "D"}
+
+
+@responses.activate
+def test_get_source_destination_matrix(locations, matrix_callback):
+    """Tests if only the sources x destinations pairs are requested"""
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=matrix_callback
+    )
+    helper = ors_helper.ORShelper(
+        server_url="http://127.0.0.1",
+        tile_limits=TileLimits(max_routes=4)
+    )
+    sources = locations.iloc[:2]
+    destinations = locations.iloc[2:]
+
+    result = helper.get_source_destination_matrix(sources, destinations, "car")
+    n_requested = sum(
+        len(json.loads(call.request.body)["sources"])
+        * len(json.loads(call.request.body)["destinations"])
+        for call in responses.calls
+    )
+
+    assert len(result) == 6
+    assert n_requested == 6
+    assert set(result["start_id"]) == {"A", "B"}
+    assert set(result["destination_id"]) == {"C", "D", "E"}
+    assert set(result["destination_index"]) == {2, 3, 4}
+    row = result[(result["start_id"] == "A") & (result["destination_id"] == "E")]
+    assert row["distance"].item() == 44.0
+
+    matrix = helper.get_source_destination_matrix(
+        sources, destinations, "car", dense=True)
+
+    assert matrix.shape == (2, 3)
+    assert matrix.lookup("B", "C") == (11.0, 22.0)
+    assert list(matrix.destination_index) == [2, 3, 4]
+
+
+def test_get_source_destination_matrix_schema_error(locations):
+    """Tests if sources and destinations are validated"""
+    helper = ors_helper.ORShelper(server_url="http://127.0.0.1")
+    destinations = locations.assign(latitude=[1.0, 2.0, 3.0, 4.0, 95.0])
+
+    with raises(pa.errors.SchemaError):
+        helper.get_source_destination_matrix(locations, destinations, "car")
+
+
+@responses.activate
+def test_get_distance_matrices(locations, matrix_callback):
+    """Tests if several profiles are requested in one interleaved pass"""
+    for profile in ["car", "hgv"]:
+        responses.add_callback(
+            responses.POST,
+            f"http://127.0.0.1/v2/matrix/driving-{profile}/json",
+            callback=matrix_callback
+        )
+    helper = ors_helper.ORShelper(server_url="http://127.0.0.1")
+    progress = []
+
+    results = helper.get_distance_matrices(
+        locations, ["car", "hgv"], chunk_size=2,
+        progress=lambda finished, total: progress.append((finished, total)))
+    requested_profiles = [call.request.url.split("/")[-2] for call in responses.calls]
+
+    assert set(results) == {"car", "hgv"}
+    assert requested_profiles[:2] == ["driving-car", "driving-hgv"]
+    assert requested_profiles.count("driving-hgv") == 9
+    assert progress[-1] == (18, 18)
+    for profile, result in results.items():
+        pd.testing.assert_frame_equal(
+            result, helper.get_distance_matrix(locations, profile, chunk_size=2))
+
+
+@responses.activate
+def test_get_distance_matrices_cache(locations, matrix_callback):
+    """Tests if every profile only requests its own missing pairs"""
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=matrix_callback
+    )
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-hgv/json",
+        callback=matrix_callback
+    )
+    helper = ors_helper.ORShelper(
+        server_url="http://127.0.0.1", cache=RouteCache(":memory:"))
+    helper.get_distance_matrix(locations, "car")
+    n_calls = len(responses.calls)
+
+    results = helper.get_distance_matrices(locations, ["car", "hgv"], dense=True)
+
+    assert len(responses.calls) == n_calls + 1
+    assert "driving-hgv" in responses.calls[-1].request.url
+    np.testing.assert_array_equal(results["car"].distances, results["hgv"].distances)
+
+
+@responses.activate
+def test_get_distance_matrix_metrics_hook(locations, capsys, caplog, matrix_callback):
+    """Tests if every tile is reported to the metrics hook instead of stdout"""
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=matrix_callback
+    )
+    tile_metrics = []
+    helper = ors_helper.ORShelper(
+        server_url="http://127.0.0.1", metrics_hook=tile_metrics.append)
+
+    with caplog.at_level(logging.DEBUG, logger="src.ors_helper"):
+        helper.get_distance_matrix(locations, "car", chunk_size=2)
+
+    assert capsys.readouterr().out == ""
+    assert len(tile_metrics) == 9
+    assert sorted(metrics.index for metrics in tile_metrics) == list(range(9))
+    for metrics in tile_metrics:
+        assert metrics.profile == "car"
+        assert metrics.requests == 1
+        assert metrics.retries == 0
+        assert metrics.bytes_sent > 0
+        assert metrics.bytes_received > 0
+        assert metrics.request_seconds > 0
+        assert metrics.assembly_seconds > 0
+    assert sum(record.message.startswith("tile ") for record in caplog.records) == 9
+    # the tiles are requested one after another
+    run_seconds = [
+        record.args[1] for record in caplog.records if "tiles finished" in record.msg]
+    assert run_seconds[0] >= sum(metrics.request_seconds for metrics in tile_metrics)
+
+
+@responses.activate
+def test_get_distance_matrix_route_within(locations, matrix_callback):
+    """Tests if only pairs under the threshold are routed and the rest is estimated"""
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=matrix_callback
+    )
+    helper = ors_helper.ORShelper(
+        server_url="http://127.0.0.1",
+        tile_limits=TileLimits(max_routes=4)
+    )
+
+    result = helper.get_distance_matrix(locations, "car", route_within=2_000_000)
+    n_requested = sum(
+        len(json.loads(call.request.body)["sources"])
+        * len(json.loads(call.request.body)["destinations"])
+        for call in responses.calls
+    )
+    routed = result[result["method"] == "routed"]
+    estimated = result[result["method"] == "estimated"]
+
+    assert len(result) == 25
+    assert n_requested < 25
+    assert len(routed) <= n_requested
+    neighbours = result[(result["start_id"] == "A") & (result["destination_id"] == "B")]
+    assert neighbours["method"].item() == "routed"
+    assert neighbours["distance"].item() == 11.0
+    assert len(estimated) > 0
+    assert (estimated["distance"] > 2_000_000).all()
+    assert not estimated["duration"].isna().any()
+
+
+@fixture(name="clustered_locations")
+def clustered_locations_fixture():
+    """Returns 100 locations in four clusters of about 30 km, in random order"""
+    rng = np.random.default_rng(0)
+    centers = [(48.0, 8.0), (50.0, 12.0), (52.0, 9.0), (53.0, 14.0)]
+    latitude = np.concatenate([rng.uniform(lat, lat + 0.3, 25) for lat, _ in centers])
+    longitude = np.concatenate([rng.uniform(lon, lon + 0.3, 25) for _, lon in centers])
+    order = rng.permutation(100)
+    return pd.DataFrame({
+        "id": [f"L{number}" for number in range(100)],
+        "latitude": latitude[order],
+        "longitude": longitude[order]
+    })
+
+
+@responses.activate
+def test_get_distance_matrix_route_within_requests(clustered_locations, matrix_callback):
+    """Tests if the pairs under the threshold are packed into tiles of nearby
+    locations instead of tiles of whole rows"""
+    responses.add_callback(
+        responses.POST,
+        "http://127.0.0.1/v2/matrix/driving-car/json",
+        callback=matrix_callback
+    )
+    helper = ors_helper.ORShelper(
+        server_url="http://127.0.0.1",
+        tile_limits=TileLimits(max_routes=400)
+    )
+
+    result = helper.get_distance_matrix(
+        clustered_locations, "car", route_within=20_000, dense=True)
+
+    # 1458 pairs are within 20 km, planning by row pattern needs 25 requests
+    assert len(responses.calls) <= 8
+    assert result.estimated.sum() <= 10_000 - 1458
+    assert not np.isnan(result.distances).any()
+
+
+@responses.activate
+def test_get_distance_matrix_backends(locations, matrix_callback):
+    """Tests if the tiles are spread across the backends"""
+    for url in ("http://ors-1", "http://ors-2"):
+        responses.add_callback(
+            responses.POST, f"{url}/v2/matrix/driving-car/json", callback=matrix_callback)
+    helper = ors_helper.ORShelper(backends=[
+        Backend("http://ors-1", api_key="key-1", max_workers=2),
+        Backend("http://ors-2", api_key="key-2", max_workers=2)
+    ])
+
+    result = helper.get_distance_matrix(locations, "car", chunk_size=2)
+
+    assert helper.max_workers == 4
+    assert not result["distance"].isna().any()
+    stats = helper.backend_pool.stats()
+    assert stats["requests"].sum() == 9
+    assert (stats["requests"] > 0).all()
+    assert {call.request.headers["Authorization"] for call in responses.calls} == {
+        "key-1", "key-2"}
+
+
+@responses.activate
+def test_get_distance_matrix_backend_failover(locations, matrix_callback):
+    """Tests if the tiles of a backend that fails before its first answer
+    are requested from the healthy backend"""
+    responses.add(
+        responses.POST, "http://ors-down/v2/matrix/driving-car/json",
+        body=requests.exceptions.ConnectionError("connection refused"))
+    responses.add_callback(
+        responses.POST, "http://ors-up/v2/matrix/driving-car/json", callback=matrix_callback)
+    helper = ors_helper.ORShelper(
+        backends=[Backend("http://ors-down"), Backend("http://ors-up")],
+        retry_policy=RetryPolicy(base_delay=0.0)
+    )
+    report = MatrixReport()
+
+    result = helper.get_distance_matrix(locations, "car", chunk_size=2, report=report)
+
+    assert not result["distance"].isna().any()
+    stats = helper.backend_pool.stats().set_index("server_url")
+    assert stats.loc["http://ors-down", "failures"] == 1
+    assert stats.loc["http://ors-up", "requests"] == 9
+    assert report.retries == 1
+
+
+def test_ors_helper_init_without_server_error():
+    """Tests if a helper without server url and backends is rejected"""
+    with raises(ValueError):
+        ors_helper.ORShelper()
@@ -1,6 +1,8 @@
 """
 Unit tests for ors_utils.py
 """
+import numpy as np
+import pandas as pd
 from src.ors_helper import ors_utils
 
 def test_chunks_list():
@@ -24,3 +26,104 @@ def test_chunks_tuple():
         result_list += chunk
 
     assert result_list == list(iterator_tuple)
+
+def test_rate_limiter_spacing(monkeypatch):
+    """Tests if the rate limiter spaces the requests evenly"""
+    sleeps = []
+    monkeypatch.setattr(ors_utils.time, "monotonic", lambda: 100.0)
+    monkeypatch.setattr(ors_utils.time, "sleep", sleeps.append)
+
+    limiter = ors_utils.RateLimiter(requests_per_minute=120)
+    for _ in range(3):
+        limiter.acquire()
+
+    assert sleeps == [0.5, 1.0]
+
+def test_rate_limiter_disabled(monkeypatch):
+    """Tests if the rate limiter does not wait without a limit"""
+    sleeps = []
+    monkeypatch.setattr(ors_utils.time, "sleep", sleeps.append)
+
+    limiter = ors_utils.RateLimiter()
+    for _ in range(3):
+        limiter.acquire()
+
+    assert not sleeps
+
+def test_matrix_to_long_format():
+    """Tests if the N x N arrays are turned into the long format"""
+    locations = pd.DataFrame({"id": ["A", "B"]}, index=[10, 20])
+    distances = np.array([[0.0, 1.0], [2.0, 0.0]])
+    durations = distances * 10
+
+    result = ors_utils.matrix_to_long_format(locations, distances, durations)
+
+    expected = pd.DataFrame({
+        "start_index": [10, 10, 20, 20],
+        "destination_index": [10, 20, 10, 20],
+        "distance": [0.0, 1.0, 2.0, 0.0],
+        "duration": [0.0, 10.0, 20.0, 0.0],
+        "start_id": ["A", "A", "B", "B"],
+        "destination_id": ["A", "B", "A", "B"]
+    })
+
+    pd.testing.assert_frame_equal(result, expected)
+
+def test_deduplicate_coordinates():
+    """Tests if equal coordinates are collapsed in input order"""
+    locations = pd.DataFrame({
+        "id": ["A", "B", "C", "D"],
+        "latitude": [5.0, 1.0, 5.0, 1.0],
+        "longitude": [5.0, 1.0, 5.0, 2.0]
+    })
+
+    canonical, inverse = ors_utils.deduplicate_coordinates(locations)
+
+    np.testing.assert_array_equal(canonical, [0, 1, 3])
+    np.testing.assert_array_equal(canonical[inverse], [0, 1, 0, 3])
+
+def test_deduplicate_coordinates_tolerance():
+    """Tests if nearly equal coordinates are collapsed within the tolerance"""
+    locations = pd.DataFrame({
+        "id": ["A", "B", "C"],
+        "latitude": [1.0, 1.00001, 1.01],
+        "longitude": [1.0, 1.0, 1.0]
+    })
+
+    canonical, inverse = ors_utils.deduplicate_coordinates(locations, tolerance=10)
+
+    np.testing.assert_array_equal(canonical, [0, 2])
+    np.testing.assert_array_equal(inverse, [0, 0, 1])
+
+
+def test_deduplicate_coordinates_tolerance_cell_border():
+    """Tests if points 1 m apart on both sides of a grid line are collapsed
+    and the tolerance holds in longitude at a high latitude"""
+    locations = pd.DataFrame({
+        "id": ["A", "B", "C", "D"],
+        "latitude": [0.0, 0.0, 60.0, 60.0],
+        # A and B are 1 m apart around the grid line of a 2 m grid in
+        # degrees, 2.7e-5 degrees longitude are 3 m at the equator and 1.5 m
+        # at 60 degrees
+        "longitude": [0.45e-5, 1.35e-5, 10.0, 10.0 + 2.7e-5]
+    })
+
+    canonical, inverse = ors_utils.deduplicate_coordinates(locations, tolerance=2)
+
+    np.testing.assert_array_equal(canonical, [0, 2])
+    np.testing.assert_array_equal(inverse, [0, 0, 1, 1])
+
+
+def test_deduplicate_coordinates_tolerance_chain():
+    """Tests if every location stays within the tolerance of its canonical
+    location, also along a chain of close points"""
+    locations = pd.DataFrame({
+        "id": ["A", "B", "C", "D"],
+        "latitude": [0.0, 0.0, 0.0, 0.0],
+        "longitude": [0.0, 6e-5, 12e-5, 18e-5]
+    })
+
+    canonical, inverse = ors_utils.deduplicate_coordinates(locations, tolerance=10)
+
+    np.testing.assert_array_equal(canonical, [0, 2])
+    np.testing.assert_array_equal(inverse, [0, 0, 1, 1])
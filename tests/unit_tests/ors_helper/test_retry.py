@@ -0,0 +1,74 @@
+"""
+Unit tests for retry.py
+"""
+import httpx
+import openrouteservice as ors
+import requests
+from pytest import mark, raises
+from src.ors_helper.retry import (
+    is_routing_error, is_transient, RetryPolicy, unroutable_location
+)
+
+
+@mark.parametrize("exc, expected", [
+    (ors.exceptions.ApiError(503), True),
+    (ors.exceptions.ApiError(429), True),
+    (ors.exceptions.ApiError(500), True),
+    (ors.exceptions.ApiError(404), False),
+    (ors.exceptions.ApiError(400), False),
+    (ors.exceptions.Timeout(), True),
+    (requests.exceptions.ConnectionError(), True),
+    (httpx.ConnectError("refused"), True),
+    (ValueError(), False)
+])
+def test_is_transient(exc, expected):
+    """Tests which errors are retried"""
+    assert is_transient(exc) == expected
+
+
+@mark.parametrize("exc, expected", [
+    (ors.exceptions.ApiError(404, {"error": "Could not find routable point"}), True),
+    (ors.exceptions.ApiError(400, {"error": {"code": 6010, "message": "not found"}}), True),
+    (ors.exceptions.ApiError(400, {"error": {"code": 6004, "message": "too large"}}), False),
+    (ors.exceptions.ApiError(401, {"error": "Authorization field missing"}), False),
+    (ors.exceptions.ApiError(403, {"error": "Quota exceeded"}), False),
+    (ors.exceptions.ApiError(413, "Request Entity Too Large"), False),
+    (ValueError(), False)
+])
+def test_is_routing_error(exc, expected):
+    """Tests which errors split a tile"""
+    assert is_routing_error(exc) == expected
+
+
+@mark.parametrize("exc, expected", [
+    (ors.exceptions.ApiError(404, {"error": {"code": 6010, "message": (
+        "Could not find routable point within a radius of 350.0 meters of "
+        "specified coordinate 3: 8.6811530 49.4171670.")}}), 3),
+    (ors.exceptions.ApiError(404, {"error": "Could not find routable point"}), None),
+    (ors.exceptions.ApiError(401, {"error": "coordinate 3 not authorized"}), None),
+    (ValueError(), None)
+])
+def test_unroutable_location(exc, expected):
+    """Tests if the coordinate named by a routing error is parsed"""
+    assert unroutable_location(exc) == expected
+
+
+def test_retry_policy_delay():
+    """Tests if the delay doubles up to max_delay"""
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0, jitter=0.0)
+
+    assert [policy.delay(attempt) for attempt in range(1, 5)] == [1.0, 2.0, 4.0, 5.0]
+
+
+def test_retry_policy_jitter():
+    """Tests if the jitter stays within the bounds"""
+    policy = RetryPolicy(base_delay=1.0, jitter=0.5)
+
+    for _ in range(100):
+        assert 0.5 <= policy.delay(1) <= 1.5
+
+
+def test_retry_policy_error():
+    """Tests if ValueError is raised for less than one attempt"""
+    with raises(ValueError):
+        RetryPolicy(max_attempts=0)
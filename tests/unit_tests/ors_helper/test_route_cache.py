@@ -0,0 +1,95 @@
+"""
+Unit tests for route_cache.py
+"""
+import os
+import time
+
+import numpy as np
+from pytest import fixture
+from src.ors_helper.route_cache import RouteCache
+
+
+@fixture(name="cache")
+def cache_fixture(tmp_path):
+    """Returns a RouteCache in a temporary directory"""
+    cache = RouteCache(os.path.join(tmp_path, "routes.sqlite"))
+    yield cache
+    cache.close()
+
+
+def test_lookup_empty_cache(cache):
+    """Tests if every pair is missing in an empty cache"""
+    distances = np.full((2, 1), np.nan)
+    durations = np.full((2, 1), np.nan)
+
+    missing = cache.lookup(
+        [(1.0, 2.0), (3.0, 4.0)], [(5.0, 6.0)], "car", ["distance"],
+        distances, durations)
+
+    assert missing.all()
+    assert cache.misses == 2
+    assert cache.hits == 0
+
+
+def test_store_and_lookup(cache):
+    """Tests if stored pairs are found with rounded coordinates"""
+    cache.store(
+        [(1.0, 2.0)], [(5.0, 6.0), (7.0, 8.0)], "car", ["distance", "duration"],
+        np.array([[10.0, np.nan]]), np.array([[20.0, np.nan]]))
+
+    distances = np.full((1, 3), -1.0)
+    durations = np.full((1, 3), -1.0)
+    missing = cache.lookup(
+        [(1.000001, 2.0)], [(7.0, 8.0), (5.0, 6.0), (9.0, 9.0)], "car",
+        ["duration", "distance"], distances, durations)
+
+    np.testing.assert_array_equal(missing, [[False, False, True]])
+    np.testing.assert_array_equal(distances, [[np.nan, 10.0, -1.0]])
+    np.testing.assert_array_equal(durations, [[np.nan, 20.0, -1.0]])
+    assert cache.hits == 2
+    assert cache.misses == 1
+
+
+def test_lookup_other_profile(cache):
+    """Tests if entries of another profile are not used"""
+    cache.store(
+        [(1.0, 2.0)], [(5.0, 6.0)], "car", ["distance"],
+        np.array([[10.0]]), np.array([[20.0]]))
+
+    missing = cache.lookup(
+        [(1.0, 2.0)], [(5.0, 6.0)], "hgv", ["distance"],
+        np.zeros((1, 1)), np.zeros((1, 1)))
+
+    assert missing.all()
+
+
+def test_evict_ttl(tmp_path, monkeypatch):
+    """Tests if expired entries are ignored and evicted"""
+    cache = RouteCache(os.path.join(tmp_path, "routes.sqlite"), ttl=60)
+    cache.store(
+        [(1.0, 2.0)], [(5.0, 6.0)], "car", ["distance"],
+        np.array([[10.0]]), np.array([[20.0]]))
+
+    now = time.time()
+    monkeypatch.setattr("src.ors_helper.route_cache.time.time", lambda: now + 61)
+
+    missing = cache.lookup(
+        [(1.0, 2.0)], [(5.0, 6.0)], "car", ["distance"],
+        np.zeros((1, 1)), np.zeros((1, 1)))
+
+    assert missing.all()
+    assert cache.evict() == 1
+    assert len(cache) == 0
+    cache.close()
+
+
+def test_evict_max_entries(tmp_path):
+    """Tests if only max_entries entries are kept"""
+    cache = RouteCache(os.path.join(tmp_path, "routes.sqlite"), max_entries=2)
+    cache.store(
+        [(1.0, 2.0)], [(5.0, 6.0), (7.0, 8.0), (9.0, 9.0)], "car", ["distance"],
+        np.ones((1, 3)), np.ones((1, 3)))
+
+    assert cache.evict() == 1
+    assert len(cache) == 2
+    cache.close()
@@ -0,0 +1,97 @@
+"""
+Unit tests for tile_planner.py
+"""
+import numpy as np
+from pytest import raises
+from src.ors_helper import tile_planner
+from src.ors_helper.tile_planner import TileLimits
+
+
+def covered_cells(tiles, shape):
+    """Returns a boolean array of all cells covered by the tiles"""
+    covered = np.zeros(shape, dtype=bool)
+    for rows, columns in tiles:
+        covered[np.ix_(rows, columns)] = True
+    return covered
+
+
+def test_tile_limits_error():
+    """Tests if ValueError is raised for invalid limits"""
+    with raises(ValueError):
+        TileLimits(max_routes=0)
+
+
+def test_rectangle_shape_wide():
+    """Tests if a few sources and many destinations use wide tiles"""
+    n_sources, n_destinations = tile_planner.rectangle_shape(
+        30, 8000, TileLimits(max_routes=2500))
+
+    assert n_sources * n_destinations == 96
+
+
+def test_rectangle_shape_chunk_size():
+    """Tests if the square chunk size limits give square tiles"""
+    shape = tile_planner.rectangle_shape(5, 5, TileLimits.from_chunk_size(2))
+
+    assert shape == (3, 3)
+
+
+def test_plan_tiles_full_matrix():
+    """Tests if the tiles of a full matrix respect the limits and split evenly"""
+    limits = TileLimits(max_routes=100, max_locations=30)
+    missing = np.ones((23, 23), dtype=bool)
+
+    tiles = tile_planner.plan_tiles(missing, limits)
+
+    assert covered_cells(tiles, missing.shape).all()
+    for rows, columns in tiles:
+        assert len(rows) * len(columns) <= 100
+        assert len(rows) + len(columns) <= 30
+    assert max(len(rows) for rows, _ in tiles) - min(len(rows) for rows, _ in tiles) <= 1
+    assert sum(len(r) * len(c) for r, c in tiles) == 23 * 23
+
+
+def test_plan_tiles_missing_strips():
+    """Tests if only the missing cells are packed into few tiles"""
+    missing = np.zeros((4, 4), dtype=bool)
+    missing[3, :] = True
+    missing[:, 3] = True
+
+    tiles = tile_planner.plan_tiles(missing, TileLimits.from_chunk_size(3))
+
+    assert (covered_cells(tiles, missing.shape) | ~missing).all()
+    assert len(tiles) == 2
+
+
+def test_plan_tiles_nothing_missing():
+    """Tests if no tile is planned when nothing is missing"""
+    missing = np.zeros((3, 3), dtype=bool)
+
+    assert not tile_planner.plan_tiles(missing, TileLimits())
+
+
+def test_plan_pair_tiles():
+    """Tests if the sparse pairs are covered by tiles within the limits"""
+    pair_sources = np.array([0, 0, 1, 1, 2, 3, 3, 3])
+    pair_destinations = np.array([1, 2, 0, 2, 0, 0, 1, 2])
+    limits = TileLimits(max_routes=4)
+
+    tiles = tile_planner.plan_pair_tiles(
+        pair_sources, pair_destinations, np.arange(4), limits)
+
+    covered = covered_cells(tiles, (4, 4))
+    assert covered[pair_sources, pair_destinations].all()
+    for rows, columns in tiles:
+        assert len(rows) * len(columns) <= 4
+
+
+def test_plan_pair_tiles_large_source():
+    """Tests if a source with too many destinations is split"""
+    pair_sources = np.zeros(5, dtype=int)
+    pair_destinations = np.arange(1, 6)
+
+    tiles = tile_planner.plan_pair_tiles(
+        pair_sources, pair_destinations, np.arange(6), TileLimits(max_routes=2))
+
+    assert len(tiles) == 3
+    assert covered_cells(tiles, (6, 6))[0, 1:].all()
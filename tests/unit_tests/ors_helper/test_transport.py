@@ -0,0 +1,109 @@
+"""Tests for the HTTP transport of the ORShelper"""
+import gzip
+import json
+
+import pandas as pd
+import requests
+import responses
+from pytest import raises
+from src.ors_helper.ors_helper import ORShelper
+from src.ors_helper.transport import build_session, GzipAdapter, HttpSettings, mount_adapters
+
+
+def test_build_session_pool_size():
+    """Tests if the pool is sized to the workers unless it is configured"""
+    session = build_session(HttpSettings(), max_workers=8)
+    configured = build_session(HttpSettings(pool_maxsize=3), max_workers=8)
+
+    assert session.get_adapter("https://example.com")._pool_maxsize == 8
+    assert configured.get_adapter("http://example.com")._pool_maxsize == 3
+    assert session.headers["Connection"] == "keep-alive"
+    assert "gzip" in session.headers["Accept-Encoding"]
+
+
+def test_mount_adapters_closes_replaced_adapters():
+    """Tests if the pools of the replaced adapters are closed"""
+    session = build_session(HttpSettings(), max_workers=1)
+    previous = session.get_adapter("http://example.com")
+    previous.poolmanager.connection_from_url("http://example.com")
+
+    mount_adapters(session, HttpSettings(), 4)
+
+    assert len(previous.poolmanager.pools) == 0
+    assert session.get_adapter("https://example.com")._pool_maxsize == 4
+    assert session.get_adapter("http://example.com") is not previous
+
+
+def test_build_session_without_keep_alive():
+    """Tests if connections are closed without keep-alive"""
+    session = build_session(HttpSettings(keep_alive=False))
+
+    assert session.headers["Connection"] == "close"
+
+
+def test_http_settings_pool_error():
+    """Tests if ValueError is raised for an empty pool"""
+    with raises(ValueError):
+        HttpSettings(pool_maxsize=0)
+
+
+@responses.activate
+def test_gzip_request_bodies():
+    """Tests if large request bodies are sent gzip compressed"""
+    received = []
+
+    def callback(request):
+        received.append(request)
+        return (200, {}, json.dumps({"distances": [[1.0]], "durations": [[2.0]]}))
+
+    responses.add_callback(
+        responses.POST, "http://127.0.0.1/v2/matrix/driving-car/json", callback=callback)
+    session = build_session(HttpSettings(gzip_requests=True, gzip_min_size=10))
+    helper = ORShelper(server_url="http://127.0.0.1", session=session)
+
+    routes = helper._request_tile([(10.0, 1.0)], [(20.0, 2.0)], "car")
+
+    assert isinstance(session.get_adapter("http://127.0.0.1"), GzipAdapter)
+    assert routes["durations"] == [[2.0]]
+    assert received[0].headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(received[0].body))["sources"] == [0]
+
+
+def test_helper_uses_configured_session():
+    """Tests if the helper sends its requests through the configured session"""
+    session = requests.Session()
+
+    helper = ORShelper(
+        server_url="http://127.0.0.1", session=session,
+        http_settings=HttpSettings(connect_timeout=2, read_timeout=30))
+
+    assert helper.client._session is session
+    assert helper.client._requests_kwargs["timeout"] == (2, 30)
+    helper.close()
+
+
+@responses.activate
+def test_pool_grows_with_running_workers():
+    """Tests if a per call max_workers and concurrent calls get a connection
+    each instead of waiting for the pool of the constructor"""
+    pool_sizes = []
+    helper = ORShelper(server_url="http://127.0.0.1", max_workers=1)
+
+    def callback(request):
+        pool_sizes.append(helper.session.get_adapter("http://127.0.0.1")._pool_maxsize)
+        body = json.loads(request.body)
+        rows = [[1.0] * len(body["destinations"]) for _ in body["sources"]]
+        return (200, {}, json.dumps({"distances": rows, "durations": rows}))
+
+    responses.add_callback(
+        responses.POST, "http://127.0.0.1/v2/matrix/driving-car/json", callback=callback)
+    locations = pd.DataFrame({
+        "id": ["A", "B", "C"], "latitude": [1.0, 2.0, 3.0], "longitude": [4.0, 5.0, 6.0]
+    })
+
+    helper.get_distance_matrix(locations, "car", chunk_size=1, max_workers=4)
+    with helper._connections(2):
+        helper.get_distance_matrix(locations, "car", chunk_size=1, max_workers=4)
+
+    assert set(pool_sizes[:9]) == {4}
+    assert set(pool_sizes[9:]) == {6}
@@ -205,3 +205,44 @@ def test_input_schema_longitude_out_of_bounds_pos():
 
     assert expected_err_msg in str(exc.value)
     assert "'longitude'" in str(exc.value)
+
+
+def test_check_is_numeric_numeric_dtype():
+    """
+    Tests if numeric series pass without an element wise check
+    """
+    series = pd.Series([1.5, float("nan"), 3.0])
+
+    assert schemas.check_is_numeric(series).all()
+
+
+def test_check_is_numeric_bool_dtype():
+    """
+    Tests if bool series fail
+    """
+    series = pd.Series([True, False])
+
+    assert not schemas.check_is_numeric(series).any()
+
+
+def test_check_is_numeric_object_dtype():
+    """
+    Tests if object series are checked element by element
+    """
+    series = pd.Series([1, 2.5, "a", True], dtype=object)
+
+    result = schemas.check_is_numeric(series)
+
+    assert result.tolist() == [True, True, False, False]
+
+
+def test_input_schema_failure_cases_object_column(input_df):
+    """
+    Tests if the failure cases contain only the non numeric values
+    """
+    input_df["longitude"] = [1, "a"]
+
+    with raises(SchemaError) as exc:
+        schemas.input_file_schema.validate(input_df)
+
+    assert exc.value.failure_cases["failure_case"].tolist() == ["a"]